@@ -0,0 +1,327 @@
+import argparse
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+import art_gen
+
+# Work a render does, as features the cost model is linear in:
+#   pixels: canvas clear and PNG encode, per drawn pixel
+#   segments: per line segment drawn (each curve is sampled into BEZIER_SEGMENTS segments)
+#   stroke_pixels: amount × stroke width × canvas edge, roughly the pixels the strokes cover
+#   video_pixels: resize, conversion and h264 encoding, per pixel of a video frame
+FEATURES = ('base', 'pixels', 'segments', 'stroke_pixels', 'video_pixels')
+BEZIER_SEGMENTS = 30
+
+# Seconds per unit of each feature, fitted with `python admission.py calibrate` (median timings) on one core.
+# Calibrate on the machine that serves requests; main.py and server.py load the fitted file when it exists.
+DEFAULT_COEFFICIENTS = {
+    'base': 2.0e-3,
+    'pixels': 3.4e-8,
+    'segments': 5.0e-6,
+    'stroke_pixels': 2.9e-9,
+    'video_pixels': 1.0e-7
+}
+
+COST_MODEL_FILE = os.path.join('gallery', 'cost_model.json')
+
+# Buffers of canvas size alive at once for a still: the canvas, the PNG and its base64 data URL
+STILL_BUFFERS = 3
+
+# x264 keeps a lookahead of frames, about this many bytes per pixel of the video frame
+ENCODER_BYTES_PER_PIXEL = 60
+
+# Frames in flight in one video pipeline: the bounded queues between the four stages plus one per stage
+VIDEO_FRAMES_IN_FLIGHT = 3 * art_gen.VIDEO_QUEUE_SIZE + 4
+
+# A single still or frame may not take longer than this (seconds of CPU)
+MAX_REQUEST_SECONDS = 10.0
+
+# A video may not take more CPU than this in total (seconds, summed over its segments)
+MAX_VIDEO_SECONDS = 1800.0
+
+# Downscaled renders are never smaller than this
+MIN_RENDER_SIZE = 64
+
+# A request waiting for memory longer than this is rejected
+MAX_QUEUE_SECONDS = 30.0
+
+# Share of physical memory renders may hold at once when no budget is configured
+MEMORY_SHARE = 0.5
+
+def physical_memory():
+    """Physical memory in bytes, or None where sysconf can't tell (Windows)."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def default_memory_budget():
+    memory = physical_memory()
+    return int(memory * MEMORY_SHARE) if memory else 2 * 1024 ** 3
+
+def render_features(params, render_size=None, video_size=None):
+    """Feature values of one rendered still or frame (see FEATURES)."""
+    size = int(params['size'])
+    draw_size = int(render_size or size)
+    # Variations are drawn from 0..line_width_variation, and widths scale with the canvas
+    width = max(1.0, (params['line_width'] + params['line_width_variation'] / 2.0) * draw_size / size)
+    return {
+        'base': 1.0,
+        'pixels': float(draw_size * draw_size),
+        'segments': float(params['amount'] * BEZIER_SEGMENTS),
+        'stroke_pixels': params['amount'] * width * draw_size,
+        'video_pixels': float(video_size * video_size) if video_size else 0.0
+    }
+
+def heavier(params, end_params=None):
+    """Animations move from params to end_params; the heavier end is assumed for every frame."""
+    return max([params, end_params or params], key=lambda p: (p['amount'], p['line_width'] + p['line_width_variation'] / 2.0))
+
+class CostModel:
+    """
+    Predicts CPU time and peak memory of a render from its parameters.
+    CPU time is linear in FEATURES with coefficients fitted from measured runs (see calibrate);
+    memory follows from the buffers each kind of render holds.
+    """
+
+    def __init__(self, coefficients=None):
+        self.coefficients = dict(DEFAULT_COEFFICIENTS, **(coefficients or {}))
+
+    @classmethod
+    def load(cls, path=COST_MODEL_FILE):
+        """Model with the coefficients saved at path, or the defaults when it wasn't calibrated yet."""
+        try:
+            with open(path) as f:
+                return cls(json.load(f)['coefficients'])
+        except (OSError, ValueError, KeyError):
+            return cls()
+
+    def save(self, path=COST_MODEL_FILE, samples=None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'coefficients': self.coefficients, 'samples': len(samples or [])}, f, indent=2)
+
+    def seconds(self, features):
+        return sum(self.coefficients[name] * features[name] for name in FEATURES)
+
+    def estimate_still(self, params, render_size=None, frames=1, end_params=None):
+        """Estimate for gen_art, or for generate_frame_at_time with end_params (frames > 1 for a batch of frames)."""
+        draw_size = int(render_size or params['size'])
+        return {
+            'kind': 'still',
+            'render_size': draw_size,
+            'frames': frames,
+            'cpu_seconds': round(frames * self.seconds(render_features(heavier(params, end_params), draw_size)), 3),
+            'peak_bytes': STILL_BUFFERS * frames * draw_size * draw_size * 3
+        }
+
+    def estimate_video(self, params, end_params=None, duration_seconds=30, fps=10, processes=1):
+        """
+        Estimate for a video. processes is the number of segments rendered at once, each with its own pipeline.
+        """
+        total_frames = int(duration_seconds * fps)
+        video_size = art_gen.video_frame_size(int(params['size']))
+        frame_bytes = int(params['size']) ** 2 * 3
+        video_frame_bytes = video_size * video_size * 3
+        per_process = VIDEO_FRAMES_IN_FLIGHT * max(frame_bytes, video_frame_bytes) + ENCODER_BYTES_PER_PIXEL * video_size * video_size
+        return {
+            'kind': 'video',
+            'render_size': video_size,
+            'frames': total_frames,
+            'cpu_seconds': round(total_frames * self.seconds(render_features(heavier(params, end_params), video_size=video_size)), 3),
+            'peak_bytes': max(1, processes) * per_process
+        }
+
+    def fit(self, samples):
+        """
+        Fit the coefficients to measured samples [(features, seconds)] by least squares.
+        Negative coefficients (noise on small terms) are dropped and the rest refitted.
+        """
+        import numpy as np  # Installed with imageio
+        names = list(FEATURES)
+        while names:
+            matrix = np.array([[features[name] for name in names] for features, _ in samples])
+            seconds = np.array([seconds for _, seconds in samples])
+            # Relative error matters, so every sample is weighted by its own duration
+            weights = 1.0 / np.maximum(seconds, 1e-3)
+            solution = np.linalg.lstsq(matrix * weights[:, None], seconds * weights, rcond=None)[0]
+            negative = [name for name, value in zip(names, solution) if value < 0]
+            if not negative:
+                break
+            names = [name for name in names if name not in negative]
+        self.coefficients = {name: 0.0 for name in FEATURES}
+        self.coefficients.update({name: float(value) for name, value in zip(names, solution)} if names else {})
+        return self.coefficients
+
+def measure_still(size, amount, line_width, line_width_variation, repeats=3):
+    """Render one still like render_full does and return (features, median seconds)."""
+    params = {'size': size, 'amount': amount, 'line_width': line_width, 'line_width_variation': line_width_variation, 'padding': 10, 'border_width': 3}
+    _, state = art_gen.gen_art(size, amount, line_width, line_width_variation, 10, 3, seed=size + amount + line_width, output='image')
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        art_gen.gen_art(size, amount, line_width, line_width_variation, 10, 3, art_state=state, output='png')
+        timings.append(time.perf_counter() - start)
+    # The median, not the fastest run: estimates should match what a request typically takes
+    return render_features(params), sorted(timings)[len(timings) // 2]
+
+def measure_video(size, amount, line_width, frames=20):
+    """Encode a short clip and return (features, seconds per frame)."""
+    params = {'size': size, 'amount': amount, 'line_width': line_width, 'line_width_variation': 3.0, 'padding': 10, 'border_width': 3}
+    _, state = art_gen.gen_art(size, amount, line_width, 3.0, 10, 3, seed=size + amount, output='image')
+    start = time.perf_counter()
+    art_gen.generate_video(state, params, params, duration_seconds=1, fps=frames, speed=20.0, output='mp4')
+    seconds = (time.perf_counter() - start) / frames
+    return render_features(params, video_size=art_gen.video_frame_size(size)), seconds
+
+def calibrate(sizes=(256, 512, 1024), amounts=(10, 100, 1000), line_widths=(1, 10, 100), videos=True):
+    """Measure a grid of renders in this process and return (fitted model, samples)."""
+    samples = [measure_still(size, amount, width, 3.0) for size in sizes for amount in amounts for width in line_widths]
+    if videos and art_gen.IMAGEIO_AVAILABLE:
+        samples += [measure_video(size, amount, 10) for size in sizes for amount in (amounts[0], amounts[-1])]
+    model = CostModel()
+    model.fit(samples)
+    return model, samples
+
+class AdmissionController:
+    """
+    Decides what happens to a request before any rendering starts, from its cost estimate:
+
+    - admit: it fits the per-request limits and the memory budget
+    - queue: it fits the limits, but the memory held by running renders leaves no room yet; reserve() waits
+    - downscale: a still over the limits is rendered at the largest size that fits them
+    - reject: nothing that fits the limits can serve it (or it waited longer than max_queue_seconds)
+
+    Memory is reserved for the duration of each render, so the renders admitted at once never add up to
+    more than memory_budget, and one oversized request can't push the process into swap.
+    """
+
+    def __init__(self, model=None, memory_budget=None, max_request_seconds=MAX_REQUEST_SECONDS,
+                 max_video_seconds=MAX_VIDEO_SECONDS, min_render_size=MIN_RENDER_SIZE,
+                 max_queue_seconds=MAX_QUEUE_SECONDS, sleep=time.sleep, poll_interval=0.01):
+        """
+        Args:
+            model: CostModel (default: the calibrated one, see CostModel.load)
+            memory_budget: Bytes all admitted renders may hold together (default: half the physical memory)
+            max_request_seconds: CPU limit for one still or frame batch
+            max_video_seconds: CPU limit for one video, over all its segments
+            sleep: Sleep function used while queued (pass eel.sleep to yield to the event loop)
+        """
+        self.model = model or CostModel.load()
+        self.memory_budget = memory_budget or default_memory_budget()
+        self.max_request_seconds = max_request_seconds
+        self.max_video_seconds = max_video_seconds
+        self.min_render_size = min_render_size
+        self.max_queue_seconds = max_queue_seconds
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+        self.reserved = 0
+        self._lock = threading.Lock()
+
+    def fits(self, estimate, max_seconds):
+        return estimate['cpu_seconds'] <= max_seconds and estimate['peak_bytes'] <= self.memory_budget
+
+    def decide(self, estimate, action):
+        with self._lock:
+            if action == 'admit' and self.reserved + estimate['peak_bytes'] > self.memory_budget:
+                action = 'queue'
+        return {'action': action, 'estimate': estimate}
+
+    def check_still(self, params, render_size=None, frames=1, end_params=None):
+        """Decision for a still or a batch of frames, downscaling render_size when the request is over the limits."""
+        estimate = self.model.estimate_still(params, render_size, frames, end_params)
+        if self.fits(estimate, self.max_request_seconds):
+            return self.decide(estimate, 'admit')
+        # Cost only grows with size, so halve it until it fits
+        draw_size = estimate['render_size']
+        while draw_size // 2 >= self.min_render_size:
+            draw_size //= 2
+            downscaled = self.model.estimate_still(params, draw_size, frames, end_params)
+            if self.fits(downscaled, self.max_request_seconds):
+                decision = self.decide(downscaled, 'downscale')
+                decision['requested_size'] = estimate['render_size']
+                return decision
+        return self.reject(estimate, f"Estimated {estimate['cpu_seconds']}s / {estimate['peak_bytes'] // 2 ** 20} MB is over the limits even at {draw_size}px")
+
+    def check_video(self, params, end_params=None, duration_seconds=30, fps=10, processes=1):
+        """Decision for a video. Videos are not downscaled: they are admitted (the job queue orders them) or rejected."""
+        estimate = self.model.estimate_video(params, end_params, duration_seconds, fps, processes)
+        if self.fits(estimate, self.max_video_seconds):
+            return self.decide(estimate, 'admit')
+        return self.reject(estimate, f"Estimated {estimate['cpu_seconds']}s of CPU / {estimate['peak_bytes'] // 2 ** 20} MB is over the video limits")
+
+    def reject(self, estimate, reason):
+        return {'action': 'reject', 'estimate': estimate, 'reason': reason}
+
+    @contextmanager
+    def reserve(self, decision):
+        """
+        Hold the decision's memory while rendering, waiting (cooperatively, via sleep) until it fits the budget.
+        Raises AdmissionError after max_queue_seconds. A request that alone fits the budget always runs
+        eventually, since reservations are only ever released.
+        """
+        if decision['action'] == 'reject':
+            raise AdmissionError(decision)
+        need = decision['estimate']['peak_bytes']
+        deadline = time.monotonic() + self.max_queue_seconds
+        while not self.try_reserve(need):
+            if time.monotonic() > deadline:
+                raise AdmissionError(dict(decision, action='reject', reason='Timed out waiting for memory', timed_out=True))
+            self.sleep(self.poll_interval)
+        try:
+            yield decision
+        finally:
+            self.release(need)
+
+    def try_reserve(self, need):
+        """
+        Reserve need bytes if they fit the budget right now, without waiting. Returns whether they were reserved;
+        for renders that don't run inside reserve() (video jobs, see JobScheduler), which release() them when done.
+        """
+        with self._lock:
+            if self.reserved + need > self.memory_budget:
+                return False
+            self.reserved += need
+            return True
+
+    def release(self, need):
+        with self._lock:
+            self.reserved -= need
+
+    def metrics(self):
+        with self._lock:
+            return {'memory_budget': self.memory_budget, 'reserved_bytes': self.reserved}
+
+class AdmissionError(Exception):
+    """A request was rejected; decision holds the estimate and the reason."""
+
+    def __init__(self, decision):
+        super().__init__(decision.get('reason', 'Request rejected'))
+        self.decision = decision
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit the render cost model to renders measured on this machine')
+    commands = parser.add_subparsers(dest='command', required=True)
+    calibrate_parser = commands.add_parser('calibrate', help='Measure a grid of renders and save the fitted model')
+    calibrate_parser.add_argument('--output', default=COST_MODEL_FILE)
+    calibrate_parser.add_argument('--no-video', action='store_true', help='Skip the video samples (no ffmpeg)')
+    estimate_parser = commands.add_parser('estimate', help='Print the estimate for a still')
+    estimate_parser.add_argument('--model', default=COST_MODEL_FILE)
+    for name, kind in (('size', int), ('amount', int), ('line-width', int), ('line-width-variation', float)):
+        estimate_parser.add_argument('--' + name, type=kind, required=True)
+    args = parser.parse_args()
+
+    if args.command == 'calibrate':
+        model, samples = calibrate(videos=not args.no_video)
+        model.save(args.output, samples)
+        for features, seconds in samples:
+            print(f"{seconds * 1000:8.1f} ms measured  {model.seconds(features) * 1000:8.1f} ms predicted")
+        print(json.dumps(model.coefficients, indent=2))
+    else:
+        params = {'size': args.size, 'amount': args.amount, 'line_width': args.line_width, 'line_width_variation': args.line_width_variation}
+        print(json.dumps(CostModel.load(args.model).estimate_still(params), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+from bisect import bisect
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+import art_gen
+import frame_delta
+
+# Points per worker on the hash ring; more points spread states more evenly
+VIRTUAL_NODES = 64
+
+# A worker takes a state's requests only while it has at most this times the average in-flight requests,
+# otherwise the next worker on the ring does (consistent hashing with bounded loads)
+LOAD_FACTOR = 1.25
+
+# States each worker keeps prepared (animation data and a frame buffer per state)
+CACHE_SIZE = 32
+
+def ring_hash(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+
+class HashRing:
+    """
+    Consistent hashing of keys onto workers. Adding or removing a worker only moves the keys
+    between it and its ring neighbours; every other key keeps its worker (and that worker's warm cache).
+    """
+
+    def __init__(self, workers=(), virtual_nodes=VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self._points = []  # Sorted (hash, worker)
+        for worker in workers:
+            self.add(worker)
+
+    def add(self, worker):
+        self._points.extend((ring_hash(f'{worker}#{i}'), worker) for i in range(self.virtual_nodes))
+        self._points.sort()
+
+    def remove(self, worker):
+        self._points = [point for point in self._points if point[1] != worker]
+
+    def workers(self):
+        return sorted({worker for _, worker in self._points})
+
+    def candidates(self, key):
+        """Workers in ring order starting at the key's position, each once: the owner first, then its fallbacks."""
+        if not self._points:
+            return []
+        start = bisect(self._points, (ring_hash(key),))
+        seen = []
+        for i in range(len(self._points)):
+            worker = self._points[(start + i) % len(self._points)][1]
+            if worker not in seen:
+                seen.append(worker)
+        return seen
+
+# Worker-process side: prepared states of the requests routed here, least recently used evicted first
+_prepared = OrderedDict()
+
+class CacheMiss(Exception):
+    """The worker doesn't hold the state and the call didn't carry it."""
+
+def prepared_state(state_id, art_state, start_params):
+    """Cached entry for a state in this worker, prepared from art_state on a miss. Returns (entry, hit)."""
+    entry = _prepared.get(state_id)
+    if entry is not None and entry['params'] == start_params:
+        _prepared.move_to_end(state_id)
+        return entry, True
+    if art_state is None:
+        raise CacheMiss(state_id)
+    entry = {
+        'state': art_state,
+        'params': start_params,
+        # End points, color sets and branch topology, shared by every frame of the state
+        'animation': art_gen.prepare_animation(art_state, start_params),
+        'canvas': None
+    }
+    _prepared[state_id] = entry
+    while len(_prepared) > CACHE_SIZE:
+        _prepared.popitem(last=False)
+    return entry, False
+
+# Worker-process side: delta encoders of the preview streams whose frames were rendered here
+_streams = frame_delta.PreviewStreams()
+
+def render_cached_frame(state_id, art_state, start_params, end_params, time_factor, settings, output='png', stream=None):
+    """
+    generate_frame_at_time for a state whose animation data and frame buffer this worker keeps.
+    art_state may be None when the dispatcher expects a hit (raises CacheMiss if it was evicted).
+    With output='delta' the frame is delta-encoded here for stream=(stream_id, base_seq, seq), see frame_delta.
+    Returns (frame, hit).
+    """
+    entry, hit = prepared_state(state_id, art_state, start_params)
+    if output == 'svg':
+        frame = art_gen.generate_frame_at_time(
+            entry['state'], start_params, end_params, time_factor, animation=entry['animation'], output='svg', **settings
+        )
+        return frame, hit
+    # The state's frame buffer is drawn over; it is encoded (or pickled back) before the next frame of this worker
+    image = art_gen.generate_frame_at_time(
+        entry['state'], start_params, end_params, time_factor, animation=entry['animation'],
+        output='image', canvas=entry['canvas'], **settings
+    )
+    entry['canvas'] = image
+    if output == 'delta':
+        stream_id, base_seq, seq = stream
+        return _streams.encode(stream_id, image, base_seq, seq=seq), hit
+    return art_gen.encode_output(image, output), hit
+
+def clear_cache():
+    _prepared.clear()
+
+class AffinityPool:
+    """
+    Render worker processes addressed by key: requests for the same state_id go to the same process,
+    so its prepared animation and frame buffer are reused instead of rebuilt per request. Keys map to
+    workers by consistent hashing with bounded loads, which keeps a busy state from piling onto one core.
+
+    The pool remembers which states it sent to each worker (mirroring the workers' LRU), so a state is only
+    pickled to a worker that doesn't have it yet; a worker that evicted it anyway answers CacheMiss and the
+    call is resent with the state.
+    """
+
+    def __init__(self, workers=None, sleep=time.sleep, poll_interval=0.005, cache_size=CACHE_SIZE, load_factor=LOAD_FACTOR):
+        """
+        Args:
+            workers: Processes (default: half the cores, next to the interactive lane's own processes)
+            sleep: Sleep function used while waiting (pass eel.sleep to yield to the event loop)
+            cache_size: States each worker keeps (must match the workers' CACHE_SIZE for the mirror to be exact)
+        """
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 2) // 2)
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+        self.cache_size = cache_size
+        self.load_factor = load_factor
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._executors = {}
+        self._known = {}  # worker -> OrderedDict of state IDs it holds
+        self._in_flight = {}
+        self._stats = {'hits': 0, 'misses': 0, 'resent': 0, 'spilled': 0}
+        self._next_worker = 0
+        self.ring = HashRing()
+        for _ in range(workers):
+            self.add_worker()
+
+    def add_worker(self):
+        """Start one more worker and give it its share of the ring. Returns its ID."""
+        with self._lock:
+            worker = self._next_worker
+            self._next_worker += 1
+            self._executors[worker] = ProcessPoolExecutor(max_workers=1, mp_context=self._context)
+            self._known[worker] = OrderedDict()
+            self._in_flight[worker] = 0
+            self.ring.add(worker)
+        return worker
+
+    def remove_worker(self, worker, wait=False):
+        """Take a worker off the ring (its states move to the ring neighbours) and stop it."""
+        with self._lock:
+            if worker not in self._executors:
+                return False
+            self.ring.remove(worker)
+            executor = self._executors.pop(worker)
+            self._known.pop(worker)
+            self._in_flight.pop(worker)
+        executor.shutdown(wait=wait)
+        return True
+
+    def worker_for(self, key):
+        """
+        The key's worker: its owner on the ring unless that one is over load_factor times the average
+        in-flight load, then the first ring successor that isn't. Caller holds the lock.
+        """
+        candidates = self.ring.candidates(key)
+        limit = max(1.0, self.load_factor * (sum(self._in_flight.values()) + 1) / len(candidates))
+        for worker in candidates:
+            if self._in_flight[worker] + 1 <= limit:
+                if worker != candidates[0]:
+                    self._stats['spilled'] += 1
+                return worker
+        return candidates[0]
+
+    def _note_state(self, worker, state_id):
+        """Record that worker holds state_id; returns whether it already did."""
+        known = self._known[worker]
+        held = state_id in known
+        known[state_id] = True
+        known.move_to_end(state_id)
+        while len(known) > self.cache_size:
+            known.popitem(last=False)
+        return held
+
+    def render_frame(self, state_id, art_state, start_params, end_params, time_factor, settings, output='png', stream=None):
+        """Render a frame of a state on its worker (see render_cached_frame) and wait cooperatively."""
+        for attempt in range(3):
+            with self._lock:
+                worker = self.worker_for(state_id)
+                held = self._note_state(worker, state_id) and attempt == 0
+                self._in_flight[worker] += 1
+                executor = self._executors[worker]
+            try:
+                future = executor.submit(
+                    render_cached_frame, state_id, None if held else art_state, start_params, end_params, time_factor, settings, output, stream
+                )
+                while not future.done():
+                    self.sleep(self.poll_interval)
+                frame, hit = future.result()
+            except CacheMiss:
+                with self._lock:
+                    self._stats['resent'] += 1
+                    self._known.get(worker, {}).pop(state_id, None)
+                continue
+            except BrokenProcessPool:
+                # The worker died: replace it (once, if several calls saw it); its states move to the new one and its neighbours
+                if self.remove_worker(worker):
+                    self.add_worker()
+                continue
+            finally:
+                with self._lock:
+                    if worker in self._in_flight:
+                        self._in_flight[worker] -= 1
+            with self._lock:
+                self._stats['hits' if hit else 'misses'] += 1
+            return frame
+        raise RuntimeError(f'Could not render a frame for state {state_id}')
+
+    def warm_up(self, fn):
+        """Start every worker and run fn once in each, without waiting. Returns the futures."""
+        with self._lock:
+            return [executor.submit(fn) for executor in self._executors.values()]
+
+    def metrics(self):
+        """Cache hits and misses, resends after evictions, spills to a less loaded worker and per-worker load."""
+        with self._lock:
+            total = self._stats['hits'] + self._stats['misses']
+            return dict(
+                self._stats,
+                hit_rate=self._stats['hits'] / total if total else None,
+                workers={worker: {'in_flight': self._in_flight[worker], 'states': len(self._known[worker])} for worker in self._executors}
+            )
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executors = list(self._executors.values())
+        for executor in executors:
+            executor.shutdown(wait=wait)
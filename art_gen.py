@@ -1,15 +1,74 @@
 from PIL import Image, ImageDraw
+from colorsys import rgb_to_hsv, hsv_to_rgb
 import random
+import math
 from math import sqrt
 import base64
+from contextlib import contextmanager
 from io import BytesIO
+import hashlib
+import importlib.util
+import json
 import os
+import shutil
 import tempfile
-try:
-    import imageio  # type: ignore
-    IMAGEIO_AVAILABLE = True
-except ImportError:
-    IMAGEIO_AVAILABLE = False
+import zlib
+from time import perf_counter
+
+# Bump whenever a change alters rendered output, so cached renders from older versions are not reused
+ENGINE_VERSION = 1
+
+# Frames in flight between each pair of video pipeline stages (bounds memory to a few frames)
+VIDEO_QUEUE_SIZE = 4
+
+# imageio (and ffmpeg behind it) is only imported when a video is first requested
+IMAGEIO_AVAILABLE = importlib.util.find_spec('imageio') is not None
+_imageio = None
+
+def load_imageio():
+    """Import imageio on first use so starting the app and rendering stills doesn't pay for it."""
+    global _imageio
+    if _imageio is None:
+        if not IMAGEIO_AVAILABLE:
+            raise ImportError("imageio is required for video generation. Install it with: pip install imageio imageio-ffmpeg")
+        import imageio  # type: ignore
+        _imageio = imageio
+    return _imageio
+
+def encode_output(image, output):
+    """Encode a rendered PIL image per output: 'image' (as is), 'raw' (RGB bytes), 'png' (bytes) or 'data_url'."""
+    if output == 'image':
+        return image
+    if output == 'raw':
+        return image.tobytes()
+    buffered = BytesIO()
+    image.save(buffered, format="PNG")
+    if output == 'png':
+        return buffered.getvalue()
+    return 'data:image/png;base64, ' + base64.b64encode(buffered.getvalue()).decode('utf-8')
+
+@contextmanager
+def process_pool(executor=None, workers=None, jobs=None):
+    """
+    The executor to run jobs on: the given one, else a new process pool of `workers` (None = all cores,
+    capped at `jobs`) that is shut down on exit. Yields None when the work should run in-process instead.
+    """
+    if executor is not None:
+        yield executor
+        return
+    workers = workers or os.cpu_count() or 1
+    if jobs is not None:
+        workers = min(workers, jobs)
+    if workers <= 1:
+        yield None
+        return
+    # Imported here: it pulls in multiprocessing, which importing art_gen for a still doesn't need
+    from concurrent.futures import ProcessPoolExecutor
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        yield pool
+    finally:
+        pool.shutdown()
 
 def compare_clrs(clr1, clr2):
     r, g, b = clr1
@@ -18,20 +77,59 @@ def compare_clrs(clr1, clr2):
     distance = sqrt(distance)
     return distance
 
+# Candidate pool for distinct palettes: a 12-level lattice over RGB space (1728 colors)
+PALETTE_LEVELS = [round(i * 255 / 11) for i in range(12)]
+PALETTE_POOL = [(r, g, b) for r in PALETTE_LEVELS for g in PALETTE_LEVELS for b in PALETTE_LEVELS]
+# Half the lattice spacing - jitter within this range keeps colors spread over the full 0-255 range
+PALETTE_JITTER = 11
+
+def distinct_palette(amount, min_distance=200, seed=None, existing=None):
+    """
+    Pick colors that are at least min_distance apart (and from any existing colors) in bounded time.
+    Every pick filters a fixed candidate pool instead of rejection sampling, so the cost is
+    O(amount * pool size) no matter how crowded the palette gets. When no candidate satisfies the
+    distance rule any more, the candidate farthest from all chosen colors is used instead of looping.
+    Deterministic for a given seed; without a seed it draws from the module-level random state.
+    """
+    rng = random.Random(seed) if seed is not None else random
+    min_distance_sq = min_distance * min_distance
+    chosen = [tuple(color) for color in (existing or [])]
+    
+    def distance_sq(clr1, clr2):
+        return (clr1[0] - clr2[0]) ** 2 + (clr1[1] - clr2[1]) ** 2 + (clr1[2] - clr2[2]) ** 2
+    
+    # Squared distance from every candidate to its nearest chosen color, updated incrementally
+    nearest = [float('inf')] * len(PALETTE_POOL)
+    for color in chosen:
+        for index, candidate in enumerate(PALETTE_POOL):
+            nearest[index] = min(nearest[index], distance_sq(candidate, color))
+    
+    palette = []
+    for _ in range(amount):
+        valid = [index for index, dist in enumerate(nearest) if dist >= min_distance_sq]
+        if valid:
+            base = PALETTE_POOL[rng.choice(valid)]
+        else:
+            base = PALETTE_POOL[max(range(len(nearest)), key=nearest.__getitem__)]
+        
+        # Jitter inside the lattice cell, but only keep it if the distance rule still holds
+        new_color = tuple(max(0, min(255, channel + rng.randint(-PALETTE_JITTER, PALETTE_JITTER))) for channel in base)
+        if valid and any(distance_sq(new_color, color) < min_distance_sq for color in chosen):
+            new_color = base
+        
+        palette.append(new_color)
+        chosen.append(new_color)
+        r, g, b = new_color
+        for index, (cr, cg, cb) in enumerate(PALETTE_POOL):
+            dist = (cr - r) * (cr - r) + (cg - g) * (cg - g) + (cb - b) * (cb - b)
+            if dist < nearest[index]:
+                nearest[index] = dist
+    
+    return palette
+
 def rand_clr(colors):
-    if colors != []:
-        restart = True
-        while restart:
-            new_color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
-            for index, color in enumerate(colors):
-                if compare_clrs(new_color, color) < 200:
-                    break
-                elif index == len(colors) - 1:
-                    restart = False
-                    break
-        return new_color
-    else:
-        return (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
+    """Pick one random color at least 200 units away from every color in colors."""
+    return distinct_palette(1, existing=colors)[0]
 
 def interpolate(start_clr, end_clr, factor: float):
     recip = 1 - factor
@@ -41,10 +139,103 @@ def interpolate(start_clr, end_clr, factor: float):
         int(start_clr[2] * recip + end_clr[2] * factor)
     )
 
-def gen_art(size, amount, line_width, line_width_variation, padding, border_width, seed=None, art_state=None):
+def bezier_points(start, control1, control2, end, segments=30):
+    """Sample a cubic bezier curve into integer points for drawing as line segments."""
+    points = []
+    for i in range(segments + 1):
+        t = i / segments
+        # Cubic bezier formula: (1-t)³P₀ + 3(1-t)²tP₁ + 3(1-t)t²P₂ + t³P₃
+        x = int((1-t)**3 * start[0] + 3*(1-t)**2*t * control1[0] + 3*(1-t)*t**2 * control2[0] + t**3 * end[0])
+        y = int((1-t)**3 * start[1] + 3*(1-t)**2*t * control1[1] + 3*(1-t)*t**2 * control2[1] + t**3 * end[1])
+        points.append((x, y))
+    return points
+
+def layout_curves(initial_point, line_end_points, curve_control_points, line_start_points,
+                  line_width, line_width_variations, start_clr, end_clr, amount, width_scale=1.0, sample=True):
+    """
+    Resolve the branching chain of curves into drawable (points, color, width) tuples.
+    Curves are returned in draw order so later curves paint over earlier ones.
+    width_scale rescales stroke widths when the points were scaled to another canvas size.
+    sample=False returns the raw (start, control1, control2, end) instead of sampled points (for vector output).
+    """
+    curves = []
+    last_point = tuple(initial_point)
+    previous_end_points = [last_point]  # Track all previous end points for branching
+    
+    for i in range(amount):
+        # Use pre-generated values (either from art_state or generated above)
+        rand_y = tuple(line_end_points[i])
+        line_width_with_varation = line_width + line_width_variations[i]
+        if width_scale != 1.0:
+            line_width_with_varation = max(1, int(round(line_width_with_varation * width_scale)))
+        controls = curve_control_points[i]
+        control1 = tuple(controls[0])
+        control2 = tuple(controls[1])
+        
+        # Determine starting point for this line - create complex branching patterns
+        if line_start_points[i] is None:
+            # Continue from last point (creates flowing chains)
+            rand_x = last_point
+        elif isinstance(line_start_points[i], int):
+            # Branch from a previous line's end point
+            branch_index = line_start_points[i]
+            if branch_index < len(previous_end_points):
+                rand_x = previous_end_points[branch_index]
+            else:
+                rand_x = last_point
+        else:
+            rand_x = last_point
+        
+        line_color = interpolate(start_clr, end_clr, i / (amount - 1) if amount > 1 else 0)
+        
+        # Complex curved line using cubic bezier curve (more organic and flowing)
+        if sample:
+            curves.append((bezier_points(rand_x, control1, control2, rand_y), line_color, line_width_with_varation))
+        else:
+            curves.append(((rand_x, control1, control2, rand_y), line_color, line_width_with_varation))
+        last_point = rand_y
+        previous_end_points.append(rand_y)  # Track for branching
+    
+    return curves
+
+def svg_color(clr):
+    return '#%02x%02x%02x' % (int(clr[0]), int(clr[1]), int(clr[2]))
+
+def svg_markup(size, curves, bg_clr, border_clr, border_width, display_size=None):
+    """
+    Build an SVG document from unsampled curves (layout_curves with sample=False).
+    Coordinates stay in the state's own size via the viewBox; display_size only sets the displayed size.
+    """
+    display_size = display_size or size
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{display_size}" height="{display_size}" viewBox="0 0 {size} {size}">',
+        f'<rect width="{size}" height="{size}" fill="{svg_color(bg_clr)}"/>'
+    ]
+    if border_width > 0:
+        # Stroke is centered on the outline, so inset by half the width to match the raster border
+        inset = border_width / 2
+        parts.append(
+            f'<rect x="{inset}" y="{inset}" width="{size - border_width}" height="{size - border_width}" '
+            f'fill="none" stroke="{svg_color(border_clr)}" stroke-width="{border_width}"/>'
+        )
+    parts.append('<g fill="none">')
+    for (start, control1, control2, end), line_color, width in curves:
+        parts.append(
+            f'<path d="M{start[0]} {start[1]}C{control1[0]} {control1[1]} {control2[0]} {control2[1]} {end[0]} {end[1]}" '
+            f'stroke="{svg_color(line_color)}" stroke-width="{width}"/>'
+        )
+    parts.append('</g></svg>')
+    return ''.join(parts)
+
+def gen_art(size, amount, line_width, line_width_variation, padding, border_width, seed=None, art_state=None, render_size=None, output='data_url', canvas=None):
     """
     Generate art with optional seed for deterministic generation.
     If art_state is provided, it will use those exact values instead of generating new random ones.
+    If render_size is provided, the state is still built for size but drawn at render_size
+    (used for fast grid thumbnails that can be re-rendered at full size later).
+    output selects the image format: 'data_url' (base64 PNG for the UI), 'png' (raw bytes), 'image' (PIL image)
+    or 'svg' (SVG markup with the exact curves, nothing is rasterized).
+    canvas is an RGB image of the drawing size to draw into instead of allocating a new one (see draw_art).
     """
     size = int(size)
     amount = int(amount)
@@ -56,7 +247,6 @@ def gen_art(size, amount, line_width, line_width_variation, padding, border_widt
     if seed is not None:
         random.seed(seed)
     
-    colors = []
     image_size = size
     if padding > 0:
         image_padding = padding
@@ -112,14 +302,7 @@ def gen_art(size, amount, line_width, line_width_variation, padding, border_widt
                 else:
                     line_start_points.append(None)
     else:
-        start_clr = rand_clr(colors)
-        colors.append(start_clr)
-        end_clr = rand_clr(colors)
-        colors.append(end_clr)
-        image_bg_clr = rand_clr(colors)
-        colors.append(image_bg_clr)
-        border_clr = rand_clr(colors)
-        colors.append(border_clr)
+        start_clr, end_clr, image_bg_clr, border_clr = distinct_palette(4)
         initial_point = (random.randint(image_padding, image_size - image_padding), 
                         random.randint(image_padding, image_size - image_padding))
         # Pre-generate all line points, variations, and curve control points
@@ -137,7 +320,6 @@ def gen_art(size, amount, line_width, line_width_variation, padding, border_widt
             
             # Generate multiple control points for more complex curves (2 control points = cubic bezier)
             # Make them more psychedelic with extreme positions and variations
-            import math
             # Create more extreme control points for psychedelic curves
             # Use polar coordinates with dramatic variations
             center_x = image_size / 2
@@ -179,66 +361,15 @@ def gen_art(size, amount, line_width, line_width_variation, padding, border_widt
                 # Most lines continue from last point (creates flowing chains)
                 line_start_points.append(None)  # None means use last_point
     
-    image = Image.new('RGB', (image_size, image_size), image_bg_clr)
-   
-    #Draw interface
-    draw = ImageDraw.Draw(image)
-
-    #Draw border
-    draw.rectangle((0, 0, image_size - 1, image_size - 1), outline=border_clr, width=border_width)
-
-    #Draw lines with complex curves
-    line_amount = amount
-    last_point = initial_point
-    previous_end_points = [initial_point]  # Track all previous end points for branching
-    
-    def draw_cubic_bezier_curve(draw, start, control1, control2, end, color, width, segments=30):
-        """Draw a cubic bezier curve using multiple line segments for more complex curves."""
-        points = []
-        for i in range(segments + 1):
-            t = i / segments
-            # Cubic bezier formula: (1-t)³P₀ + 3(1-t)²tP₁ + 3(1-t)t²P₂ + t³P₃
-            x = int((1-t)**3 * start[0] + 3*(1-t)**2*t * control1[0] + 3*(1-t)*t**2 * control2[0] + t**3 * end[0])
-            y = int((1-t)**3 * start[1] + 3*(1-t)**2*t * control1[1] + 3*(1-t)*t**2 * control2[1] + t**3 * end[1])
-            points.append((x, y))
-        
-        # Draw curve as connected line segments
-        for j in range(len(points) - 1):
-            draw.line([points[j], points[j+1]], color, width)
-    
-    for i in range(line_amount):
-        # Use pre-generated values (either from art_state or generated above)
-        rand_y = tuple(line_end_points[i])
-        line_width_with_varation = line_width + line_width_variations[i]
-        controls = curve_control_points[i]
-        control1 = tuple(controls[0])
-        control2 = tuple(controls[1])
-        
-        # Determine starting point for this line - create complex branching patterns
-        if line_start_points[i] is None:
-            # Continue from last point (creates flowing chains)
-            rand_x = last_point
-        elif isinstance(line_start_points[i], int):
-            # Branch from a previous line's end point
-            branch_index = line_start_points[i]
-            if branch_index < len(previous_end_points):
-                rand_x = previous_end_points[branch_index]
-            else:
-                rand_x = last_point
-        else:
-            rand_x = last_point
-        
-        line_color = interpolate(start_clr, end_clr, i / (line_amount - 1) if line_amount > 1 else 0)
-       
-        # Draw complex curved line using cubic bezier curve (more organic and flowing)
-        draw_cubic_bezier_curve(draw, rand_x, control1, control2, rand_y, line_color, line_width_with_varation)
-        last_point = rand_y
-        previous_end_points.append(rand_y)  # Track for branching
-   
-    #return Image
-    buffered = BytesIO()
-    image.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
+    if output == 'svg':
+        # Vector output: emit the curves themselves and let the viewer scale them to render_size
+        curves = layout_curves(initial_point, line_end_points, curve_control_points, line_start_points,
+                               line_width, line_width_variations, start_clr, end_clr, amount, sample=False)
+        result = svg_markup(image_size, curves, image_bg_clr, border_clr, border_width, render_size)
+    else:
+        result = draw_art(image_size, padding, border_width, initial_point, line_end_points, curve_control_points,
+                          line_start_points, line_width, line_width_variations, start_clr, end_clr, image_bg_clr,
+                          border_clr, amount, render_size, output, canvas)
     
     # Return image and state for video generation
     if art_state is None:
@@ -254,9 +385,55 @@ def gen_art(size, amount, line_width, line_width_variation, padding, border_widt
             'curve_control_points': [[list(p[0]), list(p[1])] for p in curve_control_points],
             'line_start_points': line_start_points
         }
-        return 'data:image/png;base64, ' + img_str, state
+        return result, state
     else:
-        return 'data:image/png;base64, ' + img_str
+        return result
+
+def draw_art(image_size, padding, border_width, initial_point, line_end_points, curve_control_points,
+             line_start_points, line_width, line_width_variations, start_clr, end_clr, image_bg_clr,
+             border_clr, amount, render_size=None, output='data_url', canvas=None):
+    """
+    Rasterize resolved art values with PIL and encode them as requested (see gen_art's output).
+    A canvas of the right size is cleared and drawn into instead of a new image, so a caller rendering
+    many frames can reuse one buffer; with output='image' the canvas itself is returned.
+    """
+    # Optionally draw at a different resolution, mapping the full-size state onto it
+    draw_size = image_size
+    draw_border_width = border_width
+    draw_points = {
+        'initial_point': initial_point,
+        'line_end_points': line_end_points,
+        'curve_control_points': curve_control_points
+    }
+    width_scale = 1.0
+    if render_size is not None and int(render_size) != image_size:
+        draw_size = int(render_size)
+        width_scale = draw_size / image_size
+        draw_padding = int(round(padding * width_scale))
+        draw_points = scale_state(draw_points, image_size, draw_size, padding, draw_padding)
+        draw_border_width = int(round(border_width * width_scale))
+    
+    if canvas is not None and canvas.size == (draw_size, draw_size):
+        image = canvas
+        image.paste(image_bg_clr, (0, 0, draw_size, draw_size))
+    else:
+        image = Image.new('RGB', (draw_size, draw_size), image_bg_clr)
+   
+    #Draw interface
+    draw = ImageDraw.Draw(image)
+
+    #Draw border
+    draw.rectangle((0, 0, draw_size - 1, draw_size - 1), outline=border_clr, width=draw_border_width)
+
+    #Draw lines with complex curves
+    for points, line_color, width in layout_curves(
+            draw_points['initial_point'], draw_points['line_end_points'], draw_points['curve_control_points'],
+            line_start_points, line_width, line_width_variations, start_clr, end_clr, amount, width_scale):
+        # Draw curve as connected line segments
+        for j in range(len(points) - 1):
+            draw.line([points[j], points[j+1]], line_color, width)
+   
+    return encode_output(image, output)
 
 def interpolate_params(start_params, end_params, factor):
     """Interpolate between two parameter sets."""
@@ -301,9 +478,26 @@ def scale_points(points, old_size, new_size, old_padding, new_padding):
     
     return scaled_points
 
+def scale_state(art_state, old_size, new_size, old_padding, new_padding):
+    """Scale every coordinate in an art state to a new size, keeping colors and branching unchanged."""
+    scaled_state = dict(art_state)
+    scaled_state['initial_point'] = scale_points([art_state['initial_point']], old_size, new_size, old_padding, new_padding)[0]
+    scaled_state['line_end_points'] = scale_points(art_state['line_end_points'], old_size, new_size, old_padding, new_padding)
+
+    control_points = art_state.get('curve_control_points')
+    if control_points and isinstance(control_points[0][0], (list, tuple)):
+        # New format: scale both control points of every curve in one pass
+        flat_points = [point for pair in control_points for point in pair]
+        scaled_flat = scale_points(flat_points, old_size, new_size, old_padding, new_padding)
+        scaled_state['curve_control_points'] = [[scaled_flat[2 * i], scaled_flat[2 * i + 1]] for i in range(len(control_points))]
+    elif control_points:
+        # Old format: single control point per curve
+        scaled_state['curve_control_points'] = scale_points(control_points, old_size, new_size, old_padding, new_padding)
+
+    return scaled_state
+
 def generate_end_colors(start_colors):
     """Generate end colors by shifting the start colors in HSV space for smooth transitions."""
-    from colorsys import rgb_to_hsv, hsv_to_rgb
     
     end_colors = {}
     for key, color in start_colors.items():
@@ -311,8 +505,9 @@ def generate_end_colors(start_colors):
         h, s, v = rgb_to_hsv(r, g, b)
         
         # Shift hue by 60-120 degrees for interesting color transitions
-        import random
-        random.seed(hash(key) % 1000)  # Deterministic but different for each color
+        # Deterministic but different for each color - crc32 because str hash() is randomized per
+        # process, which would give every render worker (and video segment) different colors
+        random.seed(zlib.crc32(key.encode('utf-8')) % 1000)
         hue_shift = random.uniform(0.15, 0.35)  # 60-120 degrees
         new_h = (h + hue_shift) % 1.0
         
@@ -327,8 +522,6 @@ def generate_end_colors(start_colors):
 
 def generate_end_points(start_points, image_size, padding):
     """Generate end positions for line points with psychedelic, chaotic movement patterns."""
-    import random
-    import math
     
     end_points = []
     image_padding = padding if padding > 0 else 1
@@ -383,7 +576,7 @@ def generate_end_points(start_points, image_size, padding):
     
     return end_points
 
-def generate_frame_at_time(art_state, start_params, end_params, time_factor, speed=1.0, zoom=1.1, zoom_speed=0.0, gyro_x=0.0, gyro_y=0.0):
+def generate_frame_at_time(art_state, start_params, end_params, time_factor, speed=1.0, zoom=1.1, zoom_speed=0.0, gyro_x=0.0, gyro_y=0.0, output='data_url', render_size=None, animation=None, canvas=None):
     """
     Generate a single frame at a specific time factor (0.0 to 1.0) for real-time preview.
     
@@ -395,8 +588,11 @@ def generate_frame_at_time(art_state, start_params, end_params, time_factor, spe
         speed: Animation speed multiplier
         zoom: Starting zoom level
         zoom_speed: How fast zoom changes
+        output: Image format, same options as gen_art
+        render_size: Draw the frame at this size instead of the state's size (same as gen_art)
+        animation: Precomputed prepare_animation result, to share across many frames of one state
+        canvas: Image buffer to draw into instead of a new one (see draw_art)
     """
-    import math
     
     original_size = start_params['size']
     original_padding = start_params['padding']
@@ -405,41 +601,15 @@ def generate_frame_at_time(art_state, start_params, end_params, time_factor, spe
     # Normalize speed: 20.0 becomes 1.0x, so divide by 20
     normalized_speed = speed / 20.0
     
-    # Generate multiple color sets for smooth continuous transitions
-    start_colors = {
-        'start_clr': art_state['start_clr'],
-        'end_clr': art_state['end_clr'],
-        'image_bg_clr': art_state['image_bg_clr'],
-        'border_clr': art_state['border_clr']
-    }
-    color_set_1 = generate_end_colors(start_colors)
-    color_set_2 = generate_end_colors(color_set_1)
-    color_set_3 = generate_end_colors(color_set_2)
-    color_sets = [start_colors, color_set_1, color_set_2, color_set_3]
-    
-    # Generate end positions for line points
-    start_line_points = art_state['line_end_points']
-    end_line_points = generate_end_points(start_line_points, original_size, original_padding)
-    start_initial_point = art_state['initial_point']
-    end_initial_point = generate_end_points([start_initial_point], original_size, original_padding)[0]
-    
-    # Generate end positions for curve control points
-    if 'curve_control_points' in art_state and len(art_state['curve_control_points']) > 0:
-        start_control_points = art_state['curve_control_points']
-        end_control_points = []
-        for ctrl_pair in start_control_points:
-            if isinstance(ctrl_pair, list) and len(ctrl_pair) == 2 and isinstance(ctrl_pair[0], list):
-                end_ctrl1 = generate_end_points([ctrl_pair[0]], original_size, original_padding)[0]
-                end_ctrl2 = generate_end_points([ctrl_pair[1]], original_size, original_padding)[0]
-                end_control_points.append([end_ctrl1, end_ctrl2])
-            else:
-                old_ctrl = ctrl_pair if isinstance(ctrl_pair, (list, tuple)) else list(ctrl_pair)
-                end_ctrl1 = generate_end_points([old_ctrl], original_size, original_padding)[0]
-                end_ctrl2 = generate_end_points([old_ctrl], original_size, original_padding)[0]
-                end_control_points.append([end_ctrl1, end_ctrl2])
-    else:
-        start_control_points = []
-        end_control_points = []
+    if animation is None:
+        animation = prepare_animation(art_state, start_params)
+    color_sets = animation['color_sets']
+    start_line_points = animation['start_line_points']
+    end_line_points = animation['end_line_points']
+    start_initial_point = animation['start_initial_point']
+    end_initial_point = animation['end_initial_point']
+    start_control_points = animation['start_control_points']
+    end_control_points = animation['end_control_points']
     
     # Calculate factors
     base_factor = time_factor
@@ -470,7 +640,6 @@ def generate_frame_at_time(art_state, start_params, end_params, time_factor, spe
     modified_state = art_state.copy()
     
     # Interpolate colors with gyro-based hue shift
-    from colorsys import rgb_to_hsv, hsv_to_rgb
     
     # Apply gyro-based color shift (hue rotation based on gyro position)
     # Gyro creates a noticeable color shift - stronger when further from center
@@ -618,7 +787,6 @@ def generate_frame_at_time(art_state, start_params, end_params, time_factor, spe
                     end_ctrl1 = end_ctrls[0]
                     end_ctrl2 = end_ctrls[1]
                 else:
-                    import random
                     start_ctrl1 = start_ctrls if isinstance(start_ctrls, (list, tuple)) else list(start_ctrls)
                     end_ctrl1 = end_ctrls if isinstance(end_ctrls, (list, tuple)) else list(end_ctrls)
                     start_ctrl2 = [start_ctrl1[0] + random.randint(-30, 30), start_ctrl1[1] + random.randint(-30, 30)]
@@ -674,7 +842,6 @@ def generate_frame_at_time(art_state, start_params, end_params, time_factor, spe
         if 'line_start_points' in art_state:
             modified_state['line_start_points'] = art_state['line_start_points']
         elif 'line_start_points' not in modified_state:
-            import random
             line_start_points = []
             for j in range(current_amount):
                 if j == 0:
@@ -693,43 +860,111 @@ def generate_frame_at_time(art_state, start_params, end_params, time_factor, spe
         current_params['line_width_variation'],
         original_padding,
         current_params['border_width'],
-        art_state=modified_state
+        art_state=modified_state,
+        render_size=render_size,
+        output=output,
+        canvas=canvas
     )
     
-    # Return frame data directly (gen_art already returns base64 encoded image)
+    # Return frame data directly (gen_art already encodes the image in the requested format)
     return frame_result
 
-def generate_video(art_state, start_params, end_params, duration_seconds=30, fps=10, speed=1.0, zoom=1.1, zoom_speed=0.0):
+# Packed frame sheets: gap between frames in pixels
+FRAME_SHEET_GAP = 0
+
+def render_frame_batch(job):
     """
-    Generate a video by slowly tweaking parameters over time.
-    Interpolates ALL parameters including colors for smooth animation.
+    Render a batch of timeline positions in one worker, drawing every frame into the same buffer.
+    Returns [(index, frame)] where frame is encoded per output ('raw' = RGB bytes, cheap to pickle).
+    """
+    art_state, start_params, end_params, animation, settings, render_size, output, batch = job
+    canvas = None
+    frames = []
+    for index, time_factor in batch:
+        image = generate_frame_at_time(
+            art_state, start_params, end_params, time_factor, render_size=render_size,
+            animation=animation, output='image', canvas=canvas, **settings
+        )
+        # The next frame is drawn over this one, so it is encoded before moving on
+        canvas = image
+        frames.append((index, encode_output(image, output)))
+    return frames
+
+def pack_frames(images, columns=None, gap=FRAME_SHEET_GAP):
+    """
+    Lay equally sized frames out row by row in one sheet image.
+    Returns (sheet, boxes) with each frame's [x, y, width, height] in the sheet, in frame order.
+    """
+    width, height = images[0].size
+    columns = max(1, min(int(columns or len(images)), len(images)))
+    rows = (len(images) + columns - 1) // columns
+    sheet = Image.new('RGB', (columns * width + (columns - 1) * gap, rows * height + (rows - 1) * gap))
+    boxes = []
+    for index, image in enumerate(images):
+        x = (index % columns) * (width + gap)
+        y = (index // columns) * (height + gap)
+        sheet.paste(image, (x, y))
+        boxes.append([x, y, width, height])
+    return sheet, boxes
+
+def generate_frames(art_state, start_params, end_params, time_factors, speed=1.0, zoom=1.1, zoom_speed=0.0, gyro_x=0.0, gyro_y=0.0,
+                    render_size=None, output='data_url', packed=False, columns=None, workers=None, executor=None, animation=None):
+    """
+    Render many positions of one animation in a single call. The time-independent setup (prepare_animation)
+    is done once and each worker draws all its frames into one reused image buffer.
     
     Args:
-        art_state: The deterministic art state (colors, points, etc.)
-        start_params: Starting parameters (size, amount, line_width, etc.)
-        end_params: Ending parameters to interpolate to
-        duration_seconds: Video duration in seconds
-        fps: Frames per second (lower = faster generation)
-        speed: Animation speed multiplier (1.0 = normal, 2.0 = 2x faster, 0.5 = 2x slower)
-        zoom: Starting zoom level (0.5-2.0) - <1.0 creates more room for movement, >1.0 zooms in (no edges)
-        zoom_speed: How fast zoom changes (0.0 = static, higher = zooms in/out over time)
+        time_factors: Timeline positions (0.0 to 1.0), rendered in this order
+        speed, zoom, zoom_speed, gyro_x, gyro_y: Animation settings shared by every frame
+        render_size: Draw the frames at this size instead of the state's size
+        output: 'data_url', 'png' or 'image' for every frame, or for the sheet when packed
+        packed: Return one sheet with all frames (see pack_frames) instead of a list
+        columns: Frames per sheet row when packed (default: all in one row)
+        workers: Worker processes (None = all cores, 1 = in-process)
+        executor: Existing executor to render batches on instead of starting a new pool
+        animation: Precomputed prepare_animation result
+    
+    Returns:
+        List of frames in time_factors order, or (sheet, boxes) when packed
     """
-    if not IMAGEIO_AVAILABLE:
-        raise ImportError("imageio is required for video generation. Install it with: pip install imageio imageio-ffmpeg")
+    if not time_factors:
+        raise ValueError("No time factors to render")
+    if animation is None:
+        animation = prepare_animation(art_state, start_params)
+    settings = {'speed': speed, 'zoom': zoom, 'zoom_speed': zoom_speed, 'gyro_x': gyro_x, 'gyro_y': gyro_y}
+    draw_size = int(render_size or start_params['size'])
     
-    total_frames = duration_seconds * fps
-    frames = []
+    # Frames come back raw when they will be packed or turned into PIL images here
+    batch_output = 'raw' if packed or output == 'image' else output
+    indexed = list(enumerate(float(t) for t in time_factors))
     
-    # Create temporary directory for frames
-    temp_dir = tempfile.mkdtemp()
+    with process_pool(executor, workers, len(time_factors)) as pool:
+        # Contiguous runs of the timeline per batch: neighbouring frames share most of their look
+        batch_count = min(len(time_factors), workers or os.cpu_count() or 1) if pool else 1
+        batch_length = (len(time_factors) + batch_count - 1) // batch_count
+        jobs = [
+            (art_state, start_params, end_params, animation, settings, render_size, batch_output, indexed[start:start + batch_length])
+            for start in range(0, len(indexed), batch_length)
+        ]
+        results = list(pool.map(render_frame_batch, jobs)) if pool else [render_frame_batch(job) for job in jobs]
     
-    # Store original state - size stays constant throughout video
+    frames = [None] * len(time_factors)
+    for batch in results:
+        for index, frame in batch:
+            frames[index] = Image.frombytes('RGB', (draw_size, draw_size), frame) if batch_output == 'raw' else frame
+    
+    if not packed:
+        return frames
+    sheet, boxes = pack_frames(frames, columns)
+    return encode_output(sheet, output), boxes
+
+def prepare_animation(art_state, start_params):
+    """
+    Precompute everything an animation needs that doesn't depend on time: the color sets to cycle
+    through and end positions for line points, the initial point and curve control points.
+    """
     original_size = start_params['size']
     original_padding = start_params['padding']
-    original_amount = len(art_state['line_end_points'])
-    
-    # Determine target video size (use original size, rounded to multiple of 16)
-    target_video_size = ((original_size + 8) // 16) * 16  # Round up to nearest multiple of 16
     
     # Generate multiple color sets for smooth continuous transitions
     # This prevents abrupt color changes when cycling
@@ -778,316 +1013,471 @@ def generate_video(art_state, start_params, end_params, duration_seconds=30, fps
         start_control_points = []
         end_control_points = []
     
+    return {
+        'color_sets': color_sets,
+        'start_line_points': start_line_points,
+        'end_line_points': end_line_points,
+        'start_initial_point': start_initial_point,
+        'end_initial_point': end_initial_point,
+        'start_control_points': start_control_points,
+        'end_control_points': end_control_points
+    }
+
+def video_frame_size(size):
+    """Video frames are resized to a multiple of 16 for the encoder."""
+    return ((size + 8) // 16) * 16  # Round up to nearest multiple of 16
+
+def render_video_frame(art_state, start_params, end_params, animation, frame_num, total_frames, speed=1.0, zoom=1.1, zoom_speed=0.0):
+    """
+    Render one video frame as a PIL image at the video size.
+    The frame depends only on frame_num and total_frames, so frames can be rendered in any order or process.
+    
+    Args:
+        animation: Precomputed animation data from prepare_animation
+        frame_num: Index of the frame to render
+        total_frames: Frame count of the whole video
+    """
+    frame = video_frame_geometry(art_state, start_params, end_params, animation, frame_num, total_frames, speed, zoom, zoom_speed)
+    return fit_video_frame(rasterize_frame(frame), video_frame_size(start_params['size']))
+
+def rasterize_frame(frame):
+    """Draw a frame described by video_frame_geometry at the state's size."""
+    gen_args, frame_state = frame
+    return gen_art(*gen_args, art_state=frame_state, output='image')
+
+def frame_key(frame):
+    """
+    Digest of everything rasterize_frame draws from: the integer params gen_art uses and the frame state,
+    whose points and colors video_frame_geometry already rounded. Frames with the same key are pixel-identical.
+    """
+    gen_args, frame_state = frame
+    size, amount, line_width, _, padding, border_width = gen_args
+    payload = json.dumps(
+        [int(size), int(amount), int(line_width), int(padding), int(border_width), frame_state],
+        sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+def video_frame_stages(art_state, start_params, end_params, animation, total_frames, speed=1.0, zoom=1.1, zoom_speed=0.0, reuse=None):
+    """
+    The geometry, raster and convert pipeline stages of a video (frame number in, RGB array at the video size out).
+    When a frame's render inputs match the previous frame's (slow clips round many frames to the same points
+    and colors), it is neither drawn nor resized: the previous array is passed on and the encoder gets it again.
+    
+    Args:
+        reuse: Optional dict that receives the number of 'repeated_frames'
+    """
+    import numpy as np  # Installed with imageio
+    target_video_size = video_frame_size(start_params['size'])
+    if reuse is None:
+        reuse = {}
+    reuse['repeated_frames'] = 0
+    # Each stage runs on its own thread, so each keeps its own "previous frame"
+    last_key = [None]
+    last_array = [None]
+    
+    def raster(frame):
+        key = frame_key(frame)
+        if key == last_key[0]:
+            reuse['repeated_frames'] += 1
+            return None
+        last_key[0] = key
+        return rasterize_frame(frame)
+    
+    def convert(img):
+        if img is not None:
+            last_array[0] = np.asarray(fit_video_frame(img, target_video_size))
+        return last_array[0]
+    
+    return [
+        ('geometry', lambda frame_num: video_frame_geometry(art_state, start_params, end_params, animation, frame_num, total_frames, speed, zoom, zoom_speed)),
+        ('raster', raster),
+        ('convert', convert)
+    ]
+
+def fit_video_frame(img, target_video_size):
+    """Resize a frame to the video size (divisible by 16) so every frame has the encoder's dimensions."""
+    if img.size[0] != target_video_size or img.size[1] != target_video_size:
+        # Use LANCZOS resampling (PIL.Image.LANCZOS for older versions)
+        try:
+            img = img.resize((target_video_size, target_video_size), Image.Resampling.LANCZOS)
+        except AttributeError:
+            img = img.resize((target_video_size, target_video_size), Image.LANCZOS)
+    return img
+
+def video_frame_geometry(art_state, start_params, end_params, animation, frame_num, total_frames, speed=1.0, zoom=1.1, zoom_speed=0.0):
+    """
+    Everything about one video frame except drawing it: interpolated colors, params and animated points.
+    Returns (gen_args, frame_state) for rasterize_frame.
+    """
+    original_size = start_params['size']
+    original_padding = start_params['padding']
+    original_amount = len(art_state['line_end_points'])
+    color_sets = animation['color_sets']
+    start_line_points = animation['start_line_points']
+    end_line_points = animation['end_line_points']
+    start_initial_point = animation['start_initial_point']
+    end_initial_point = animation['end_initial_point']
+    start_control_points = animation['start_control_points']
+    end_control_points = animation['end_control_points']
+    
+    # Calculate interpolation factor (0 to 1)
+    # Use speed to control animation speed
+    # Speed is now on a scale where 20.0 = 1.0x baseline
+    base_factor = frame_num / (total_frames - 1) if total_frames > 1 else 0
+    
+    # Normalize speed: 20.0 becomes 1.0x, so divide by 20
+    normalized_speed = speed / 20.0
+    
+    # Colors progress forward continuously through multiple color sets
+    # Use linear progression that cycles through color sets for smooth fading
+    # Color speed stays the same (not affected by the 10x geometry multiplier)
+    color_progress = base_factor * normalized_speed * len(color_sets)
+    
+    # Find which two color sets to interpolate between
+    color_set_index = int(color_progress) % len(color_sets)
+    next_color_set_index = (color_set_index + 1) % len(color_sets)
+    
+    # Get the interpolation factor between the two color sets (0.0 to 1.0)
+    color_factor = color_progress % 1.0
+    
+    # Get the two color sets to interpolate between
+    current_color_set = color_sets[color_set_index]
+    next_color_set = color_sets[next_color_set_index]
+    
+    # Geometry movement - 12x faster than colors (smoother than 20x)
+    # At higher speeds, geometry moves faster and continues beyond end points (no looping)
+    geometry_time = base_factor * normalized_speed * 12.0  # 12x faster than colors (smoother)
+    # Don't use modulo - let it continue beyond 1.0 for continuous transformation
+    # This makes geometry keep moving in the same direction, creating continuous morphing
+    geometry_factor = geometry_time  # Can go beyond 1.0 for continuous transformation
+    
+    # Interpolate parameters (but keep size constant)
+    current_params = interpolate_params(start_params, end_params, geometry_factor)
+    # Override size to keep it constant - don't interpolate size
+    current_params['size'] = original_size
+    current_params['padding'] = original_padding  # Also keep padding constant
+    
+    # Create modified art_state with interpolated colors and adjusted amount
+    modified_state = art_state.copy()
+    current_size = original_size  # Always use original size
+    current_padding = original_padding  # Always use original padding
+    current_amount = int(current_params['amount'])
+    
+    # Interpolate all colors smoothly between color sets
+    # This creates smooth fading transitions without abrupt changes
+    modified_state['start_clr'] = [
+        int(current_color_set['start_clr'][0] + (next_color_set['start_clr'][0] - current_color_set['start_clr'][0]) * color_factor),
+        int(current_color_set['start_clr'][1] + (next_color_set['start_clr'][1] - current_color_set['start_clr'][1]) * color_factor),
+        int(current_color_set['start_clr'][2] + (next_color_set['start_clr'][2] - current_color_set['start_clr'][2]) * color_factor)
+    ]
+    modified_state['end_clr'] = [
+        int(current_color_set['end_clr'][0] + (next_color_set['end_clr'][0] - current_color_set['end_clr'][0]) * color_factor),
+        int(current_color_set['end_clr'][1] + (next_color_set['end_clr'][1] - current_color_set['end_clr'][1]) * color_factor),
+        int(current_color_set['end_clr'][2] + (next_color_set['end_clr'][2] - current_color_set['end_clr'][2]) * color_factor)
+    ]
+    modified_state['image_bg_clr'] = [
+        int(current_color_set['image_bg_clr'][0] + (next_color_set['image_bg_clr'][0] - current_color_set['image_bg_clr'][0]) * color_factor),
+        int(current_color_set['image_bg_clr'][1] + (next_color_set['image_bg_clr'][1] - current_color_set['image_bg_clr'][1]) * color_factor),
+        int(current_color_set['image_bg_clr'][2] + (next_color_set['image_bg_clr'][2] - current_color_set['image_bg_clr'][2]) * color_factor)
+    ]
+    modified_state['border_clr'] = [
+        int(current_color_set['border_clr'][0] + (next_color_set['border_clr'][0] - current_color_set['border_clr'][0]) * color_factor),
+        int(current_color_set['border_clr'][1] + (next_color_set['border_clr'][1] - current_color_set['border_clr'][1]) * color_factor),
+        int(current_color_set['border_clr'][2] + (next_color_set['border_clr'][2] - current_color_set['border_clr'][2]) * color_factor)
+    ]
+    
+    # Handle amount changes first
+    if current_amount > original_amount:
+        # If amount increased, we can't add new points deterministically
+        # So we'll just use the original amount
+        current_amount = original_amount
+    
+    # Calculate dynamic zoom based on zoom_speed
+    # Zoom oscillates or progresses based on zoom_speed
+    if zoom_speed > 0:
+        # Create oscillating zoom effect (zooms in and out)
+        zoom_oscillation = math.sin(base_factor * math.pi * 2 * zoom_speed) * 0.3  # Oscillate ±30%
+        current_zoom = zoom + zoom_oscillation
+        current_zoom = max(0.5, min(2.0, current_zoom))  # Clamp to valid range
+    else:
+        current_zoom = zoom
+    
+    # Calculate bounds based on current zoom
+    # For zoom < 1.0: constrain to smaller area (more room for movement)
+    # For zoom >= 1.0: use full image bounds (zoom in, but still within image)
+    image_center = original_size / 2.0
+    image_padding = original_padding if original_padding > 0 else 1
+    
+    if current_zoom < 1.0:
+        # Constrain to smaller area
+        zoomed_size = original_size * current_zoom
+        zoom_offset = (original_size - zoomed_size) / 2.0
+        min_bound = max(image_padding, int(zoom_offset))
+        max_bound = min(original_size - image_padding - 1, int(original_size - zoom_offset - 1))
+    else:
+        # Use full image bounds (zoom in, but stay within image)
+        min_bound = image_padding
+        max_bound = original_size - image_padding - 1
+    
+    # Animate line points - interpolate from start to end positions with psychedelic effects
+    # Only animate the points that will be used (based on current_amount)
+    animated_line_points = []
+    points_to_use = min(current_amount, len(start_line_points))
+    for i in range(points_to_use):
+        start_pt = start_line_points[i]
+        end_pt = end_line_points[i]
+        # Interpolate position (can go beyond 1.0 for continuous movement)
+        animated_x = start_pt[0] + (end_pt[0] - start_pt[0]) * geometry_factor
+        animated_y = start_pt[1] + (end_pt[1] - start_pt[1]) * geometry_factor
+    
+        # Add smooth psychedelic wave distortions to movement
+        # Each point gets a unique wave pattern based on its index
+        wave_phase = i * 0.3 + geometry_factor * 1.5  # Smoother, slower wave phase
+        wave_amplitude = original_size * 0.04  # Reduced amplitude for smoother effect
+        wave_x = math.sin(wave_phase) * wave_amplitude
+        wave_y = math.cos(wave_phase * 1.2) * wave_amplitude
+    
+        # Add gentle spiral rotation effect
+        rel_to_center_x = animated_x - image_center
+        rel_to_center_y = animated_y - image_center
+        rotation_angle = geometry_factor * math.pi * 0.2  # Slower rotation (reduced from 0.5)
+        rotated_x = rel_to_center_x * math.cos(rotation_angle) - rel_to_center_y * math.sin(rotation_angle)
+        rotated_y = rel_to_center_x * math.sin(rotation_angle) + rel_to_center_y * math.cos(rotation_angle)
+    
+        # Combine base movement with gentle waves and rotation
+        psychedelic_x = image_center + rotated_x + wave_x
+        psychedelic_y = image_center + rotated_y + wave_y
+    
+        # Apply zoom: scale around center (using dynamic current_zoom)
+        rel_x = psychedelic_x - image_center
+        rel_y = psychedelic_y - image_center
+        zoomed_x = image_center + rel_x * current_zoom
+        zoomed_y = image_center + rel_y * current_zoom
+    
+        # Clamp to valid image bounds (always within image, never outside)
+        # This prevents lines from disappearing
+        animated_x = max(min_bound, min(max_bound, int(round(zoomed_x))))
+        animated_y = max(min_bound, min(max_bound, int(round(zoomed_y))))
+    
+        animated_line_points.append([animated_x, animated_y])
+    
+    modified_state['line_end_points'] = animated_line_points
+    
+    # Animate curve control points if they exist (now using 2 control points per line)
+    if len(start_control_points) > 0:
+        animated_control_points = []
+        for i in range(points_to_use):
+            if i < len(start_control_points):
+                start_ctrls = start_control_points[i]
+                end_ctrls = end_control_points[i]
+    
+                # Handle both old format (single point) and new format (two points)
+                if isinstance(start_ctrls, list) and len(start_ctrls) == 2 and isinstance(start_ctrls[0], list):
+                    # New format: [ctrl1, ctrl2]
+                    start_ctrl1 = start_ctrls[0]
+                    start_ctrl2 = start_ctrls[1]
+                    end_ctrl1 = end_ctrls[0]
+                    end_ctrl2 = end_ctrls[1]
+                else:
+                    # Old format: single control point, convert to two
+                    start_ctrl1 = start_ctrls if isinstance(start_ctrls, (list, tuple)) else list(start_ctrls)
+                    end_ctrl1 = end_ctrls if isinstance(end_ctrls, (list, tuple)) else list(end_ctrls)
+                    # Create second control point near the first
+                    start_ctrl2 = [start_ctrl1[0] + random.randint(-30, 30), start_ctrl1[1] + random.randint(-30, 30)]
+                    end_ctrl2 = [end_ctrl1[0] + random.randint(-30, 30), end_ctrl1[1] + random.randint(-30, 30)]
+    
+                # Interpolate both control points
+                ctrl1_x = start_ctrl1[0] + (end_ctrl1[0] - start_ctrl1[0]) * geometry_factor
+                ctrl1_y = start_ctrl1[1] + (end_ctrl1[1] - start_ctrl1[1]) * geometry_factor
+                ctrl2_x = start_ctrl2[0] + (end_ctrl2[0] - start_ctrl2[0]) * geometry_factor
+                ctrl2_y = start_ctrl2[1] + (end_ctrl2[1] - start_ctrl2[1]) * geometry_factor
+    
+                # Apply zoom to both control points (using dynamic current_zoom)
+                rel_x1 = ctrl1_x - image_center
+                rel_y1 = ctrl1_y - image_center
+                zoomed_x1 = image_center + rel_x1 * current_zoom
+                zoomed_y1 = image_center + rel_y1 * current_zoom
+    
+                rel_x2 = ctrl2_x - image_center
+                rel_y2 = ctrl2_y - image_center
+                zoomed_x2 = image_center + rel_x2 * current_zoom
+                zoomed_y2 = image_center + rel_y2 * current_zoom
+    
+                # Clamp to bounds
+                animated_control_points.append([
+                    [max(min_bound, min(max_bound, int(round(zoomed_x1)))),
+                     max(min_bound, min(max_bound, int(round(zoomed_y1))))],
+                    [max(min_bound, min(max_bound, int(round(zoomed_x2)))),
+                     max(min_bound, min(max_bound, int(round(zoomed_y2))))]
+                ])
+        modified_state['curve_control_points'] = animated_control_points
+    elif 'curve_control_points' not in art_state:
+        # Generate control points if they don't exist (backward compatibility)
+        control_points = []
+        for i in range(points_to_use):
+            ctrl1 = [random.randint(min_bound, max_bound), random.randint(min_bound, max_bound)]
+            ctrl2 = [random.randint(min_bound, max_bound), random.randint(min_bound, max_bound)]
+            control_points.append([ctrl1, ctrl2])
+        modified_state['curve_control_points'] = control_points
+    
+    # Animate initial point with zoom and clamping
+    animated_x = start_initial_point[0] + (end_initial_point[0] - start_initial_point[0]) * geometry_factor
+    animated_y = start_initial_point[1] + (end_initial_point[1] - start_initial_point[1]) * geometry_factor
+    
+    # Apply zoom (using dynamic current_zoom)
+    rel_x = animated_x - image_center
+    rel_y = animated_y - image_center
+    zoomed_x = image_center + rel_x * current_zoom
+    zoomed_y = image_center + rel_y * current_zoom
+    
+    # Clamp to bounds (always within image)
+    animated_initial = [
+        max(min_bound, min(max_bound, int(round(zoomed_x)))),
+        max(min_bound, min(max_bound, int(round(zoomed_y))))
+    ]
+    modified_state['initial_point'] = animated_initial
+    
+    # Handle line_width_variations and line_start_points for current amount
+    if current_amount < original_amount:
+        modified_state['line_width_variations'] = art_state['line_width_variations'][:current_amount]
+        if 'line_start_points' in art_state:
+            modified_state['line_start_points'] = art_state['line_start_points'][:current_amount]
+    else:
+        modified_state['line_width_variations'] = art_state['line_width_variations']
+        if 'line_start_points' in art_state:
+            modified_state['line_start_points'] = art_state['line_start_points']
+        elif 'line_start_points' not in modified_state:
+            # Generate branching pattern if not present
+            line_start_points = []
+            for j in range(current_amount):
+                if j == 0:
+                    line_start_points.append(None)
+                elif j < current_amount * 0.3:
+                    line_start_points.append(random.randint(0, j - 1))
+                else:
+                    line_start_points.append(None)
+            modified_state['line_start_points'] = line_start_points
+    
+    # Frame is drawn with the current parameters and interpolated colors
+    gen_args = (
+        current_size,
+        current_amount,
+        current_params['line_width'],
+        current_params['line_width_variation'],
+        current_padding,
+        current_params['border_width']
+    )
+    return gen_args, modified_state
+
+def fragmented_mp4_params(fps):
+    """
+    ffmpeg output options for a fragmented MP4: the header comes first and every keyframe (one per second) starts
+    a self-contained fragment, so the file plays while it is still being written.
+    """
+    return ['-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-g', str(int(fps)), '-flush_packets', '1']
+
+def video_store_meta(start_params, end_params, duration_seconds, speed, zoom, zoom_speed):
+    """What a frame store of a video holds: enough to tell stores apart and to re-render any frame."""
+    return {
+        'start_params': start_params,
+        'end_params': end_params,
+        'duration_seconds': duration_seconds,
+        'speed': speed,
+        'zoom': zoom,
+        'zoom_speed': zoom_speed,
+        'engine_version': ENGINE_VERSION
+    }
+
+def generate_video(art_state, start_params, end_params, duration_seconds=30, fps=10, speed=1.0, zoom=1.1, zoom_speed=0.0, output='data_url', stats=None, frames_dir=None, stream_path=None):
+    """
+    Generate a video by slowly tweaking parameters over time.
+    Interpolates ALL parameters including colors for smooth animation.
+    
+    Args:
+        art_state: The deterministic art state (colors, points, etc.)
+        start_params: Starting parameters (size, amount, line_width, etc.)
+        end_params: Ending parameters to interpolate to
+        duration_seconds: Video duration in seconds
+        fps: Frames per second (lower = faster generation)
+        speed: Animation speed multiplier (1.0 = normal, 2.0 = 2x faster, 0.5 = 2x slower)
+        zoom: Starting zoom level (0.5-2.0) - <1.0 creates more room for movement, >1.0 zooms in (no edges)
+        zoom_speed: How fast zoom changes (0.0 = static, higher = zooms in/out over time)
+        output: 'data_url' (base64 mp4 for the UI), 'mp4' (raw bytes) or 'path' (stream_path, once complete)
+        stats: Optional dict that receives per-stage pipeline timings (see pipeline.run_pipeline)
+        frames_dir: Also keep the raw frames in a memory-mapped frame store in this directory (see frame_store)
+        stream_path: Encode a fragmented MP4 to this path instead of a temp file, readable while it grows
+            (see video_stream.follow)
+    """
+    if output == 'path' and stream_path is None:
+        raise ValueError("output='path' needs a stream_path")
+    imageio = load_imageio()
+    # Video-only modules are imported on first use, like imageio
+    from pipeline import run_pipeline
+    import frame_store
+    
+    total_frames = duration_seconds * fps
+    target_video_size = video_frame_size(start_params['size'])
+    
+    # Only the encoded mp4 touches the disk; frames go straight from PIL to the encoder
+    temp_dir = tempfile.mkdtemp()
+    output_path = stream_path or os.path.join(temp_dir, "output.mp4")
+    
+    # Color sets and end positions are shared by every frame
+    animation = prepare_animation(art_state, start_params)
+    
+    frame_writer = None
+    frames_build = None
+    if frames_dir is not None:
+        frames_build = frame_store.create_store(frames_dir, total_frames, target_video_size, fps, video_store_meta(start_params, end_params, duration_seconds, speed, zoom, zoom_speed))
+        frame_writer = frame_store.FrameWriter(frames_build)
+    
     try:
-        for frame_num in range(total_frames):
-            # Calculate interpolation factor (0 to 1)
-            # Use speed to control animation speed
-            # Speed is now on a scale where 20.0 = 1.0x baseline
-            base_factor = frame_num / (total_frames - 1) if total_frames > 1 else 0
-            
-            # Normalize speed: 20.0 becomes 1.0x, so divide by 20
-            normalized_speed = speed / 20.0
-            
-            # Colors progress forward continuously through multiple color sets
-            # Use linear progression that cycles through color sets for smooth fading
-            # Color speed stays the same (not affected by the 10x geometry multiplier)
-            color_progress = base_factor * normalized_speed * len(color_sets)
-            
-            # Find which two color sets to interpolate between
-            color_set_index = int(color_progress) % len(color_sets)
-            next_color_set_index = (color_set_index + 1) % len(color_sets)
-            
-            # Get the interpolation factor between the two color sets (0.0 to 1.0)
-            color_factor = color_progress % 1.0
-            
-            # Get the two color sets to interpolate between
-            current_color_set = color_sets[color_set_index]
-            next_color_set = color_sets[next_color_set_index]
-            
-            # Geometry movement - 12x faster than colors (smoother than 20x)
-            # At higher speeds, geometry moves faster and continues beyond end points (no looping)
-            geometry_time = base_factor * normalized_speed * 12.0  # 12x faster than colors (smoother)
-            # Don't use modulo - let it continue beyond 1.0 for continuous transformation
-            # This makes geometry keep moving in the same direction, creating continuous morphing
-            geometry_factor = geometry_time  # Can go beyond 1.0 for continuous transformation
-            
-            # Interpolate parameters (but keep size constant)
-            current_params = interpolate_params(start_params, end_params, geometry_factor)
-            # Override size to keep it constant - don't interpolate size
-            current_params['size'] = original_size
-            current_params['padding'] = original_padding  # Also keep padding constant
-            
-            # Create modified art_state with interpolated colors and adjusted amount
-            modified_state = art_state.copy()
-            current_size = original_size  # Always use original size
-            current_padding = original_padding  # Always use original padding
-            current_amount = int(current_params['amount'])
-            
-            # Interpolate all colors smoothly between color sets
-            # This creates smooth fading transitions without abrupt changes
-            modified_state['start_clr'] = [
-                int(current_color_set['start_clr'][0] + (next_color_set['start_clr'][0] - current_color_set['start_clr'][0]) * color_factor),
-                int(current_color_set['start_clr'][1] + (next_color_set['start_clr'][1] - current_color_set['start_clr'][1]) * color_factor),
-                int(current_color_set['start_clr'][2] + (next_color_set['start_clr'][2] - current_color_set['start_clr'][2]) * color_factor)
-            ]
-            modified_state['end_clr'] = [
-                int(current_color_set['end_clr'][0] + (next_color_set['end_clr'][0] - current_color_set['end_clr'][0]) * color_factor),
-                int(current_color_set['end_clr'][1] + (next_color_set['end_clr'][1] - current_color_set['end_clr'][1]) * color_factor),
-                int(current_color_set['end_clr'][2] + (next_color_set['end_clr'][2] - current_color_set['end_clr'][2]) * color_factor)
-            ]
-            modified_state['image_bg_clr'] = [
-                int(current_color_set['image_bg_clr'][0] + (next_color_set['image_bg_clr'][0] - current_color_set['image_bg_clr'][0]) * color_factor),
-                int(current_color_set['image_bg_clr'][1] + (next_color_set['image_bg_clr'][1] - current_color_set['image_bg_clr'][1]) * color_factor),
-                int(current_color_set['image_bg_clr'][2] + (next_color_set['image_bg_clr'][2] - current_color_set['image_bg_clr'][2]) * color_factor)
-            ]
-            modified_state['border_clr'] = [
-                int(current_color_set['border_clr'][0] + (next_color_set['border_clr'][0] - current_color_set['border_clr'][0]) * color_factor),
-                int(current_color_set['border_clr'][1] + (next_color_set['border_clr'][1] - current_color_set['border_clr'][1]) * color_factor),
-                int(current_color_set['border_clr'][2] + (next_color_set['border_clr'][2] - current_color_set['border_clr'][2]) * color_factor)
-            ]
-            
-            # Handle amount changes first
-            if current_amount > original_amount:
-                # If amount increased, we can't add new points deterministically
-                # So we'll just use the original amount
-                current_amount = original_amount
-            
-            # Calculate dynamic zoom based on zoom_speed
-            # Zoom oscillates or progresses based on zoom_speed
-            import math
-            if zoom_speed > 0:
-                # Create oscillating zoom effect (zooms in and out)
-                zoom_oscillation = math.sin(base_factor * math.pi * 2 * zoom_speed) * 0.3  # Oscillate ±30%
-                current_zoom = zoom + zoom_oscillation
-                current_zoom = max(0.5, min(2.0, current_zoom))  # Clamp to valid range
-            else:
-                current_zoom = zoom
-            
-            # Calculate bounds based on current zoom
-            # For zoom < 1.0: constrain to smaller area (more room for movement)
-            # For zoom >= 1.0: use full image bounds (zoom in, but still within image)
-            image_center = original_size / 2.0
-            image_padding = original_padding if original_padding > 0 else 1
-            
-            if current_zoom < 1.0:
-                # Constrain to smaller area
-                zoomed_size = original_size * current_zoom
-                zoom_offset = (original_size - zoomed_size) / 2.0
-                min_bound = max(image_padding, int(zoom_offset))
-                max_bound = min(original_size - image_padding - 1, int(original_size - zoom_offset - 1))
-            else:
-                # Use full image bounds (zoom in, but stay within image)
-                min_bound = image_padding
-                max_bound = original_size - image_padding - 1
-            
-            # Animate line points - interpolate from start to end positions with psychedelic effects
-            # Only animate the points that will be used (based on current_amount)
-            animated_line_points = []
-            points_to_use = min(current_amount, len(start_line_points))
-            import math
-            for i in range(points_to_use):
-                start_pt = start_line_points[i]
-                end_pt = end_line_points[i]
-                # Interpolate position (can go beyond 1.0 for continuous movement)
-                animated_x = start_pt[0] + (end_pt[0] - start_pt[0]) * geometry_factor
-                animated_y = start_pt[1] + (end_pt[1] - start_pt[1]) * geometry_factor
-                
-                # Add smooth psychedelic wave distortions to movement
-                # Each point gets a unique wave pattern based on its index
-                wave_phase = i * 0.3 + geometry_factor * 1.5  # Smoother, slower wave phase
-                wave_amplitude = original_size * 0.04  # Reduced amplitude for smoother effect
-                wave_x = math.sin(wave_phase) * wave_amplitude
-                wave_y = math.cos(wave_phase * 1.2) * wave_amplitude
-                
-                # Add gentle spiral rotation effect
-                rel_to_center_x = animated_x - image_center
-                rel_to_center_y = animated_y - image_center
-                rotation_angle = geometry_factor * math.pi * 0.2  # Slower rotation (reduced from 0.5)
-                rotated_x = rel_to_center_x * math.cos(rotation_angle) - rel_to_center_y * math.sin(rotation_angle)
-                rotated_y = rel_to_center_x * math.sin(rotation_angle) + rel_to_center_y * math.cos(rotation_angle)
-                
-                # Combine base movement with gentle waves and rotation
-                psychedelic_x = image_center + rotated_x + wave_x
-                psychedelic_y = image_center + rotated_y + wave_y
-                
-                # Apply zoom: scale around center (using dynamic current_zoom)
-                rel_x = psychedelic_x - image_center
-                rel_y = psychedelic_y - image_center
-                zoomed_x = image_center + rel_x * current_zoom
-                zoomed_y = image_center + rel_y * current_zoom
-                
-                # Clamp to valid image bounds (always within image, never outside)
-                # This prevents lines from disappearing
-                animated_x = max(min_bound, min(max_bound, int(round(zoomed_x))))
-                animated_y = max(min_bound, min(max_bound, int(round(zoomed_y))))
-                
-                animated_line_points.append([animated_x, animated_y])
-            
-            modified_state['line_end_points'] = animated_line_points
-            
-            # Animate curve control points if they exist (now using 2 control points per line)
-            if len(start_control_points) > 0:
-                animated_control_points = []
-                for i in range(points_to_use):
-                    if i < len(start_control_points):
-                        start_ctrls = start_control_points[i]
-                        end_ctrls = end_control_points[i]
-                        
-                        # Handle both old format (single point) and new format (two points)
-                        if isinstance(start_ctrls, list) and len(start_ctrls) == 2 and isinstance(start_ctrls[0], list):
-                            # New format: [ctrl1, ctrl2]
-                            start_ctrl1 = start_ctrls[0]
-                            start_ctrl2 = start_ctrls[1]
-                            end_ctrl1 = end_ctrls[0]
-                            end_ctrl2 = end_ctrls[1]
-                        else:
-                            # Old format: single control point, convert to two
-                            import random
-                            start_ctrl1 = start_ctrls if isinstance(start_ctrls, (list, tuple)) else list(start_ctrls)
-                            end_ctrl1 = end_ctrls if isinstance(end_ctrls, (list, tuple)) else list(end_ctrls)
-                            # Create second control point near the first
-                            start_ctrl2 = [start_ctrl1[0] + random.randint(-30, 30), start_ctrl1[1] + random.randint(-30, 30)]
-                            end_ctrl2 = [end_ctrl1[0] + random.randint(-30, 30), end_ctrl1[1] + random.randint(-30, 30)]
-                        
-                        # Interpolate both control points
-                        ctrl1_x = start_ctrl1[0] + (end_ctrl1[0] - start_ctrl1[0]) * geometry_factor
-                        ctrl1_y = start_ctrl1[1] + (end_ctrl1[1] - start_ctrl1[1]) * geometry_factor
-                        ctrl2_x = start_ctrl2[0] + (end_ctrl2[0] - start_ctrl2[0]) * geometry_factor
-                        ctrl2_y = start_ctrl2[1] + (end_ctrl2[1] - start_ctrl2[1]) * geometry_factor
-                        
-                        # Apply zoom to both control points (using dynamic current_zoom)
-                        rel_x1 = ctrl1_x - image_center
-                        rel_y1 = ctrl1_y - image_center
-                        zoomed_x1 = image_center + rel_x1 * current_zoom
-                        zoomed_y1 = image_center + rel_y1 * current_zoom
-                        
-                        rel_x2 = ctrl2_x - image_center
-                        rel_y2 = ctrl2_y - image_center
-                        zoomed_x2 = image_center + rel_x2 * current_zoom
-                        zoomed_y2 = image_center + rel_y2 * current_zoom
-                        
-                        # Clamp to bounds
-                        animated_control_points.append([
-                            [max(min_bound, min(max_bound, int(round(zoomed_x1)))),
-                             max(min_bound, min(max_bound, int(round(zoomed_y1))))],
-                            [max(min_bound, min(max_bound, int(round(zoomed_x2)))),
-                             max(min_bound, min(max_bound, int(round(zoomed_y2))))]
-                        ])
-                modified_state['curve_control_points'] = animated_control_points
-            elif 'curve_control_points' not in art_state:
-                # Generate control points if they don't exist (backward compatibility)
-                import random
-                control_points = []
-                for i in range(points_to_use):
-                    ctrl1 = [random.randint(min_bound, max_bound), random.randint(min_bound, max_bound)]
-                    ctrl2 = [random.randint(min_bound, max_bound), random.randint(min_bound, max_bound)]
-                    control_points.append([ctrl1, ctrl2])
-                modified_state['curve_control_points'] = control_points
-            
-            # Animate initial point with zoom and clamping
-            animated_x = start_initial_point[0] + (end_initial_point[0] - start_initial_point[0]) * geometry_factor
-            animated_y = start_initial_point[1] + (end_initial_point[1] - start_initial_point[1]) * geometry_factor
-            
-            # Apply zoom (using dynamic current_zoom)
-            rel_x = animated_x - image_center
-            rel_y = animated_y - image_center
-            zoomed_x = image_center + rel_x * current_zoom
-            zoomed_y = image_center + rel_y * current_zoom
-            
-            # Clamp to bounds (always within image)
-            animated_initial = [
-                max(min_bound, min(max_bound, int(round(zoomed_x)))),
-                max(min_bound, min(max_bound, int(round(zoomed_y))))
-            ]
-            modified_state['initial_point'] = animated_initial
-            
-            # Handle line_width_variations and line_start_points for current amount
-            if current_amount < original_amount:
-                modified_state['line_width_variations'] = art_state['line_width_variations'][:current_amount]
-                if 'line_start_points' in art_state:
-                    modified_state['line_start_points'] = art_state['line_start_points'][:current_amount]
-            else:
-                modified_state['line_width_variations'] = art_state['line_width_variations']
-                if 'line_start_points' in art_state:
-                    modified_state['line_start_points'] = art_state['line_start_points']
-                elif 'line_start_points' not in modified_state:
-                    # Generate branching pattern if not present
-                    line_start_points = []
-                    for j in range(current_amount):
-                        if j == 0:
-                            line_start_points.append(None)
-                        elif j < current_amount * 0.3:
-                            line_start_points.append(random.randint(0, j - 1))
-                        else:
-                            line_start_points.append(None)
-                    modified_state['line_start_points'] = line_start_points
-            
-            # Generate frame with current parameters and interpolated colors
-            frame_result = gen_art(
-                current_size,
-                current_amount,
-                current_params['line_width'],
-                current_params['line_width_variation'],
-                current_padding,
-                current_params['border_width'],
-                art_state=modified_state
-            )
-            
-            # Decode base64 image
-            img_data = frame_result.split(',')[1]
-            img_bytes = base64.b64decode(img_data)
-            img = Image.open(BytesIO(img_bytes))
-            
-            # Resize all frames to the same target size (divisible by 16)
-            # This ensures all frames have the same dimensions for video encoding
-            if img.size[0] != target_video_size or img.size[1] != target_video_size:
-                # Use LANCZOS resampling (PIL.Image.LANCZOS for older versions)
-                try:
-                    img = img.resize((target_video_size, target_video_size), Image.Resampling.LANCZOS)
-                except AttributeError:
-                    img = img.resize((target_video_size, target_video_size), Image.LANCZOS)
-            
-            # Save frame
-            frame_path = os.path.join(temp_dir, f"frame_{frame_num:06d}.png")
-            img.save(frame_path)
-            frames.append(frame_path)
+        # Create video writer (frames are resized to be divisible by 16)
+        writer_options = {'output_params': fragmented_mp4_params(fps)} if stream_path else {}
+        writer = imageio.get_writer(output_path, fps=fps, codec='libx264', quality=8, **writer_options)
+        reuse = {}
+        stages = video_frame_stages(art_state, start_params, end_params, animation, total_frames, speed, zoom, zoom_speed, reuse)
+        stages.append(('encode', writer.append_data))
+        if frame_writer is not None:
+            # Raw frames are copied into the store before the encoder gets them
+            stages.insert(3, ('store', frame_writer.write))
+        try:
+            # Stages run concurrently, so ffmpeg encodes while the next frames are being drawn
+            pipeline_stats = run_pipeline(range(total_frames), stages, queue_size=VIDEO_QUEUE_SIZE)
+        finally:
+            drain_start = perf_counter()
+            writer.close()
+            if frame_writer is not None:
+                frame_writer.close()
+        if frames_dir is not None:
+            frame_store.mark_complete(frames_build, frames_dir)
         
-        # Create video from frames
-        output_path = os.path.join(temp_dir, "output.mp4")
+        if stats is not None:
+            stats.update(pipeline_stats, **reuse)
+            # Time ffmpeg still needed for buffered frames after the last one was fed
+            stats['encoder_drain_seconds'] = perf_counter() - drain_start
         
-        # Ensure temp directory exists
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Create video writer (images are already resized to be divisible by 16)
-        writer = imageio.get_writer(output_path, fps=fps, codec='libx264', quality=8)
-        
-        for frame_path in frames:
-            if not os.path.exists(frame_path):
-                raise FileNotFoundError(f"Frame file not found: {frame_path}")
-            frame = imageio.imread(frame_path)
-            writer.append_data(frame)
-        
-        writer.close()
-        
-        # Wait a moment to ensure file is fully written
-        import time
-        time.sleep(0.1)
-        
-        # Verify file exists before reading
-        if not os.path.exists(output_path):
-            raise FileNotFoundError(f"Output video file not found: {output_path}")
-        
-        # Read video file and convert to base64
+        if output == 'path':
+            return output_path
         with open(output_path, 'rb') as f:
             video_bytes = f.read()
-        
-        video_base64 = base64.b64encode(video_bytes).decode('utf-8')
-        
-        return 'data:video/mp4;base64, ' + video_base64
-        
     finally:
-        # Clean up temporary files after a short delay to ensure file operations complete
-        import time
-        import shutil
-        time.sleep(0.2)  # Small delay to ensure file operations complete
         shutil.rmtree(temp_dir, ignore_errors=True)
+        if frames_build is not None:
+            # Only still there when the render failed (mark_complete moved it)
+            shutil.rmtree(frames_build, ignore_errors=True)
+    
+    if output == 'mp4':
+        return video_bytes
+    return 'data:video/mp4;base64, ' + base64.b64encode(video_bytes).decode('utf-8')
+
+def warm_up():
+    """
+    Run a tiny render through every per-call code path (drawing, PNG encoding, animation math)
+    so the first real request doesn't pay for lazy plugin loading and first-call overhead.
+    """
+    image, state = gen_art(64, 5, 1, 1, 0, 1, seed=0, output='png')
+    params = {'size': 64, 'amount': 5, 'line_width': 1, 'line_width_variation': 1.0, 'padding': 0, 'border_width': 1}
+    generate_frame_at_time(state, params, params, 0.5, gyro_x=0.1, gyro_y=0.1, output='png')
+    return len(image)
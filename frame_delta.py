@@ -0,0 +1,190 @@
+from PIL import Image
+from collections import OrderedDict
+from io import BytesIO
+import threading
+import art_gen
+
+# A full frame is sent at least this often (frames), so a client never drifts for long
+KEYFRAME_INTERVAL = 150
+
+# Above this share of changed pixels a full frame is sent without trying a residual
+# (measured: at 20% changed the residual is already about as big as a keyframe)
+MAX_DELTA_FRACTION = 0.25
+
+# Frames sent as keyframes right away after a residual was abandoned, so busy animations don't pay for two encodes
+# (unchanged frames are still sent as empty deltas while backing off)
+DELTA_BACKOFF = 5
+
+# Every this many pixels in each direction are sampled to find the background color
+BACKGROUND_SAMPLE_STEP = 8
+
+# Preview streams remembered at once (one per open preview)
+MAX_STREAMS = 16
+
+def pack_colors(pixels):
+    """RGB pixel array (height, width, 3) as one 0xRRGGBB integer per pixel, so colors compare in one operation."""
+    import numpy as np  # Installed with imageio
+    return (pixels[..., 0].astype(np.uint32) << 16) | (pixels[..., 1].astype(np.uint32) << 8) | pixels[..., 2]
+
+def frame_colors(packed, sample_step=BACKGROUND_SAMPLE_STEP):
+    """
+    The (background, border) colors of a frame, packed. The background is the most common color of a sparse
+    sample; the border color is the corner pixel (lines never reach it; without a border it is the background).
+    """
+    import numpy as np  # Installed with imageio
+    colors, counts = np.unique(packed[::sample_step, ::sample_step], return_counts=True)
+    return int(colors[counts.argmax()]), int(packed[0, 0])
+
+def color_remap(previous_colors, colors):
+    """
+    [old, new] packed color pairs turning one frame's background and border into the next one's.
+    Animated pieces shift both a little every frame, which would otherwise change every pixel.
+    """
+    remap = []
+    for old, new in zip(previous_colors, colors):
+        if old != new and old not in [pair[0] for pair in remap]:
+            remap.append([old, new])
+    return remap
+
+def remap_colors(packed, remap):
+    """Replace colors of a packed frame by the remap pairs (the first pair matching a pixel wins, as in the client)."""
+    result = packed.copy()
+    for old, new in reversed(remap):
+        result[packed == old] = new
+    return result
+
+def residual_patch(pixels, changed):
+    """
+    One RGBA PNG patch over the bounding box of the changed pixels, with every unchanged pixel transparent.
+    Drawn over the client's (remapped) frame it only replaces what changed; the transparent runs compress
+    to almost nothing. Returns (x, y, png).
+    """
+    import numpy as np  # Installed with imageio
+    rows = np.flatnonzero(changed.any(axis=1))
+    columns = np.flatnonzero(changed.any(axis=0))
+    y0, y1, x0, x1 = rows[0], rows[-1] + 1, columns[0], columns[-1] + 1
+    mask = changed[y0:y1, x0:x1]
+    rgba = np.zeros((y1 - y0, x1 - x0, 4), dtype=np.uint8)
+    rgba[mask, :3] = pixels[y0:y1, x0:x1][mask]
+    rgba[mask, 3] = 255
+    return int(x0), int(y0), art_gen.encode_output(Image.fromarray(rgba, 'RGBA'), 'png')
+
+def apply_delta(pixels, delta):
+    """
+    Reference decoder, doing what the preview client does: a keyframe replaces the frame, a delta remaps
+    the background and border colors and then draws its patches over the frame. Returns the new RGB pixel array.
+    """
+    import numpy as np  # Installed with imageio
+    if delta['keyframe']:
+        return np.asarray(Image.open(BytesIO(delta['patches'][0][2])).convert('RGB'))
+    packed = remap_colors(pack_colors(pixels), delta['remap'])
+    result = np.stack([(packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF], axis=-1).astype(np.uint8)
+    for x, y, png in delta['patches']:
+        patch = np.asarray(Image.open(BytesIO(png)).convert('RGBA'))
+        region = result[y:y + patch.shape[0], x:x + patch.shape[1]]
+        opaque = patch[..., 3] == 255
+        region[opaque] = patch[..., :3][opaque]
+    return result
+
+class DeltaEncoder:
+    """
+    Encodes one preview stream as residuals against the last frame sent.
+    A keyframe is a single opaque patch covering the whole frame. A delta first lists the background and border
+    color shifts (remap) and then a transparent patch holding only the pixels that still differ; an unchanged
+    frame is an empty delta that costs nothing to encode or send.
+
+    A residual that grows past the size of the last keyframe is abandoned for a keyframe.
+    """
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL, max_delta_fraction=MAX_DELTA_FRACTION):
+        self.keyframe_interval = keyframe_interval
+        self.max_delta_fraction = max_delta_fraction
+        self.previous = None  # Packed colors of the last frame sent
+        self.colors = None  # Its (background, border)
+        self.seq = 0  # Sequence number of the last frame sent
+        self.since_keyframe = 0
+        self.keyframe_bytes = 0
+        self.backoff = 0
+        self._lock = threading.Lock()
+
+    def encode(self, image, base_seq=None, keyframe=False, seq=None):
+        """
+        Args:
+            image: The new frame (PIL image)
+            base_seq: Sequence number of the frame the client currently shows. A delta is only sent when
+                it matches the last frame sent; anything else (None after a restart, a dropped frame) gets a keyframe
+            keyframe: Force a full frame
+            seq: Sequence number for this frame (default: the last one plus one). Encoders of one stream living in
+                different processes are given numbers from one counter, so a delta is never based on another's frame
+
+        Returns:
+            Dict with seq, keyframe flag, frame size, color remap, patches [(x, y, png_bytes)] and the changed pixel share
+        """
+        import numpy as np  # Installed with imageio
+        image = image.convert('RGB')
+        width, height = image.size
+        pixels = np.asarray(image)  # A copy, so the caller may draw the next frame into the same image
+        packed = pack_colors(pixels)
+        colors = frame_colors(packed)
+        with self._lock:
+            patches = None
+            remap = []
+            if not (
+                keyframe or self.previous is None or base_seq != self.seq
+                or self.previous.shape != packed.shape or self.since_keyframe >= self.keyframe_interval
+            ):
+                remap = color_remap(self.colors, colors)
+                changed_pixels = remap_colors(self.previous, remap) != packed
+                changed = float(changed_pixels.mean())
+                if changed == 0:
+                    patches = []
+                elif changed <= self.max_delta_fraction:
+                    if self.backoff > 0:
+                        self.backoff -= 1
+                    else:
+                        patch = residual_patch(pixels, changed_pixels)
+                        if len(patch[2]) <= self.keyframe_bytes:
+                            patches = [patch]
+                        else:
+                            self.backoff = DELTA_BACKOFF
+
+            if patches is None:
+                patches = [(0, 0, art_gen.encode_output(image, 'png'))]
+                remap = []
+                changed = 1.0
+                self.since_keyframe = 0
+                self.keyframe_bytes = len(patches[0][2])
+            else:
+                self.since_keyframe += 1
+            self.previous = packed
+            self.colors = colors
+            self.seq = self.seq + 1 if seq is None else seq
+            return {
+                'seq': self.seq,
+                'keyframe': self.since_keyframe == 0,
+                'width': width,
+                'height': height,
+                'remap': remap,
+                'patches': patches,
+                'changed_fraction': changed
+            }
+
+class PreviewStreams:
+    """Delta encoders by stream ID, dropping the least recently used stream past max_streams."""
+
+    def __init__(self, max_streams=MAX_STREAMS, **encoder_options):
+        self.max_streams = max_streams
+        self.encoder_options = encoder_options
+        self._streams = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encoder(self, stream_id):
+        with self._lock:
+            encoder = self._streams.pop(stream_id, None) or DeltaEncoder(**self.encoder_options)
+            self._streams[stream_id] = encoder
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+            return encoder
+
+    def encode(self, stream_id, image, base_seq=None, keyframe=False, seq=None):
+        return self.encoder(stream_id).encode(image, base_seq, keyframe, seq)
@@ -0,0 +1,267 @@
+from PIL import Image
+from io import BytesIO
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+# Raw frames (a .npy file, so it describes its own shape) and the index next to it
+FRAMES_FILE = 'frames.npy'
+INDEX_FILE = 'index.json'
+
+# Stores being written live in a directory named after the store plus a random part and this suffix
+BUILD_SUFFIX = '.partial'
+
+# Default on-disk budget for all frame stores (a 30 s clip of 1024 px frames takes about 1 GB)
+MAX_STORE_BYTES = 4 * 1024 * 1024 * 1024
+
+# Formats export_animation can write
+ANIMATION_FORMATS = ('GIF', 'WEBP')
+
+# LANCZOS moved to Image.Resampling in newer Pillow versions
+LANCZOS = getattr(Image, 'Resampling', Image).LANCZOS
+
+def create_store(store_dir, frame_count, frame_size, fps, meta=None):
+    """
+    Allocate a store for frame_count RGB frames of frame_size x frame_size pixels. It is built in a new directory
+    next to store_dir, which is returned: frames are written there (possibly by several processes, each to its
+    own frame range) and mark_complete moves it to store_dir. Renders of the same animation running at once
+    each write their own copy, so none overwrites frames another one is reading.
+
+    Args:
+        store_dir: Directory the finished store goes to
+        frame_count: Number of frames in the animation
+        frame_size: Edge of the square frames in pixels
+        fps: Frame rate the frames were rendered for
+        meta: JSON-serializable description of what was rendered (params, settings, ...)
+    """
+    import numpy as np  # Installed with imageio
+    parent, name = os.path.split(os.path.abspath(store_dir))
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=name + '.', suffix=BUILD_SUFFIX, dir=parent)
+    # A fixed stride per frame: frame n starts at n * frame_size * frame_size * 3 bytes into the data
+    frames = np.lib.format.open_memmap(
+        os.path.join(build_dir, FRAMES_FILE), mode='w+', dtype=np.uint8, shape=(frame_count, frame_size, frame_size, 3)
+    )
+    del frames
+    write_index(build_dir, {
+        'frame_count': frame_count,
+        'width': frame_size,
+        'height': frame_size,
+        'fps': fps,
+        'meta': meta or {},
+        'complete': False
+    })
+    return build_dir
+
+def store_bytes(frame_count, frame_size):
+    """Disk space the raw frames of a store take."""
+    return frame_count * frame_size * frame_size * 3
+
+def read_index(store_dir):
+    with open(os.path.join(store_dir, INDEX_FILE)) as f:
+        return json.load(f)
+
+def write_index(store_dir, index):
+    # Atomic replace, so readers never see a half-written index
+    path = os.path.join(store_dir, INDEX_FILE)
+    with open(path + '.partial', 'w') as f:
+        json.dump(index, f)
+    os.replace(path + '.partial', path)
+
+def mark_complete(build_dir, store_dir):
+    """Move a store whose frames are all written (see create_store) into place at store_dir."""
+    index = read_index(build_dir)
+    index['complete'] = True
+    write_index(build_dir, index)
+    try:
+        os.rename(build_dir, store_dir)
+    except OSError:
+        # Another render of the same animation finished first; its frames are the same
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return store_dir
+
+class FrameWriter:
+    """Writes consecutive frames into an allocated store, starting at start_frame."""
+
+    def __init__(self, store_dir, start_frame=0):
+        import numpy as np  # Installed with imageio
+        self.frames = np.load(os.path.join(store_dir, FRAMES_FILE), mmap_mode='r+')
+        self.next_frame = start_frame
+
+    def write(self, frame):
+        """Store one frame (an RGB array of the store's frame size) and return it, so it can sit inside a pipeline stage."""
+        self.frames[self.next_frame] = frame
+        self.next_frame += 1
+        return frame
+
+    def close(self):
+        self.frames.flush()
+        del self.frames
+
+class FrameReader:
+    """
+    Random access to the frames of a complete store. Frames are views into the memory-mapped file:
+    nothing is decoded, and only the pages of the frames actually read are loaded.
+    """
+
+    def __init__(self, store_dir):
+        import numpy as np  # Installed with imageio
+        self.store_dir = store_dir
+        self.index = read_index(store_dir)
+        self.frames = np.load(os.path.join(store_dir, FRAMES_FILE), mmap_mode='r')
+
+    def __len__(self):
+        return self.index['frame_count']
+
+    @property
+    def fps(self):
+        return self.index['fps']
+
+    def frame(self, frame_num):
+        """Frame as a read-only (height, width, 3) uint8 array backed by the file."""
+        if not 0 <= frame_num < len(self):
+            raise IndexError(f"Frame {frame_num} outside 0..{len(self) - 1}")
+        return self.frames[frame_num]
+
+    def frame_at(self, time_factor):
+        """Frame closest to a time position (0.0 to 1.0) of the animation."""
+        return self.frame(min(len(self) - 1, max(0, int(round(time_factor * (len(self) - 1))))))
+
+    def image(self, frame_num):
+        """Frame as a PIL image sharing the mapped memory (read-only: copy it before drawing on it)."""
+        frame = self.frame(frame_num)
+        return Image.frombuffer('RGB', (frame.shape[1], frame.shape[0]), frame, 'raw', 'RGB', 0, 1)
+
+    def export_still(self, frame_num, format='PNG', size=None):
+        """Encode one frame as image bytes, optionally scaled to size x size."""
+        image = self.image(frame_num)
+        if size and size != image.size[0]:
+            image = image.resize((size, size), LANCZOS)
+        buffered = BytesIO()
+        image.save(buffered, format=format)
+        return buffered.getvalue()
+
+    def export_animation(self, output_path, format='GIF', start=0, end=None, step=1, size=None):
+        """
+        Write frames [start, end) (every step-th one) as an animated GIF or WebP without rendering or decoding video.
+
+        Args:
+            output_path: File to write
+            format: 'GIF' or 'WEBP'
+            size: Scale frames to size x size (default: the stored size)
+        """
+        format = format.upper()
+        if format not in ANIMATION_FORMATS:
+            raise ValueError(f"Unsupported animation format: {format}")
+        end = len(self) if end is None else min(end, len(self))
+        frame_nums = range(max(0, start), end, max(1, step))
+        if not frame_nums:
+            raise ValueError("No frames in the requested range")
+
+        def frames():
+            for frame_num in frame_nums:
+                image = self.image(frame_num)
+                if size and size != image.size[0]:
+                    image = image.resize((size, size), LANCZOS)
+                yield image
+
+        images = frames()
+        first = next(images)
+        first.save(
+            output_path, format=format, save_all=True, append_images=images,
+            duration=int(round(1000.0 * max(1, step) / self.fps)), loop=0
+        )
+        return output_path
+
+    def close(self):
+        del self.frames
+
+class FrameStore:
+    """
+    Frame stores under one root directory, one per animation key (see gallery.render_key).
+    Complete stores are evicted least recently opened first once they exceed max_bytes.
+    """
+
+    def __init__(self, root=os.path.join('gallery', 'frames'), max_bytes=MAX_STORE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self.remove_stale()
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        """Whether a complete store exists for key, without opening it."""
+        try:
+            return read_index(self.path(key))['complete']
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def open(self, key):
+        """Reader for a complete store, or None if it doesn't exist or is still being written."""
+        store_dir = self.path(key)
+        try:
+            if not read_index(store_dir)['complete']:
+                return None
+            # The index's modification time is the store's last access, for eviction
+            os.utime(os.path.join(store_dir, INDEX_FILE))
+        except (OSError, ValueError):
+            return None
+        return FrameReader(store_dir)
+
+    def list(self):
+        """Index of every complete store, with its key, size on disk and last access."""
+        return [store for store in self._scan() if store['complete']]
+
+    def make_room(self, new_bytes=0):
+        """
+        Remove least recently opened complete stores until the stores plus new_bytes (a store about to be
+        written, see store_bytes) fit max_bytes. Returns the removed keys.
+        """
+        with self._lock:
+            stores = self.list()
+            total = sum(store['bytes'] for store in stores) + new_bytes
+            removed = []
+            for store in sorted(stores, key=lambda store: store['last_access']):
+                if total <= self.max_bytes:
+                    break
+                self.remove(store['key'])
+                total -= store['bytes']
+                removed.append(store['key'])
+            return removed
+
+    def remove_stale(self):
+        """
+        Remove stores that were never completed (their render was stopped or failed) and evict down to the budget.
+        Call it when no store is being written, e.g. at startup.
+        """
+        for store in self._scan():
+            if not store['complete']:
+                self.remove(store['key'])
+        self.make_room()
+
+    def remove(self, key):
+        shutil.rmtree(self.path(key), ignore_errors=True)
+
+    def _scan(self):
+        """Every store directory with its index (complete False when unreadable), size and last access."""
+        stores = []
+        for key in sorted(os.listdir(self.root)):
+            store_dir = self.path(key)
+            if not os.path.isdir(store_dir):
+                continue
+            try:
+                index = read_index(store_dir)
+                last_access = os.path.getmtime(os.path.join(store_dir, INDEX_FILE))
+            except (OSError, ValueError):
+                index, last_access = {'complete': False}, 0.0
+            try:
+                size = os.path.getsize(os.path.join(store_dir, FRAMES_FILE))
+            except OSError:
+                size = 0
+            stores.append(dict(index, key=key, bytes=size, last_access=last_access))
+        return stores
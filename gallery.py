@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import art_gen
+
+# Default on-disk budget for cached renders
+MAX_CACHE_BYTES = 1024 * 1024 * 1024
+
+# File extension per kind of cached render
+RENDER_EXTENSIONS = {
+    'still': 'png',
+    'thumbnail': 'png',
+    'video': 'mp4',
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS states (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    line_width INTEGER NOT NULL,
+    line_width_variation REAL NOT NULL,
+    padding INTEGER NOT NULL,
+    border_width INTEGER NOT NULL,
+    favorite INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS states_created ON states (created_at);
+CREATE INDEX IF NOT EXISTS states_params ON states (size, amount, line_width, line_width_variation, padding, border_width);
+CREATE TABLE IF NOT EXISTS renders (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS renders_last_access ON renders (last_access);
+'''
+
+PARAM_COLUMNS = ['size', 'amount', 'line_width', 'line_width_variation', 'padding', 'border_width']
+
+def render_key(kind, state, params, options=None):
+    """
+    Stable content address for a render: hash of the state, params, render options and engine version.
+    Anything that changes the output must be part of params or options.
+    """
+    payload = json.dumps({
+        'kind': kind,
+        'engine': art_gen.ENGINE_VERSION,
+        'state': state,
+        'params': params,
+        'options': options or {}
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class Gallery:
+    """
+    SQLite-backed store of art states plus a content-addressed cache of rendered outputs on disk.
+    Cached files are evicted least-recently-used first once they exceed max_cache_bytes.
+    """
+
+    def __init__(self, root='gallery', max_cache_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.cache_dir = os.path.join(root, 'cache')
+        self.max_cache_bytes = max_cache_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, 'gallery.db'), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # States
+
+    def save_state(self, state_id, state, params, created_at=None):
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO states (id, created_at, size, amount, line_width, line_width_variation, padding, border_width, state) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [state_id, created_at or time.time()] + [params[column] for column in PARAM_COLUMNS] + [json.dumps(state)]
+            )
+
+    def get_state(self, state_id):
+        """Return {'state', 'params'} for a stored piece, or None."""
+        with self._lock:
+            row = self._db.execute('SELECT * FROM states WHERE id = ?', (state_id,)).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def list_states(self, limit=50, offset=0, favorites_only=False, **param_filters):
+        """Newest pieces first, optionally filtered by exact generation params (e.g. size=512)."""
+        clauses = []
+        values = []
+        for column, value in param_filters.items():
+            if column not in PARAM_COLUMNS:
+                raise ValueError(f"Unknown parameter filter: {column}")
+            clauses.append(f'{column} = ?')
+            values.append(value)
+        if favorites_only:
+            clauses.append('favorite = 1')
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self._lock:
+            rows = self._db.execute(
+                f'SELECT * FROM states {where} ORDER BY created_at DESC LIMIT ? OFFSET ?',
+                values + [int(limit), int(offset)]
+            ).fetchall()
+        return [dict(self._row_to_entry(row), state_id=row['id'], created_at=row['created_at'], favorite=bool(row['favorite'])) for row in rows]
+
+    def set_favorite(self, state_id, favorite=True):
+        with self._lock, self._db:
+            self._db.execute('UPDATE states SET favorite = ? WHERE id = ?', (1 if favorite else 0, state_id))
+
+    def _row_to_entry(self, row):
+        params = {column: row[column] for column in PARAM_COLUMNS}
+        return {'state': json.loads(row['state']), 'params': params}
+
+    # Render cache
+
+    def get_render(self, key):
+        """Return cached bytes for a render key, or None on a miss."""
+        with self._lock:
+            row = self._db.execute('SELECT path FROM renders WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            try:
+                with open(row['path'], 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # File was removed behind our back - forget the entry
+                with self._db:
+                    self._db.execute('DELETE FROM renders WHERE key = ?', (key,))
+                return None
+            with self._db:
+                self._db.execute('UPDATE renders SET last_access = ? WHERE key = ?', (time.time(), key))
+        return data
+
+    def put_render(self, key, kind, data):
+        """Store rendered bytes under their content key and evict old entries past the size budget."""
+        # Fan out into subdirectories so no single directory gets huge
+        directory = os.path.join(self.cache_dir, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{key}.{RENDER_EXTENSIONS.get(kind, 'bin')}")
+        # A temp file of its own per writer, so concurrent writers of one key never interleave
+        fd, partial_path = tempfile.mkstemp(suffix='.partial', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(partial_path, path)
+        except BaseException:
+            os.remove(partial_path)
+            raise
+
+        now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO renders (key, kind, path, bytes, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, kind, path, len(data), now, now)
+                )
+            self._evict()
+
+    def cached_render(self, kind, state, params, render, options=None):
+        """Return cached bytes for this render, calling render() and storing its bytes on a miss."""
+        key = render_key(kind, state, params, options)
+        data = self.get_render(key)
+        if data is None:
+            data = render()
+            self.put_render(key, kind, data)
+        return data
+
+    def cache_size(self):
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(bytes), 0) FROM renders').fetchone()[0]
+
+    def _evict(self):
+        """Delete least recently used renders until the cache fits the budget. Caller holds the lock."""
+        total = self._db.execute('SELECT COALESCE(SUM(bytes), 0) FROM renders').fetchone()[0]
+        if total <= self.max_cache_bytes:
+            return
+        rows = self._db.execute('SELECT key, path, bytes FROM renders ORDER BY last_access ASC').fetchall()
+        with self._db:
+            for row in rows:
+                if total <= self.max_cache_bytes:
+                    break
+                try:
+                    os.remove(row['path'])
+                except FileNotFoundError:
+                    pass
+                self._db.execute('DELETE FROM renders WHERE key = ?', (row['key'],))
+                total -= row['bytes']
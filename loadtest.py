@@ -0,0 +1,460 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from admission import CostModel, measure_still
+from render_pool import RenderPool, BATCH
+from scheduler import JobScheduler, percentile
+
+# Client behaviour, modelled on www/script.js
+GRID_SIZE = 9  # generate_art calls fired at once per grid
+THUMBNAIL_SIZE = 256
+PREVIEW_FPS = 15  # the preview asks for the next frame 1/15 s after the previous one arrived
+GRID_PARAMS = {'size': 256, 'amount': 100, 'line_width': 1, 'line_width_variation': 3.0, 'padding': 0, 'border_width': 0}
+END_PARAMS = {'amount': 100, 'line_width': 1, 'line_width_variation': 3.0, 'padding': 0, 'border_width': 0}
+PREVIEW_SETTINGS = {'speed': 20.0, 'zoom': 1.5, 'zoom_speed': 2.0}
+VIDEO_SECONDS = 30  # the UI always exports 30 s clips
+
+# Think time between a client's rounds (seconds)
+GRID_PAUSE = (2.0, 6.0)
+VIDEO_PAUSE = (10.0, 30.0)
+
+# Default share of clients per behaviour
+DEFAULT_MIX = {'preview': 6, 'grid': 3, 'video': 1}
+
+# Seconds between CPU/RSS samples of the server
+RESOURCE_INTERVAL = 0.5
+
+# --check-estimates: stills measured against the cost model, and how far off an estimate may be (either way)
+ESTIMATE_CHECKS = [(256, 50, 1), (512, 300, 3), (1024, 300, 10)]
+ESTIMATE_BOUND = 2.5
+
+PSUTIL_AVAILABLE = importlib.util.find_spec('psutil') is not None
+
+class InProcessTarget:
+    """
+    Calls the functions main.py exposes to the UI directly, with a fresh pool, gallery and job queue.
+    Needs the same packages as the app (eel included, main.py imports it).
+    """
+
+    def __init__(self, data_dir, interactive_workers=None, batch_workers=None):
+        import main
+        self.main = main
+        self.pool = RenderPool(interactive_workers=interactive_workers, batch_workers=batch_workers)
+        main.pool = self.pool
+        main.gallery = main.Gallery(data_dir)
+        main.admission = main.AdmissionController()
+        main.scheduler = JobScheduler(self.pool, data_dir, cpu_budget=self.pool.workers(BATCH), admission=main.admission)
+        main.previews = main.AffinityPool(interactive_workers)
+        self.pid = os.getpid()
+
+    def _check(self, response):
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def new_piece(self, params):
+        return self._check(self.main.generate_art(
+            params['size'], params['amount'], params['line_width'], params['line_width_variation'],
+            params['padding'], params['border_width'], min(params['size'], THUMBNAIL_SIZE)
+        ))['state_id']
+
+    def frame(self, state_id, time_factor, gyro_x, gyro_y):
+        self._check(self.main.generate_realtime_frame(
+            state_id, time_factor, PREVIEW_SETTINGS['speed'], PREVIEW_SETTINGS['zoom'], PREVIEW_SETTINGS['zoom_speed'], gyro_x, gyro_y,
+            END_PARAMS['amount'], END_PARAMS['line_width'], END_PARAMS['line_width_variation'], END_PARAMS['padding'], END_PARAMS['border_width']
+        ))
+
+    def video(self, state_id):
+        self._check(self.main.generate_video(
+            state_id, PREVIEW_SETTINGS['speed'], PREVIEW_SETTINGS['zoom'], PREVIEW_SETTINGS['zoom_speed'],
+            END_PARAMS['amount'], END_PARAMS['line_width'], END_PARAMS['line_width_variation'], END_PARAMS['padding'], END_PARAMS['border_width']
+        ))
+
+    def close(self):
+        self.main.scheduler.shutdown()
+        self.pool.shutdown(wait=False)
+        self.main.previews.shutdown(wait=False)
+
+class HttpTarget:
+    """Drives a running server.py over keep-alive connections (one per client thread)."""
+
+    def __init__(self, url, pid=None, client_prefix='loadtest'):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.pid = pid
+        self.client_prefix = client_prefix
+        self._local = threading.local()
+
+    def _request(self, method, path, body=None, expect=200):
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=600)
+        connection = self._local.connection
+        headers = {'X-Client-Id': f"{self.client_prefix}-{threading.current_thread().name}"}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        try:
+            connection.request(method, path, data, headers)
+            response = connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request
+            connection.close()
+            self._local.connection = None
+            raise
+        if response.status != expect:
+            raise RuntimeError(f"{method} {path}: HTTP {response.status} {payload[:200]!r}")
+        return response, payload
+
+    def new_piece(self, params):
+        response, _ = self._request('POST', '/states', params, expect=201)
+        state_id = response.getheader('X-State-Id')
+        # The grid shows a thumbnail, like generate_art's preview_size
+        self._request('GET', f"/states/{state_id}/still.png?render_size={min(params['size'], THUMBNAIL_SIZE)}")
+        return state_id
+
+    def frame(self, state_id, time_factor, gyro_x, gyro_y):
+        self._request('POST', f"/states/{state_id}/frame", dict(
+            PREVIEW_SETTINGS, time_factor=time_factor, gyro_x=gyro_x, gyro_y=gyro_y, end=END_PARAMS
+        ))
+
+    def video(self, state_id):
+        _, payload = self._request('POST', f"/states/{state_id}/videos", dict(
+            PREVIEW_SETTINGS, duration_seconds=VIDEO_SECONDS, end=END_PARAMS
+        ), expect=202)
+        job_id = json.loads(payload)['job_id']
+        while True:
+            _, payload = self._request('GET', f"/jobs/{job_id}")
+            status = json.loads(payload)
+            if status['status'] == 'failed':
+                raise RuntimeError(status['error'])
+            if status['status'] == 'done':
+                break
+            time.sleep(0.5)
+        self._request('GET', f"/jobs/{job_id}/video.mp4")
+
+    def close(self):
+        pass
+
+def process_tree_usage(pid):
+    """(CPU seconds, RSS bytes) of a process and all its descendants, or None if it can't be read."""
+    if PSUTIL_AVAILABLE:
+        import psutil  # type: ignore
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        cpu = rss = 0
+        for process in processes:
+            try:
+                times = process.cpu_times()
+                cpu += times.user + times.system
+                rss += process.memory_info().rss
+            except psutil.Error:
+                # Exited between listing and reading
+                pass
+        return cpu, rss
+    if not os.path.isdir('/proc'):
+        return None
+
+    # Without psutil: walk /proc (Linux)
+    ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    stats = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Fields after the parenthesized command name: state, ppid, ..., utime (12th), stime (13th)
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f"/proc/{entry}/statm") as f:
+                resident_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        stats[int(entry)] = (int(fields[1]), (int(fields[11]) + int(fields[12])) / ticks, resident_pages * page_size)
+    if pid not in stats:
+        return None
+    tree = {pid}
+    grew = True
+    while grew:
+        children = {child for child, (parent, _, _) in stats.items() if parent in tree and child not in tree}
+        tree |= children
+        grew = bool(children)
+    return sum(stats[p][1] for p in tree), sum(stats[p][2] for p in tree)
+
+class ResourceSampler:
+    """Samples CPU and RSS of the server's process tree in the background."""
+
+    def __init__(self, pid, interval=RESOURCE_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (time, cpu_seconds, rss_bytes)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _sample(self):
+        usage = process_tree_usage(self.pid)
+        if usage is not None:
+            self.samples.append((time.perf_counter(), *usage))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def summary(self):
+        if len(self.samples) < 2:
+            return None
+        # Worker processes that exit take their CPU time with them, so only count increases
+        cpu = sum(max(0.0, b[1] - a[1]) for a, b in zip(self.samples, self.samples[1:]))
+        wall = self.samples[-1][0] - self.samples[0][0]
+        return {
+            'cpu_percent': 100.0 * cpu / wall if wall > 0 else 0.0,  # 100 = one core busy
+            'rss_mb_peak': max(sample[2] for sample in self.samples) / 1024 ** 2,
+            'rss_mb_end': self.samples[-1][2] / 1024 ** 2
+        }
+
+class Recorder:
+    """Latencies and errors of one load level, shared by all client threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.frames = {}  # client -> preview frames received
+
+    def timed(self, op, fn, *args):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            with self._lock:
+                self.errors.setdefault(op, []).append(str(e))
+            return None
+        self.record(op, time.perf_counter() - start)
+        return result if result is not None else True
+
+    def record(self, op, seconds):
+        with self._lock:
+            self.latencies.setdefault(op, []).append(seconds)
+
+    def count_frame(self, client):
+        with self._lock:
+            self.frames[client] = self.frames.get(client, 0) + 1
+
+def preview_client(target, recorder, name, deadline, rng):
+    """Selects a piece and runs the real-time preview, steering with the joystick now and then."""
+    state_id = recorder.timed('art', target.new_piece, GRID_PARAMS)
+    if state_id is None:
+        return
+    start = time.perf_counter()
+    gyro_x = gyro_y = 0.0
+    while time.perf_counter() < deadline:
+        # Same slow time progression as the UI preview
+        time_factor = ((time.perf_counter() - start) * 0.01) % 1.0
+        if rng.random() < 0.05:
+            # Joystick released
+            gyro_x = gyro_y = 0.0
+        else:
+            gyro_x = max(-1.0, min(1.0, gyro_x + rng.uniform(-0.2, 0.2)))
+            gyro_y = max(-1.0, min(1.0, gyro_y + rng.uniform(-0.2, 0.2)))
+        if recorder.timed('frame', target.frame, state_id, time_factor, gyro_x, gyro_y) is None:
+            # A failing server would otherwise be hammered in a tight loop
+            time.sleep(1.0 / PREVIEW_FPS)
+            continue
+        recorder.count_frame(name)
+        time.sleep(1.0 / PREVIEW_FPS)
+
+def grid_client(target, recorder, name, deadline, rng):
+    """Generates grids of nine pieces at once, looks at them for a while, repeats."""
+    with ThreadPoolExecutor(max_workers=GRID_SIZE, thread_name_prefix=name) as burst:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            results = list(burst.map(lambda _: recorder.timed('art', target.new_piece, GRID_PARAMS), range(GRID_SIZE)))
+            if all(results):
+                # Time until the whole grid is on screen
+                recorder.record('grid', time.perf_counter() - start)
+            time.sleep(min(rng.uniform(*GRID_PAUSE), max(0.0, deadline - time.perf_counter())))
+
+def video_client(target, recorder, name, deadline, rng):
+    """Generates a piece and exports a clip of it, now and then."""
+    while time.perf_counter() < deadline:
+        state_id = recorder.timed('art', target.new_piece, GRID_PARAMS)
+        if state_id is not None:
+            recorder.timed('video', target.video, state_id)
+        time.sleep(min(rng.uniform(*VIDEO_PAUSE), max(0.0, deadline - time.perf_counter())))
+
+BEHAVIOURS = {'preview': preview_client, 'grid': grid_client, 'video': video_client}
+
+def assign_roles(clients, mix):
+    """Spread clients over behaviours in proportion to mix, interleaved so small levels get a bit of everything."""
+    roles = []
+    counts = {role: 0 for role in mix}
+    total = sum(mix.values())
+    for _ in range(clients):
+        # The role furthest below its share goes next
+        role = min(mix, key=lambda r: (counts[r] + 1) / mix[r] if mix[r] else float('inf'))
+        counts[role] += 1
+        roles.append(role)
+    return roles if total else []
+
+def run_level(target, clients, duration, mix=DEFAULT_MIX, seed=0):
+    """
+    Run one load level: clients simulated users for duration seconds.
+
+    Returns:
+        Dict with latency percentiles per operation (art = one generate_art, grid = a burst of nine,
+        frame = one preview frame, video = a whole export), preview FPS per client, errors and
+        server CPU / RSS
+    """
+    recorder = Recorder()
+    roles = assign_roles(clients, mix)
+    sampler = ResourceSampler(target.pid) if target.pid is not None else None
+    if sampler:
+        sampler.start()
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = []
+    for index, role in enumerate(roles):
+        name = f"{role}-{index}"
+        thread = threading.Thread(
+            target=BEHAVIOURS[role], args=(target, recorder, name, deadline, random.Random(seed + index)), name=name, daemon=True
+        )
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    if sampler:
+        sampler.stop()
+
+    preview_clients = [f"{role}-{index}" for index, role in enumerate(roles) if role == 'preview']
+    fps = [recorder.frames.get(name, 0) / wall for name in preview_clients]
+    return {
+        'clients': clients,
+        'roles': {role: roles.count(role) for role in mix},
+        'wall_seconds': wall,
+        'latency_ms': {
+            op: {
+                'count': len(values),
+                'p50': percentile(values, 0.5) * 1000,
+                'p95': percentile(values, 0.95) * 1000,
+                'p99': percentile(values, 0.99) * 1000,
+                'max': max(values) * 1000
+            }
+            for op, values in sorted(recorder.latencies.items())
+        },
+        'preview_fps': {
+            'per_client': fps,
+            'mean': sum(fps) / len(fps) if fps else None,
+            'min': min(fps) if fps else None
+        },
+        'errors': {op: {'count': len(messages), 'first': messages[0]} for op, messages in recorder.errors.items()},
+        'resources': sampler.summary() if sampler else None
+    }
+
+def format_level(result):
+    roles = ', '.join(f"{count} {role}" for role, count in result['roles'].items() if count)
+    lines = [f"{result['clients']} clients ({roles}), {result['wall_seconds']:.1f}s"]
+    for op, stats in result['latency_ms'].items():
+        lines.append(
+            f"  {op:<8}{stats['count']:>6}  p50 {stats['p50']:>8.1f} ms  p95 {stats['p95']:>8.1f} ms  "
+            f"p99 {stats['p99']:>8.1f} ms  max {stats['max']:>8.1f} ms"
+        )
+    fps = result['preview_fps']
+    if fps['mean'] is not None:
+        lines.append(f"  preview fps: mean {fps['mean']:.1f}, worst client {fps['min']:.1f} (target {PREVIEW_FPS})")
+    resources = result['resources']
+    if resources:
+        lines.append(f"  server: {resources['cpu_percent']:.0f}% CPU, RSS peak {resources['rss_mb_peak']:.0f} MB")
+    for op, error in result['errors'].items():
+        lines.append(f"  {error['count']} {op} errors, first: {error['first']}")
+    return '\n'.join(lines)
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        role, _, weight = part.partition('=')
+        if role not in BEHAVIOURS:
+            raise argparse.ArgumentTypeError(f"unknown client behaviour: {role}")
+        mix[role] = float(weight or 1)
+    return mix
+
+def check_estimates(model, checks=ESTIMATE_CHECKS, bound=ESTIMATE_BOUND):
+    """Render stills in this process and compare them with the model's estimates. Returns whether all are within bound."""
+    ok = True
+    for size, amount, line_width in checks:
+        features, seconds = measure_still(size, amount, line_width, 3.0)
+        ratio = model.seconds(features) / seconds
+        within = 1 / bound <= ratio <= bound
+        ok = ok and within
+        print(f"{size:5d}px {amount:5d} lines width {line_width:3d}: {seconds * 1000:8.1f} ms measured, "
+              f"estimate x{ratio:.2f}{'' if within else '  OUT OF BOUNDS'}", flush=True)
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate concurrent preview, grid and video clients and measure capacity')
+    parser.add_argument('--target', default='inprocess', help="'inprocess' (main.py's functions) or a server.py URL like http://127.0.0.1:8080")
+    parser.add_argument('--server-pid', type=int, default=None, help='PID of the server.py process, for CPU/RSS of an HTTP target')
+    parser.add_argument('--clients', default='1,2,4,8', help='comma-separated concurrency levels, run in order')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per level')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='client behaviours and weights, e.g. preview=6,grid=3,video=1')
+    parser.add_argument('--interactive-workers', type=int, default=None, help='in-process target only')
+    parser.add_argument('--batch-workers', type=int, default=None, help='in-process target only')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help='also write the results to this file, to compare runs before and after a change')
+    parser.add_argument('--check-estimates', action='store_true',
+                        help=f'only check the cost model (gallery/cost_model.json or the defaults) against stills rendered on this machine, within {ESTIMATE_BOUND}x')
+    args = parser.parse_args()
+
+    if args.check_estimates:
+        return 0 if check_estimates(CostModel.load()) else 1
+
+    data_dir = None
+    if args.target == 'inprocess':
+        # A scratch gallery, so earlier runs' cached renders don't flatter the numbers
+        data_dir = tempfile.mkdtemp(prefix='loadtest-')
+        target = InProcessTarget(data_dir, args.interactive_workers, args.batch_workers)
+    else:
+        target = HttpTarget(args.target, args.server_pid)
+
+    results = []
+    try:
+        for clients in [int(level) for level in args.clients.split(',')]:
+            result = run_level(target, clients, args.duration, args.mix, args.seed)
+            print(format_level(result), flush=True)
+            results.append(result)
+    finally:
+        target.close()
+        if data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'target': args.target, 'duration': args.duration, 'mix': args.mix, 'levels': results}, f, indent=2)
+    return 0 if not any(result['errors'] for result in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
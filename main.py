@@ -1,38 +1,241 @@
+import time
+
+# Startup timing report: (phase, seconds) in boot order
+boot_start = time.perf_counter()
+boot_timings = []
+
+def mark_boot(phase, since):
+    now = time.perf_counter()
+    boot_timings.append((phase, now - since))
+    return now
+
+phase_start = boot_start
 import eel
+phase_start = mark_boot('import eel', phase_start)
+import base64
+from concurrent.futures import wait
+import itertools
+import os
+import threading
+from admission import AdmissionController, AdmissionError, CostModel
+from affinity import AffinityPool
 import art_gen
+import frame_delta
+from frame_store import FrameStore, store_bytes
+import profiling
+import sweep
+from scheduler import JobScheduler, VIDEO_SEGMENTS
+import tiled_render
+import video_stream
+from render_pool import RenderPool, INTERACTIVE, BATCH
+from gallery import Gallery, render_key
+phase_start = mark_boot('import art_gen and helpers', phase_start)
 
-# Store art states for video generation
+# Store art states for video generation (in-memory view of the gallery)
 art_states = {}
 
+# Worker processes for CPU-bound rendering (created at startup, see bottom of file)
+pool = None
+
+# Persistent states and render cache (opened at startup, see bottom of file)
+gallery = None
+
+# Raw frames of videos rendered with keep_frames, for scrubbing and GIF/WebP export (opened at startup)
+frame_stores = None
+
+# Queue for video jobs, shared fairly between callers (started at startup, see bottom of file)
+scheduler = None
+
+# Workers for preview frames, each keeping the states routed to it prepared (created at startup)
+previews = None
+
+# Cost estimates and memory budget every render request is checked against (created at startup)
+admission = None
+
+# Last frame sent to each preview, for delta-encoded frames rendered in this process (profiled ones);
+# the rest are encoded by the preview worker that rendered them (see affinity.render_cached_frame)
+preview_streams = frame_delta.PreviewStreams()
+
+# Sequence numbers of delta-encoded preview frames, shared by all encoders so they never collide
+preview_seq = itertools.count(1)
+
+# MIME types for the still/frame formats the UI can ask for
+IMAGE_MIME_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+def data_url(mime_type, data):
+    return f'data:{mime_type};base64, ' + base64.b64encode(data).decode('utf-8')
+
+def get_stored(state_id):
+    """Look up a state in memory, falling back to the gallery for pieces from earlier sessions."""
+    if state_id not in art_states:
+        stored = gallery.get_state(state_id)
+        if stored is None:
+            return None
+        art_states[state_id] = stored
+    return art_states[state_id]
+
+def run_render(lane, fn, args, kwargs, profile=False, name=None, params=None):
+    """
+    Run a render on a pool lane (lane=None runs it in this process) and return (result, profile_info).
+    With profile=True the call runs under the profiler where it executes and profile_info describes the saved files.
+    """
+    if profile:
+        if lane is None:
+            return profiling.run_profiled(fn, args, kwargs, name, params)
+        return pool.run(lane, profiling.run_profiled, fn, args, kwargs, name, params)
+    if lane is None:
+        return fn(*args, **kwargs), None
+    return pool.run(lane, fn, *args, **kwargs), None
+
+def rejected(decision):
+    """Error response for a request admission turned down, with the estimate that decided it."""
+    return {'error': decision['reason'], 'cost': decision}
+
+def render_preview_frame(state_id, args, settings, output, profile, profile_params, stream=None):
+    """
+    Render a preview frame on the worker that keeps this state prepared (see affinity.AffinityPool).
+    Profiled frames run on the interactive lane, where the profiler sees the full preparation.
+    """
+    if profile:
+        if output == 'delta':
+            image, profile_info = run_render(INTERACTIVE, art_gen.generate_frame_at_time, args, dict(settings, output='image'), True, 'generate_realtime_frame', profile_params)
+            stream_id, base_seq, seq = stream
+            return pool.run_in_thread(preview_streams.encode, stream_id, image, base_seq, False, seq), profile_info
+        return run_render(INTERACTIVE, art_gen.generate_frame_at_time, args, dict(settings, output=output), True, 'generate_realtime_frame', profile_params)
+    return previews.render_frame(state_id, *args, settings, output, stream), None
+
+def with_profile(response, profile_info):
+    if profile_info is not None:
+        response['profile'] = profile_info
+    return response
+
+def render_still(stored, render_size=None):
+    """Render a stored piece as PNG bytes on the interactive lane (render_size for thumbnails)."""
+    params = stored['params']
+    return pool.run(
+        INTERACTIVE, art_gen.gen_art, params['size'], params['amount'], params['line_width'], params['line_width_variation'],
+        params['padding'], params['border_width'], art_state=stored['state'], render_size=render_size, output='png'
+    )
+
 @eel.expose
-def generate_art(size, amount, line_width, line_width_variation, padding, border_width):
-    result = art_gen.gen_art(size, amount, line_width, line_width_variation, padding, border_width)
-    if isinstance(result, tuple):
-        img_data, state = result
-        # Store state with a unique ID
-        import time
-        state_id = str(int(time.time() * 1000000))
-        art_states[state_id] = {
-            'state': state,
-            'params': {
-                'size': int(size),
-                'amount': int(amount),
-                'line_width': int(line_width),
-                'line_width_variation': float(line_width_variation),
-                'padding': int(padding),
-                'border_width': int(border_width)
-            }
-        }
-        return {'image': img_data, 'state_id': state_id}
-    return {'image': result, 'state_id': None}
+def generate_art(size, amount, line_width, line_width_variation, padding, border_width, preview_size=None, image_format='png', profile=False):
+    # preview_size renders a fast low-res thumbnail; the full-size image comes later from render_full
+    thumbnail_size = min(int(size), int(preview_size or size))
+    params = {
+        'size': int(size),
+        'amount': int(amount),
+        'line_width': int(line_width),
+        'line_width_variation': float(line_width_variation),
+        'padding': int(padding),
+        'border_width': int(border_width)
+    }
+    args = (size, amount, line_width, line_width_variation, padding, border_width)
+    profile_params = dict(params, render_size=thumbnail_size, image_format=image_format)
+    decision = None
+    if image_format == 'svg':
+        # Vector output skips rasterization and takes microseconds, so it isn't worth a trip to a worker
+        (image, state), profile_info = run_render(None, art_gen.gen_art, args, {'render_size': thumbnail_size, 'output': 'svg'}, profile, 'generate_art', profile_params)
+        image = image.encode('utf-8')
+    else:
+        decision = admission.check_still(params, thumbnail_size)
+        if decision['action'] == 'reject':
+            return rejected(decision)
+        thumbnail_size = decision['estimate']['render_size']
+        try:
+            with admission.reserve(decision):
+                (image, state), profile_info = run_render(INTERACTIVE, art_gen.gen_art, args, {'render_size': thumbnail_size, 'output': 'png'}, profile, 'generate_art', profile_params)
+        except AdmissionError as e:
+            return rejected(e.decision)
+    # Store state with a unique ID
+    state_id = str(int(time.time() * 1000000))
+    art_states[state_id] = {'state': state, 'params': params}
+    gallery.save_state(state_id, state, params)
+    if image_format != 'svg':
+        # Keep the thumbnail so the gallery view can show it without rendering again
+        gallery.put_render(render_key('thumbnail', state, params, {'render_size': thumbnail_size}), 'thumbnail', image)
+    response = {'image': data_url(IMAGE_MIME_TYPES[image_format], image), 'state_id': state_id}
+    if decision is not None:
+        response['cost'] = decision
+    return with_profile(response, profile_info)
 
 @eel.expose
-def generate_realtime_frame(state_id, time_factor, video_speed, video_zoom, video_zoom_speed, gyro_x, gyro_y, end_amount, end_line_width, end_line_width_variation, end_padding, end_border_width):
-    """Generate a single frame for real-time preview."""
-    if state_id not in art_states:
+def render_full(state_id, image_format='png', profile=False):
+    """Render a grid piece at its full size (requested when a thumbnail is hovered or selected)."""
+    stored = get_stored(state_id)
+    if stored is None:
+        return {'error': 'Art state not found'}
+    
+    params = stored['params']
+    args = (params['size'], params['amount'], params['line_width'], params['line_width_variation'], params['padding'], params['border_width'])
+    profile_params = dict(params, state_id=state_id, image_format=image_format)
+    profile_info = None
+    if image_format == 'svg':
+        image, profile_info = run_render(None, art_gen.gen_art, args, {'art_state': stored['state'], 'output': 'svg'}, profile, 'render_full', profile_params)
+        image = image.encode('utf-8')
+        return with_profile({'image': data_url(IMAGE_MIME_TYPES[image_format], image), 'state_id': state_id}, profile_info)
+    
+    decision = admission.check_still(params)
+    if decision['action'] == 'reject':
+        return rejected(decision)
+    try:
+        if profile:
+            # Profiled requests skip the cache so the profile shows the render, not a file read
+            with admission.reserve(decision):
+                image, profile_info = run_render(
+                    INTERACTIVE, art_gen.gen_art, args, {'art_state': stored['state'], 'render_size': decision['estimate']['render_size'], 'output': 'png'},
+                    True, 'render_full', profile_params
+                )
+        elif decision['action'] == 'downscale':
+            # Too heavy at full size: the largest size within the limits, cached like a thumbnail of that size
+            render_size = decision['estimate']['render_size']
+            def render():
+                with admission.reserve(decision):
+                    return render_still(stored, render_size)
+            image = gallery.cached_render('thumbnail', stored['state'], params, render, {'render_size': render_size})
+        else:
+            def render():
+                with admission.reserve(decision):
+                    return render_still(stored)
+            image = gallery.cached_render('still', stored['state'], params, render)
+    except AdmissionError as e:
+        return rejected(e.decision)
+    return with_profile({'image': data_url(IMAGE_MIME_TYPES[image_format], image), 'state_id': state_id, 'cost': decision}, profile_info)
+
+@eel.expose
+def list_gallery(limit=30, offset=0, favorites_only=False, preview_size=256):
+    """Saved pieces, newest first, with thumbnails from the render cache."""
+    pieces = []
+    for entry in gallery.list_states(limit, offset, favorites_only):
+        art_states.setdefault(entry['state_id'], {'state': entry['state'], 'params': entry['params']})
+        size = min(entry['params']['size'], int(preview_size))
+        thumbnail = gallery.cached_render(
+            'thumbnail', entry['state'], entry['params'], lambda: render_still(entry, size), {'render_size': size}
+        )
+        pieces.append({
+            'state_id': entry['state_id'],
+            'params': entry['params'],
+            'favorite': entry['favorite'],
+            'created_at': entry['created_at'],
+            'image': data_url('image/png', thumbnail)
+        })
+    return pieces
+
+@eel.expose
+def set_favorite(state_id, favorite=True):
+    gallery.set_favorite(state_id, bool(favorite))
+    return {'state_id': state_id, 'favorite': bool(favorite)}
+
+@eel.expose
+def generate_realtime_frame(state_id, time_factor, video_speed, video_zoom, video_zoom_speed, gyro_x, gyro_y, end_amount, end_line_width, end_line_width_variation, end_padding, end_border_width, image_format='png', profile=False, stream_id=None, base_seq=None):
+    """
+    Generate a single frame for real-time preview.
+    With a stream_id (PNG only) the frame comes back as patches against the frame with sequence number base_seq
+    that this stream was sent before; pass base_seq=None to ask for a keyframe.
+    """
+    stored = get_stored(state_id)
+    if stored is None:
         return {'error': 'Art state not found'}
     
-    stored = art_states[state_id]
     art_state = stored['state']
     start_params = stored['params']
     
@@ -45,26 +248,119 @@ def generate_realtime_frame(state_id, time_factor, video_speed, video_zoom, vide
         'border_width': int(end_border_width)
     }
     
+    settings = {
+        'speed': float(video_speed),
+        'zoom': float(video_zoom),
+        'zoom_speed': float(video_zoom_speed),
+        'gyro_x': float(gyro_x),
+        'gyro_y': float(gyro_y)
+    }
+    
+    args = (art_state, start_params, end_params, float(time_factor))
+    profile_params = dict(start_params, state_id=state_id, time_factor=float(time_factor), end_amount=end_params['amount'], image_format=image_format, **settings)
+    
+    try:
+        if image_format == 'svg':
+            # No rasterizing, so the frame is built right here and the browser scales it to the canvas
+            svg, profile_info = run_render(None, art_gen.generate_frame_at_time, args, dict(settings, output='svg'), profile, 'generate_realtime_frame', profile_params)
+            return with_profile({'frame': data_url(IMAGE_MIME_TYPES['svg'], svg.encode('utf-8'))}, profile_info)
+        decision = admission.check_still(start_params, end_params=end_params)
+        if decision['action'] == 'reject':
+            return rejected(decision)
+        if decision['action'] == 'downscale':
+            settings['render_size'] = decision['estimate']['render_size']
+        if stream_id is not None:
+            # Only what changed since the client's frame is encoded, by the worker that rendered it
+            with admission.reserve(decision):
+                delta, profile_info = render_preview_frame(state_id, args, settings, 'delta', profile, profile_params, (stream_id, base_seq, next(preview_seq)))
+            return with_profile({
+                'seq': delta['seq'],
+                'keyframe': delta['keyframe'],
+                'width': delta['width'],
+                'height': delta['height'],
+                'remap': delta['remap'],
+                'patches': [{'x': x, 'y': y, 'image': data_url('image/png', png)} for x, y, png in delta['patches']],
+                'changed_fraction': delta['changed_fraction']
+            }, profile_info)
+        with admission.reserve(decision):
+            frame_data, profile_info = render_preview_frame(state_id, args, settings, 'data_url', profile, profile_params)
+        return with_profile({'frame': frame_data}, profile_info)
+    except AdmissionError as e:
+        return rejected(e.decision)
+    except Exception as e:
+        return {'error': str(e)}
+
+@eel.expose
+def generate_frames(state_id, time_factors, video_speed, video_zoom, video_zoom_speed, gyro_x, gyro_y, end_amount, end_line_width, end_line_width_variation, end_padding, end_border_width, render_size=None, columns=None):
+    """
+    Render many timeline positions of a piece in one call (e.g. timeline thumbnails or scrubbing ahead).
+    The frames come back packed in one PNG sheet, with each frame's [x, y, width, height] box in time_factors order.
+    """
+    stored = get_stored(state_id)
+    if stored is None:
+        return {'error': 'Art state not found'}
+    
+    start_params = stored['params']
+    end_params = {
+        'size': start_params['size'],
+        'amount': int(end_amount),
+        'line_width': int(end_line_width),
+        'line_width_variation': float(end_line_width_variation),
+        'padding': start_params['padding'],
+        'border_width': int(end_border_width)
+    }
+    
+    decision = admission.check_still(start_params, int(render_size) if render_size else None, len(time_factors), end_params)
+    if decision['action'] == 'reject':
+        return rejected(decision)
+    
+    try:
+        # Batches render in parallel on the interactive lane; packing runs on a helper thread
+        with admission.reserve(decision):
+            sheet, boxes = pool.run_in_thread(
+                art_gen.generate_frames, stored['state'], start_params, end_params, [float(t) for t in time_factors],
+                speed=float(video_speed), zoom=float(video_zoom), zoom_speed=float(video_zoom_speed),
+                gyro_x=float(gyro_x), gyro_y=float(gyro_y), render_size=decision['estimate']['render_size'],
+                output='png', packed=True, columns=columns, executor=pool.executor(INTERACTIVE)
+            )
+        return {'sheet': data_url('image/png', sheet), 'frames': boxes, 'cost': decision}
+    except AdmissionError as e:
+        return rejected(e.decision)
+    except Exception as e:
+        return {'error': str(e)}
+
+@eel.expose
+def generate_sweep(state_id, axes, settings=None, cell_size=192):
+    """
+    Render a contact sheet of one piece over one or two swept parameters in a single call.
+    axes is a list of [name, [values]] pairs (columns first); see sweep.render_sweep.
+    """
+    stored = get_stored(state_id)
+    if stored is None:
+        return {'error': 'Art state not found'}
+    
     try:
-        frame_data = art_gen.generate_frame_at_time(
-            art_state, start_params, end_params,
-            float(time_factor),
-            speed=float(video_speed),
-            zoom=float(video_zoom),
-            zoom_speed=float(video_zoom_speed),
-            gyro_x=float(gyro_x),
-            gyro_y=float(gyro_y)
+        # Cells render in parallel on the interactive lane; compositing runs on a helper thread
+        sheet, cells = pool.run_in_thread(
+            sweep.render_sweep, stored['state'], stored['params'], [tuple(axis) for axis in axes],
+            settings=settings, cell_size=int(cell_size), executor=pool.executor(INTERACTIVE), output='png'
         )
-        return {'frame': frame_data}
+        return {'sheet': data_url('image/png', sheet), 'cells': cells}
     except Exception as e:
         return {'error': str(e)}
 
 @eel.expose
-def generate_video(state_id, video_speed, video_zoom, video_zoom_speed, end_amount, end_line_width, end_line_width_variation, end_padding, end_border_width):
-    if state_id not in art_states:
+def generate_video(state_id, video_speed, video_zoom, video_zoom_speed, end_amount, end_line_width, end_line_width_variation, end_padding, end_border_width, profile=False, keep_frames=False, stream=False):
+    """
+    Render a 30 second clip of a piece. With keep_frames the raw frames are also kept in a frame store,
+    and the response carries its frames_key for get_video_frame and export_frames.
+    With stream the call returns right away with a stream_url the player can start on while the clip renders
+    (and a job_id for get_video_job); clips already in the cache come back whole as usual.
+    """
+    stored = get_stored(state_id)
+    if stored is None:
         return {'error': 'Art state not found'}
     
-    stored = art_states[state_id]
     art_state = stored['state']
     start_params = stored['params']
     
@@ -78,10 +374,179 @@ def generate_video(state_id, video_speed, video_zoom, video_zoom_speed, end_amou
     }
     
     try:
-        video_data = art_gen.generate_video(art_state, start_params, end_params, duration_seconds=30, fps=10, speed=float(video_speed), zoom=float(video_zoom), zoom_speed=float(video_zoom_speed))
-        return {'video': video_data}
+        settings = {'duration_seconds': 30, 'fps': 10, 'speed': float(video_speed), 'zoom': float(video_zoom), 'zoom_speed': float(video_zoom_speed)}
+        # Videos are only admitted or rejected here; the job queue decides when they run.
+        # Streamed clips render in one process, in order; others as parallel segments
+        processes = 1 if stream else min(VIDEO_SEGMENTS, pool.workers(BATCH))
+        decision = admission.check_video(start_params, end_params, settings['duration_seconds'], settings['fps'], processes)
+        if decision['action'] == 'reject':
+            return rejected(decision)
+        if profile:
+            # Profile the whole clip in one batch worker (segment workers would each see only a slice)
+            video_data, profile_info = run_render(
+                BATCH, art_gen.generate_video, (art_state, start_params, end_params), dict(settings, output='mp4'),
+                True, 'generate_video', dict(start_params, state_id=state_id, end_amount=end_params['amount'], **settings)
+            )
+            return with_profile({'video': data_url('video/mp4', video_data), 'cost': decision}, profile_info)
+        options = dict(settings, end_params=end_params)
+        frames_key = render_key('frames', art_state, start_params, options)
+        frames_dir = None
+        if keep_frames and not frame_stores.exists(frames_key):
+            frames_dir = frame_stores.path(frames_key)
+            frame_stores.make_room(store_bytes(settings['duration_seconds'] * settings['fps'], art_gen.video_frame_size(start_params['size'])))
+        video_key = render_key('video', art_state, start_params, options)
+        if stream and (frames_dir is not None or gallery.get_render(video_key) is None):
+            job_id = scheduler.submit(
+                'video', dict(settings, state=art_state, params=start_params, end_params=end_params, frames_dir=frames_dir, stream=True), client='ui'
+            )
+            def cache_video(done):
+                if done.exception() is None:
+                    gallery.put_render(video_key, 'video', done.result())
+            scheduler.future(job_id).add_done_callback(cache_video)
+            response = {'stream_url': f'/video_stream/{job_id}.mp4', 'job_id': job_id, 'cost': decision}
+            if keep_frames:
+                response['frames_key'] = frames_key
+                response['frame_count'] = settings['duration_seconds'] * settings['fps']
+            return response
+        def render():
+            # Queued behind other video jobs; runs as parallel segments on the batch lane once CPU slots are free
+            job_id = scheduler.submit(
+                'video', dict(settings, state=art_state, params=start_params, end_params=end_params, frames_dir=frames_dir), client='ui'
+            )
+            video_data = pool.wait(scheduler.future(job_id))
+            # The clip goes into the gallery cache, so the job's copy isn't needed
+            scheduler.remove(job_id)
+            return video_data
+        if frames_dir is None:
+            video_data = gallery.cached_render('video', art_state, start_params, render, options)
+        else:
+            # A cached mp4 has no frames behind it, so this one is rendered again
+            video_data = render()
+            gallery.put_render(video_key, 'video', video_data)
+        response = {'video': data_url('video/mp4', video_data), 'cost': decision}
+        if keep_frames:
+            response['frames_key'] = frames_key
+            response['frame_count'] = settings['duration_seconds'] * settings['fps']
+        return response
     except Exception as e:
         return {'error': str(e)}
 
-eel.init('www')
-eel.start('index.html', port = 2000)
+@eel.expose
+def get_video_job(job_id):
+    """Status of a video job started by generate_video (queued, running, done or failed)."""
+    status = scheduler.status(job_id)
+    if status is None:
+        return {'error': 'Job not found'}
+    return status
+
+@eel.btl.route('/video_stream/<job_id>.mp4')
+def stream_video(job_id):
+    """The fragmented MP4 of a streamed video job, sent as it is encoded (the whole file once it is done)."""
+    source = scheduler.stream(job_id)
+    if source is None:
+        eel.btl.abort(404, 'No streaming video for this job')
+    path, finished = source
+    eel.btl.response.content_type = 'video/mp4'
+    # Generator response: bottle sends it chunked, eel.sleep lets other requests run between fragments
+    return video_stream.follow(path, finished, sleep=eel.sleep)
+
+@eel.expose
+def get_video_frame(frames_key, frame_num, size=None):
+    """One frame of a video rendered with keep_frames, read from its frame store without rendering or decoding."""
+    reader = frame_stores.open(frames_key)
+    if reader is None:
+        return {'error': 'No stored frames for this video'}
+    try:
+        image = reader.export_still(int(frame_num), size=int(size) if size else None)
+        return {'image': data_url('image/png', image), 'frame': int(frame_num), 'frame_count': len(reader)}
+    except IndexError as e:
+        return {'error': str(e)}
+    finally:
+        reader.close()
+
+@eel.expose
+def export_frames(frames_key, format='gif', start=0, end=None, step=1, size=None):
+    """Write stored frames of a video as an animated GIF or WebP into exports/."""
+    reader = frame_stores.open(frames_key)
+    if reader is None:
+        return {'error': 'No stored frames for this video'}
+    
+    os.makedirs('exports', exist_ok=True)
+    output_path = os.path.join('exports', f"frames_{frames_key[:16]}_{int(start)}-{end or len(reader)}.{format.lower()}")
+    try:
+        pool.run_in_thread(
+            reader.export_animation, output_path, format, int(start), int(end) if end else None, int(step), int(size) if size else None
+        )
+        return {'path': os.path.abspath(output_path)}
+    except Exception as e:
+        return {'error': str(e)}
+    finally:
+        reader.close()
+
+@eel.expose
+def export_large(state_id, target_size, tile_size=1024):
+    """Render the selected piece at poster resolution using the tiled, memory-bounded renderer."""
+    stored = get_stored(state_id)
+    if stored is None:
+        return {'error': 'Art state not found'}
+    
+    os.makedirs('exports', exist_ok=True)
+    output_path = os.path.join('exports', f"art_{state_id}_{int(target_size)}.png")
+    
+    try:
+        # Tiles fan out over the batch lane; the band stitching runs on a helper thread
+        pool.run_in_thread(
+            tiled_render.render_tiled, stored['state'], stored['params'], int(target_size), output_path,
+            tile_size=int(tile_size), executor=pool.executor(BATCH)
+        )
+        return {'path': os.path.abspath(output_path)}
+    except Exception as e:
+        return {'error': str(e)}
+
+@eel.expose
+def get_queue_metrics():
+    """Job queue depth, CPU slots in use and recent wait times, plus the preview workers' cache hit rate."""
+    return dict(scheduler.metrics(), previews=previews.metrics())
+
+@eel.expose
+def list_profiles(name=None):
+    """Profiles saved by requests made with profile=True, newest first."""
+    return profiling.list_profiles(profiling.PROFILES_DIR, name)
+
+@eel.expose
+def get_startup_report():
+    """Where boot time went, in milliseconds."""
+    return [{'phase': phase, 'ms': round(seconds * 1000, 1)} for phase, seconds in boot_timings]
+
+def print_startup_report():
+    print('Startup timings:')
+    for phase, seconds in boot_timings:
+        print(f'  {phase:<32}{seconds * 1000:>9.1f} ms')
+
+if __name__ == '__main__':
+    # Workers are spawned, so this guard keeps them from starting their own pool and UI
+    pool = RenderPool(sleep=eel.sleep)
+    previews = AffinityPool(sleep=eel.sleep)
+    phase_start = mark_boot('create worker pool', phase_start)
+    gallery = Gallery()
+    frame_stores = FrameStore(os.path.join(gallery.root, 'frames'))
+    admission = AdmissionController(CostModel.load(os.path.join(gallery.root, 'cost_model.json')), sleep=eel.sleep)
+    scheduler = JobScheduler(pool, cpu_budget=pool.workers(BATCH), admission=admission)
+    phase_start = mark_boot('open gallery and job queue', phase_start)
+    
+    # Tiny warm-up render in this process (PIL plugins, PNG encoder) ...
+    art_gen.warm_up()
+    phase_start = mark_boot('warm-up render (main process)', phase_start)
+    # ... and in every worker, in the background while the window opens
+    warm_up_futures = pool.warm_up(art_gen.warm_up) + previews.warm_up(art_gen.warm_up)
+    def report_workers_warm():
+        # One waiter for all of them, so the timing is recorded exactly once
+        wait(warm_up_futures)
+        boot_timings.append(('workers warm (background)', time.perf_counter() - boot_start))
+    threading.Thread(target=report_workers_warm, name='warm-up-report', daemon=True).start()
+    
+    eel.init('www')
+    mark_boot('eel.init', phase_start)
+    boot_timings.append(('total to first serve', time.perf_counter() - boot_start))
+    print_startup_report()
+    eel.start('index.html', port = 2000)
@@ -0,0 +1,97 @@
+import queue
+import threading
+import time
+
+# Marks the end of the stream between stages
+_DONE = object()
+
+def run_pipeline(items, stages, queue_size=4):
+    """
+    Run items through a chain of stages, each on its own thread, connected by bounded queues.
+    A stage that gets ahead blocks on the full queue in front of it (backpressure), so at most
+    about queue_size items per link are in flight no matter how long the stream is.
+
+    Args:
+        items: Iterable feeding the first stage
+        stages: List of (name, fn); every fn takes the previous stage's output, the last one's result is dropped
+        queue_size: Capacity of each queue between stages
+
+    Returns:
+        Stats dict: wall time, item count and per stage busy / starved (waiting for input) /
+        blocked (waiting on the next stage) seconds plus utilization. The stage with the highest
+        utilization is reported as the bottleneck.
+    """
+    links = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) - 1)]
+    stats = [{'name': name, 'items': 0, 'busy_seconds': 0.0, 'starved_seconds': 0.0, 'blocked_seconds': 0.0} for name, _ in stages]
+    errors = []
+
+    def worker(index):
+        fn = stages[index][1]
+        stage_stats = stats[index]
+        inbox = links[index - 1] if index > 0 else None
+        outbox = links[index] if index < len(links) else None
+        source = iter(items) if inbox is None else None
+        failed = False
+        while True:
+            wait_start = time.perf_counter()
+            if inbox is None:
+                # A failure anywhere stops the source, the rest of the chain drains what is in flight
+                item = next(source, _DONE) if not errors else _DONE
+            else:
+                item = inbox.get()
+            busy_start = time.perf_counter()
+            stage_stats['starved_seconds'] += busy_start - wait_start
+            if item is _DONE:
+                break
+            if failed:
+                # Keep draining so upstream stages never block on a full queue
+                continue
+            try:
+                result = fn(item)
+            except BaseException as e:
+                errors.append(e)
+                failed = True
+                if inbox is None:
+                    break
+                continue
+            put_start = time.perf_counter()
+            stage_stats['busy_seconds'] += put_start - busy_start
+            stage_stats['items'] += 1
+            if outbox is not None:
+                outbox.put(result)
+                stage_stats['blocked_seconds'] += time.perf_counter() - put_start
+        if outbox is not None:
+            outbox.put(_DONE)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,), name=f"pipeline-{name}", daemon=True) for index, (name, _) in enumerate(stages)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    if errors:
+        raise errors[0]
+
+    for stage_stats in stats:
+        stage_stats['utilization'] = stage_stats['busy_seconds'] / wall if wall > 0 else 0.0
+    return {
+        'wall_seconds': wall,
+        'items': stats[-1]['items'],
+        'stages': stats,
+        'bottleneck': max(stats, key=lambda stage_stats: stage_stats['utilization'])['name']
+    }
+
+def format_stats(stats):
+    lines = [f"{stats['items']} items in {stats['wall_seconds']:.2f}s, bottleneck: {stats['bottleneck']}"]
+    for stage_stats in stats['stages']:
+        lines.append(
+            f"  {stage_stats['name']:<12}{stage_stats['utilization'] * 100:>6.1f}% busy  "
+            f"starved {stage_stats['starved_seconds']:.2f}s  blocked {stage_stats['blocked_seconds']:.2f}s"
+        )
+    if 'repeated_frames' in stats:
+        lines.append(f"  repeated frames (not drawn again): {stats['repeated_frames']}")
+    if 'encoder_drain_seconds' in stats:
+        lines.append(f"  encoder drain after last frame: {stats['encoder_drain_seconds']:.2f}s")
+    return '\n'.join(lines)
@@ -0,0 +1,128 @@
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILES_DIR = 'profiles'
+
+# Sampling interval for the collapsed-stack profile (seconds)
+SAMPLE_INTERVAL = 0.001
+
+class StackSampler:
+    """
+    Samples the call stack of one thread at a fixed interval and counts identical stacks.
+    The counts are written in the collapsed format flamegraph.pl and speedscope read: 'a;b;c 42'.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL, root_code=None):
+        """root_code: stop walking up the stack at this code object, dropping pool/bootstrap frames above it."""
+        self.thread_id = thread_id
+        self.root_code = root_code
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                if code is self.root_code:
+                    break
+                frame = frame.f_back
+            # Root first, like flamegraph expects
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def profile_name(name, params):
+    """File-safe profile name: timestamp, the request name and its scalar params."""
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+    tags = [f"{key}{value}" for key, value in sorted(params.items()) if isinstance(value, (int, float, str))]
+    label = '_'.join([name] + tags)
+    return f"{stamp}_{re.sub(r'[^A-Za-z0-9._-]+', '-', label)[:120]}"
+
+def run_profiled(fn, args=(), kwargs=None, name=None, params=None, profiles_dir=PROFILES_DIR):
+    """
+    Run fn(*args, **kwargs) under cProfile and a stack sampler and save both next to a JSON description.
+    Module-level and picklable, so it can be submitted to a worker pool to profile the render where it runs.
+
+    Args:
+        name: Request name for the files (default: the function's name)
+        params: Request parameters to tag the profile with (stored in the JSON sidecar)
+
+    Returns:
+        (result, info) where info is the sidecar dict
+    """
+    kwargs = kwargs or {}
+    name = name or fn.__name__
+    params = params or {}
+    os.makedirs(profiles_dir, exist_ok=True)
+    base = os.path.join(profiles_dir, profile_name(name, params))
+
+    sampler = StackSampler(threading.get_ident(), root_code=sys._getframe().f_code)
+    profiler = cProfile.Profile()
+    sampler.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        duration = time.perf_counter() - start
+        sampler.stop()
+
+    profiler.dump_stats(base + '.prof')
+    sampler.write_collapsed(base + '.collapsed')
+    info = {
+        'id': os.path.basename(base),
+        'name': name,
+        'params': params,
+        'duration_ms': round(duration * 1000, 2),
+        'samples': sum(sampler.stacks.values()),
+        'created_at': time.time(),
+        'pid': os.getpid(),
+        'prof_path': os.path.abspath(base + '.prof'),
+        'collapsed_path': os.path.abspath(base + '.collapsed')
+    }
+    with open(base + '.json', 'w') as f:
+        json.dump(info, f, indent=2)
+    return result, info
+
+def list_profiles(profiles_dir=PROFILES_DIR, name=None):
+    """Saved profiles, newest first, optionally only those of one request name."""
+    if not os.path.isdir(profiles_dir):
+        return []
+    profiles = []
+    for filename in os.listdir(profiles_dir):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(profiles_dir, filename)) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if name is None or info.get('name') == name:
+            profiles.append(info)
+    profiles.sort(key=lambda info: info.get('created_at', 0), reverse=True)
+    return profiles
@@ -0,0 +1,230 @@
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+from io import BytesIO
+import argparse
+import math
+import os
+import sys
+import tempfile
+import art_gen
+import tiled_render
+import video_segments
+
+# Fixed corpus: seeds and generation params covering thin/thick lines, padding and borders
+CORPUS_SEEDS = [1, 7, 42]
+CORPUS_PARAMS = [
+    {'size': 256, 'amount': 100, 'line_width': 1, 'line_width_variation': 3.0, 'padding': 0, 'border_width': 0},
+    {'size': 384, 'amount': 250, 'line_width': 4, 'line_width_variation': 6.0, 'padding': 20, 'border_width': 5},
+]
+# Animation samples: (time_factor, gyro_x, gyro_y)
+FRAME_SAMPLES = [(0.0, 0.0, 0.0), (0.25, 0.0, 0.0), (0.5, 0.7, -0.4), (0.9, -1.0, 1.0)]
+ANIMATION_SETTINGS = {'speed': 20.0, 'zoom': 1.1, 'zoom_speed': 1.0}
+# Short clip for encoder comparisons
+VIDEO_SETTINGS = {'duration_seconds': 1, 'fps': 5}
+
+# Default tolerances
+PIXEL_TOLERANCE = 8  # Max per-channel difference before a pixel counts as changed
+MAX_CHANGED_FRACTION = 0.002  # Share of pixels allowed to differ by more than PIXEL_TOLERANCE
+MIN_PSNR = 35.0  # dB
+MAX_BLURRED_DIFF = 1.5  # Mean luminance difference after blurring (perceptual check)
+DEFAULT_TOLERANCES = {
+    'pixel_tolerance': PIXEL_TOLERANCE,
+    'max_changed_fraction': MAX_CHANGED_FRACTION,
+    'min_psnr': MIN_PSNR,
+    'max_blurred_diff': MAX_BLURRED_DIFF
+}
+
+def build_corpus(seeds=None, param_sets=None):
+    """Generate the seeded art states every backend is compared on."""
+    corpus = []
+    for params in (param_sets or CORPUS_PARAMS):
+        for seed in (seeds or CORPUS_SEEDS):
+            _, state = art_gen.gen_art(
+                params['size'], params['amount'], params['line_width'], params['line_width_variation'],
+                params['padding'], params['border_width'], seed=seed
+            )
+            corpus.append({'seed': seed, 'params': params, 'state': state})
+    return corpus
+
+def end_params_for(params):
+    """End params for animation samples: fewer, thicker lines so interpolation is exercised."""
+    end_params = dict(params)
+    end_params['amount'] = max(1, params['amount'] // 2)
+    end_params['line_width'] = params['line_width'] + 2
+    return end_params
+
+def reference_still(case):
+    params = case['params']
+    return art_gen.gen_art(
+        params['size'], params['amount'], params['line_width'], params['line_width_variation'],
+        params['padding'], params['border_width'], art_state=case['state'], output='image'
+    )
+
+def reference_frame(case, time_factor, gyro_x, gyro_y):
+    return art_gen.generate_frame_at_time(
+        case['state'], case['params'], end_params_for(case['params']), time_factor,
+        gyro_x=gyro_x, gyro_y=gyro_y, output='image', **ANIMATION_SETTINGS
+    )
+
+def reference_video(case):
+    return art_gen.generate_video(
+        case['state'], case['params'], end_params_for(case['params']),
+        output='mp4', **VIDEO_SETTINGS, **ANIMATION_SETTINGS
+    )
+
+def decode_video(video_bytes):
+    """Decode mp4 bytes into a list of RGB PIL images."""
+    import imageio  # type: ignore
+    return [Image.fromarray(frame).convert('RGB') for frame in imageio.mimread(BytesIO(video_bytes), format='mp4', memtest=False)]
+
+def tiled_still(case):
+    """Tiled renderer at the original size (tiles much smaller than the canvas to exercise seams)."""
+    fd, path = tempfile.mkstemp(suffix='.png')
+    os.close(fd)
+    try:
+        tiled_render.render_tiled(case['state'], case['params'], case['params']['size'], path, tile_size=64, workers=1)
+        with Image.open(path) as image:
+            return image.convert('RGB')
+    finally:
+        os.remove(path)
+
+def segmented_video(case):
+    """Segment-parallel encode, split into more segments than the short clip strictly needs."""
+    return video_segments.generate_video_segmented(
+        case['state'], case['params'], end_params_for(case['params']),
+        segments=2, output='mp4', **VIDEO_SETTINGS, **ANIMATION_SETTINGS
+    )
+
+# Optimized backends: name -> functions mirroring the reference ones (None = not implemented)
+BACKENDS = {
+    'tiled': {'still': tiled_still, 'frame': None, 'video': None},
+    'segmented': {'still': None, 'frame': None, 'video': segmented_video},
+}
+
+def register_backend(name, still=None, frame=None, video=None):
+    """
+    Register an optimized backend to verify against the reference implementation.
+    still(case) and frame(case, time_factor, gyro_x, gyro_y) return PIL images,
+    video(case) returns mp4 bytes.
+    """
+    BACKENDS[name] = {'still': still, 'frame': frame, 'video': video}
+
+def compare_images(reference, candidate, pixel_tolerance=PIXEL_TOLERANCE):
+    """Per-pixel and perceptual difference metrics between two images."""
+    reference = reference.convert('RGB')
+    candidate = candidate.convert('RGB')
+    if reference.size != candidate.size:
+        return {'size_mismatch': True, 'max_diff': 255, 'changed_fraction': 1.0, 'psnr': 0.0, 'blurred_diff': 255.0}
+
+    diff = ImageChops.difference(reference, candidate)
+    red, green, blue = diff.split()
+    channel_max = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    max_diff = channel_max.getextrema()[1]
+    changed = channel_max.point(lambda value: 255 if value > pixel_tolerance else 0).histogram()[255]
+    changed_fraction = changed / (reference.size[0] * reference.size[1])
+
+    mse = sum(rms * rms for rms in ImageStat.Stat(diff).rms) / 3
+    psnr = float('inf') if mse == 0 else 10 * math.log10(255 * 255 / mse)
+
+    # Perceptual check: small misplaced pixels disappear after a blur, visible drift does not
+    blur = ImageFilter.GaussianBlur(2)
+    blurred_diff = ImageChops.difference(
+        reference.convert('L').filter(blur), candidate.convert('L').filter(blur)
+    )
+    return {
+        'size_mismatch': False,
+        'max_diff': max_diff,
+        'changed_fraction': changed_fraction,
+        'psnr': psnr,
+        'blurred_diff': ImageStat.Stat(blurred_diff).mean[0]
+    }
+
+def within_tolerance(metrics, max_changed_fraction=MAX_CHANGED_FRACTION, min_psnr=MIN_PSNR, max_blurred_diff=MAX_BLURRED_DIFF):
+    return (not metrics['size_mismatch']
+            and metrics['changed_fraction'] <= max_changed_fraction
+            and metrics['psnr'] >= min_psnr
+            and metrics['blurred_diff'] <= max_blurred_diff)
+
+def run_checks(backend_names=None, corpus=None, tolerances=None):
+    """
+    Render the corpus through the reference and every selected backend and compare frame by frame.
+    Returns a list of result dicts sorted worst first.
+    """
+    corpus = corpus or build_corpus()
+    # A copy, so the caller's dict is left as it was
+    tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+    pixel_tolerance = tolerances.pop('pixel_tolerance')
+    results = []
+
+    def record(backend, case, label, reference, candidate):
+        metrics = compare_images(reference, candidate, pixel_tolerance)
+        results.append(dict(
+            metrics,
+            backend=backend,
+            seed=case['seed'],
+            size=case['params']['size'],
+            sample=label,
+            passed=within_tolerance(metrics, **tolerances)
+        ))
+
+    for name in (backend_names or list(BACKENDS)):
+        backend = BACKENDS[name]
+        for case in corpus:
+            if backend['still']:
+                record(name, case, 'still', reference_still(case), backend['still'](case))
+            if backend['frame']:
+                for time_factor, gyro_x, gyro_y in FRAME_SAMPLES:
+                    record(name, case, f't={time_factor} gyro=({gyro_x}, {gyro_y})',
+                           reference_frame(case, time_factor, gyro_x, gyro_y),
+                           backend['frame'](case, time_factor, gyro_x, gyro_y))
+            if backend['video']:
+                reference_frames = decode_video(reference_video(case))
+                candidate_frames = decode_video(backend['video'](case))
+                if len(reference_frames) != len(candidate_frames):
+                    results.append({
+                        'backend': name, 'seed': case['seed'], 'size': case['params']['size'],
+                        'sample': f'video frame count {len(reference_frames)} != {len(candidate_frames)}',
+                        'size_mismatch': True, 'max_diff': 255, 'changed_fraction': 1.0,
+                        'psnr': 0.0, 'blurred_diff': 255.0, 'passed': False
+                    })
+                for frame_num, (reference, candidate) in enumerate(zip(reference_frames, candidate_frames)):
+                    record(name, case, f'video frame {frame_num}', reference, candidate)
+
+    # Worst first: failures, then lowest PSNR
+    results.sort(key=lambda result: (result['passed'], result['psnr']))
+    return results
+
+def format_report(results, worst=10):
+    lines = []
+    failed = [result for result in results if not result['passed']]
+    lines.append(f"{len(results)} comparisons, {len(failed)} outside tolerance")
+    lines.append(f"{'backend':<12}{'seed':>6}{'size':>6}  {'max':>4} {'changed':>9} {'psnr':>8} {'blur':>7}  sample")
+    for result in results[:worst]:
+        status = 'FAIL' if not result['passed'] else 'ok'
+        lines.append(
+            f"{result['backend']:<12}{result['seed']:>6}{result['size']:>6}  {result['max_diff']:>4} "
+            f"{result['changed_fraction']:>9.5f} {result['psnr']:>8.2f} {result['blurred_diff']:>7.3f}  "
+            f"{result['sample']} [{status}]"
+        )
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare optimized render backends against the reference implementation')
+    parser.add_argument('--backend', action='append', choices=sorted(BACKENDS), help='backend to check (default: all)')
+    parser.add_argument('--worst', type=int, default=10, help='how many worst-case comparisons to print')
+    parser.add_argument('--pixel-tolerance', type=int, default=PIXEL_TOLERANCE)
+    parser.add_argument('--max-changed-fraction', type=float, default=MAX_CHANGED_FRACTION)
+    parser.add_argument('--min-psnr', type=float, default=MIN_PSNR)
+    parser.add_argument('--max-blurred-diff', type=float, default=MAX_BLURRED_DIFF)
+    args = parser.parse_args()
+
+    results = run_checks(args.backend, tolerances={
+        'pixel_tolerance': args.pixel_tolerance,
+        'max_changed_fraction': args.max_changed_fraction,
+        'min_psnr': args.min_psnr,
+        'max_blurred_diff': args.max_blurred_diff
+    })
+    print(format_report(results, args.worst))
+    return 0 if all(result['passed'] for result in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
+import time
+
+# Lanes: interactive work (preview frames, thumbnails) vs batch work (videos, large exports)
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+# Batch workers run at a lower OS priority so they only use CPU that interactive work leaves idle
+BATCH_NICENESS = 10
+
+def _lower_priority():
+    """Worker initializer for the batch lane."""
+    try:
+        os.nice(BATCH_NICENESS)
+    except (AttributeError, OSError):
+        # os.nice is not available on every platform - run at normal priority there
+        pass
+
+class RenderPool:
+    """
+    Managed pool of render worker processes with separate lanes for interactive and batch work.
+    Each lane has its own processes so a long video render never queues in front of a preview frame,
+    and callers wait on results with a cooperative sleep so eel's event loop keeps serving other calls.
+    """
+
+    def __init__(self, interactive_workers=None, batch_workers=None, sleep=time.sleep, poll_interval=0.005):
+        """
+        Args:
+            interactive_workers: Processes for previews and thumbnails (default: one per core)
+            batch_workers: Processes for videos and exports (default: half the cores)
+            sleep: Sleep function used while waiting (pass eel.sleep / gevent.sleep to yield to the event loop)
+            poll_interval: Seconds between checks while waiting for a result
+        """
+        cpu_count = os.cpu_count() or 2
+        if interactive_workers is None:
+            interactive_workers = cpu_count
+        if batch_workers is None:
+            batch_workers = max(1, cpu_count // 2)
+
+        # spawn keeps workers independent of the parent's event loop and open sockets
+        context = multiprocessing.get_context('spawn')
+        self._lanes = {
+            INTERACTIVE: ProcessPoolExecutor(max_workers=interactive_workers, mp_context=context),
+            BATCH: ProcessPoolExecutor(max_workers=batch_workers, mp_context=context, initializer=_lower_priority)
+        }
+        self._workers = {INTERACTIVE: interactive_workers, BATCH: batch_workers}
+        self._threads = ThreadPoolExecutor(max_workers=4)
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+
+    def executor(self, lane):
+        """Return the executor behind a lane (for code that needs executor.map directly)."""
+        return self._lanes[lane]
+
+    def workers(self, lane):
+        """Number of worker processes behind a lane."""
+        return self._workers[lane]
+
+    def submit(self, lane, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) on a lane and return its future. fn must be picklable."""
+        return self._lanes[lane].submit(fn, *args, **kwargs)
+
+    def wait(self, future):
+        """Wait for a future without blocking the event loop, then return its result (or raise its error)."""
+        while not future.done():
+            self.sleep(self.poll_interval)
+        return future.result()
+
+    def run(self, lane, fn, *args, **kwargs):
+        """Run fn in a worker process of the given lane and wait for the result cooperatively."""
+        return self.wait(self.submit(lane, fn, *args, **kwargs))
+
+    def map(self, lane, fn, iterable):
+        """Run fn over every item in parallel on a lane and return the results in order."""
+        futures = [self.submit(lane, fn, item) for item in iterable]
+        return [self.wait(future) for future in futures]
+
+    def run_in_thread(self, fn, *args, **kwargs):
+        """
+        Run fn on a helper thread and wait cooperatively. Used for orchestration code that
+        itself fans out to a lane executor (e.g. tiled exports) and would otherwise block the loop.
+        """
+        return self.wait(self._threads.submit(fn, *args, **kwargs))
+
+    def warm_up(self, fn):
+        """
+        Start every worker process and run fn once per worker slot without waiting.
+        Workers start lazily otherwise, so the first requests would pay for process spawn and imports.
+        Returns the futures so callers can report when warm-up finished.
+        """
+        return [self.submit(lane, fn) for lane, count in self._workers.items() for _ in range(count)]
+
+    def shutdown(self, wait=True):
+        for executor in self._lanes.values():
+            executor.shutdown(wait=wait)
+        self._threads.shutdown(wait=wait)
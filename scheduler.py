@@ -0,0 +1,405 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import art_gen
+import video_segments
+import video_stream
+from render_pool import INTERACTIVE, BATCH
+
+# Priorities: lower runs first, FIFO within one priority
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+# Running jobs allowed per client before its other jobs wait
+PER_CLIENT_LIMIT = 2
+
+# Default CPU slots a video job takes (it renders this many segments in parallel)
+VIDEO_SEGMENTS = 4
+
+# Result file extension per job kind
+RESULT_EXTENSIONS = {'still': 'png', 'frames': 'mp4', 'video': 'mp4'}
+
+# Started jobs kept for wait-time metrics
+METRICS_WINDOW = 500
+
+# Seconds between checks while the job at the head of the queue waits for memory held by other renders
+MEMORY_POLL_SECONDS = 0.1
+
+# Finished jobs (and their result files) are deleted this long after they finished
+JOB_RETENTION_SECONDS = 24 * 3600
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE NOT NULL,
+    client TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    cost INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result_path TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, seq);
+'''
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class JobScheduler:
+    """
+    Persistent render job queue in front of the worker pool.
+
+    Jobs are stills, frame ranges (one mp4 segment) or whole videos. They are dispatched by priority and
+    submission order, a client never has more than per_client_limit jobs running, and the CPU slots
+    (cost) of running jobs never exceed cpu_budget. With an AdmissionController, a job also only starts once its
+    estimated memory fits the controller's budget, which it shares with the stills and frames rendered meanwhile.
+    Jobs and their results survive restarts; jobs that were running when the process stopped are queued again.
+    Finished jobs are deleted after retention_seconds.
+    """
+
+    def __init__(self, pool, root='gallery', cpu_budget=None, per_client_limit=PER_CLIENT_LIMIT, retention_seconds=JOB_RETENTION_SECONDS, admission=None):
+        """
+        Args:
+            pool: RenderPool the jobs run on
+            root: Directory for jobs.db and the job results
+            cpu_budget: CPU slots shared by all running jobs (default: one per core)
+            per_client_limit: Running jobs allowed per client
+            retention_seconds: How long finished jobs and their results are kept
+            admission: AdmissionController whose memory budget running jobs reserve against (default: none)
+        """
+        self.pool = pool
+        self.results_dir = os.path.join(root, 'jobs')
+        os.makedirs(self.results_dir, exist_ok=True)
+        self.cpu_budget = cpu_budget or os.cpu_count() or 1
+        self.per_client_limit = per_client_limit
+        self.retention_seconds = retention_seconds
+        self.admission = admission
+        # Segmented videos are orchestrated from a thread for their whole run; these threads are the scheduler's own,
+        # so running jobs never take the pool's helper threads from interactive work. Every job takes at least one
+        # CPU slot, so cpu_budget threads are always enough
+        self._orchestrators = ThreadPoolExecutor(max_workers=self.cpu_budget, thread_name_prefix='job')
+        self._cond = threading.Condition()
+        self._db = sqlite3.connect(os.path.join(root, 'jobs.db'), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+        with self._db:
+            self._db.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+        self.prune()
+        self._running = {}  # job_id -> {'client', 'cost', 'memory'}
+        self._futures = {}
+        self._stopped = False
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+        self._dispatcher.start()
+
+    # Public API
+
+    def submit(self, kind, spec, client='local', priority=PRIORITY_NORMAL, cost=None):
+        """
+        Queue a job and return its ID.
+
+        Args:
+            kind: 'still' (spec: state, params, render_size), 'frames' (spec: state, params, end_params,
+                start_frame, end_frame, total_frames, fps, speed, zoom, zoom_speed) or 'video' (spec: state,
+                params, end_params, duration_seconds, fps, speed, zoom, zoom_speed, optional frames_dir; with
+                "stream": true it renders as one fragmented MP4 that can be read while it grows, see stream)
+            spec: JSON-serializable job description
+            client: Who submitted the job, for the per-client limit
+            priority: PRIORITY_HIGH / NORMAL / LOW or any int, lower first
+            cost: CPU slots the job occupies (default: 1, VIDEO_SEGMENTS for videos that don't stream)
+        """
+        if kind not in RESULT_EXTENSIONS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if cost is None:
+            cost = VIDEO_SEGMENTS if kind == 'video' and not spec.get('stream') else 1
+        # A job bigger than the whole budget could never start
+        cost = max(1, min(int(cost), self.cpu_budget))
+        job_id = uuid.uuid4().hex
+        with self._cond:
+            with self._db:
+                self._db.execute(
+                    'INSERT INTO jobs (id, client, kind, priority, cost, status, spec, submitted_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, str(client), kind, int(priority), cost, 'queued', json.dumps(spec), time.time())
+                )
+            self._futures[job_id] = Future()
+            self._cond.notify_all()
+        return job_id
+
+    def future(self, job_id):
+        """Future that resolves to the job's result bytes (also for jobs queued before a restart)."""
+        with self._cond:
+            if job_id not in self._futures:
+                job = self._get_job(job_id)
+                if job is None:
+                    raise KeyError(job_id)
+                future = Future()
+                # A finished job's future is resolved right away and not kept, since nothing would ever remove it
+                if job['status'] == 'done':
+                    future.set_result(self._read_result(job['result_path']))
+                    return future
+                if job['status'] == 'failed':
+                    future.set_exception(RuntimeError(job['error']))
+                    return future
+                self._futures[job_id] = future
+            return self._futures[job_id]
+
+    def status(self, job_id):
+        """Job description without its spec, or None for an unknown ID."""
+        with self._cond:
+            job = self._get_job(job_id)
+            if job is None:
+                return None
+            info = {key: job[key] for key in ('id', 'client', 'kind', 'priority', 'cost', 'status', 'submitted_at', 'started_at', 'finished_at', 'error')}
+            if job['status'] == 'queued':
+                # Jobs that would be dispatched before this one
+                info['position'] = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority < ? OR (priority = ? AND seq < ?))",
+                    (job['priority'], job['priority'], job['seq'])
+                ).fetchone()[0]
+            return info
+
+    def result(self, job_id):
+        """Result bytes of a finished job, or None if it isn't done."""
+        with self._cond:
+            job = self._get_job(job_id)
+        if job is None or job['status'] != 'done':
+            return None
+        return self._read_result(job['result_path'])
+
+    def stream(self, job_id):
+        """
+        (path, finished) for a streaming video job: the fragmented MP4 is written to path while the job runs
+        and finished() tells when it stopped growing. None for unknown jobs and jobs that don't stream.
+        """
+        with self._cond:
+            job = self._get_job(job_id)
+        if job is None or job['kind'] != 'video' or not json.loads(job['spec']).get('stream'):
+            return None
+        path = os.path.join(self.results_dir, f"{job_id}.{RESULT_EXTENSIONS['video']}")
+        def finished():
+            with self._cond:
+                job = self._get_job(job_id)
+                # A job removed while it was being followed is finished too
+                return job is None or job['status'] in ('done', 'failed')
+        return path, finished
+
+    def remove(self, job_id):
+        """
+        Delete a finished job and its result (e.g. once the caller stored the result elsewhere).
+        Returns False for unknown jobs and jobs that are still queued or running.
+        """
+        with self._cond:
+            job = self._get_job(job_id)
+            if job is None or job['status'] not in ('done', 'failed'):
+                return False
+            self._delete_jobs([job])
+            return True
+
+    def prune(self):
+        """Delete jobs that finished more than retention_seconds ago, with their results. Returns how many."""
+        with self._cond:
+            jobs = self._db.execute(
+                "SELECT * FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (time.time() - self.retention_seconds,)
+            ).fetchall()
+            self._delete_jobs(jobs)
+            return len(jobs)
+
+    def metrics(self):
+        """Queue depth, CPU slots in use and wait times (submit to start) of recent jobs."""
+        now = time.time()
+        with self._cond:
+            depth = {}
+            for row in self._db.execute("SELECT priority, kind, COUNT(*) AS n FROM jobs WHERE status = 'queued' GROUP BY priority, kind"):
+                depth.setdefault(str(row['priority']), {})[row['kind']] = row['n']
+            oldest = self._db.execute("SELECT MIN(submitted_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            waits = [row[0] for row in self._db.execute(
+                'SELECT started_at - submitted_at FROM jobs WHERE started_at IS NOT NULL ORDER BY started_at DESC LIMIT ?',
+                (METRICS_WINDOW,)
+            )]
+            finished = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'done' AND finished_at > ?", (now - 60,)
+            ).fetchone()[0]
+            return {
+                'queued': sum(sum(kinds.values()) for kinds in depth.values()),
+                'queued_by_priority': depth,
+                'running': len(self._running),
+                'cpu_in_use': sum(job['cost'] for job in self._running.values()),
+                'memory_reserved': sum(job['memory'] for job in self._running.values()),
+                'cpu_budget': self.cpu_budget,
+                'oldest_queued_seconds': now - oldest if oldest else 0.0,
+                'wait_seconds': {
+                    'p50': percentile(waits, 0.5),
+                    'p95': percentile(waits, 0.95),
+                    'max': max(waits) if waits else None
+                },
+                'finished_last_minute': finished
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._dispatcher.join()
+        self._orchestrators.shutdown(wait=False)
+        self._db.close()
+
+    # Dispatching
+
+    def _get_job(self, job_id):
+        return self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+    def _delete_jobs(self, jobs):
+        """Delete finished jobs' rows and result files. Caller holds the lock."""
+        with self._db:
+            for job in jobs:
+                # Failed jobs may have left a partial file behind
+                path = job['result_path'] or os.path.join(self.results_dir, f"{job['id']}.{RESULT_EXTENSIONS[job['kind']]}")
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self._db.execute('DELETE FROM jobs WHERE id = ?', (job['id'],))
+
+    def _read_result(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _next_job(self):
+        """First queued job by (priority, submission) whose client is under its limit and that fits the budget."""
+        free = self.cpu_budget - sum(job['cost'] for job in self._running.values())
+        if free <= 0:
+            return None
+        per_client = {}
+        for job in self._running.values():
+            per_client[job['client']] = per_client.get(job['client'], 0) + 1
+        for job in self._db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority, seq"):
+            if per_client.get(job['client'], 0) >= self.per_client_limit:
+                continue
+            if job['cost'] > free:
+                # Hold the slots for this job instead of letting smaller ones behind it starve it
+                return None
+            return job
+        return None
+
+    def _dispatch_loop(self):
+        with self._cond:
+            while not self._stopped:
+                job = self._next_job()
+                if job is None:
+                    self._cond.wait()
+                    continue
+                memory = 0
+                try:
+                    memory = self._job_memory(job)
+                    if memory and not self.admission.try_reserve(memory):
+                        # Held for the head job like CPU slots; renders outside the queue free memory without notifying it
+                        self._cond.wait(MEMORY_POLL_SECONDS)
+                        continue
+                    self._start(job, memory)
+                except Exception as e:
+                    # A job that can't be started (e.g. a malformed spec) fails on its own; the queue behind it keeps going
+                    self._running.setdefault(job['id'], {'client': job['client'], 'cost': job['cost'], 'memory': memory})
+                    self._complete(job['id'], None, e).set_exception(e)
+
+    def _job_memory(self, job):
+        """Estimated peak memory of a job (0 without an admission controller), at most the whole budget so it can always start."""
+        if self.admission is None:
+            return 0
+        spec = json.loads(job['spec'])
+        model = self.admission.model
+        if job['kind'] == 'still':
+            estimate = model.estimate_still(spec['params'], spec.get('render_size'))
+        elif job['kind'] == 'frames':
+            fps = spec.get('fps', 10)
+            estimate = model.estimate_video(spec['params'], spec['end_params'], (spec['end_frame'] - spec['start_frame']) / float(fps), fps)
+        else:
+            # Streamed videos render in one process, others as job['cost'] segments at once
+            processes = 1 if spec.get('stream') else job['cost']
+            estimate = model.estimate_video(spec['params'], spec['end_params'], spec.get('duration_seconds', 30), spec.get('fps', 10), processes)
+        return min(estimate['peak_bytes'], self.admission.memory_budget)
+
+    def _start(self, job, memory=0):
+        """Mark a job running (its memory already reserved) and hand it to the pool. Caller holds the lock."""
+        job_id = job['id']
+        with self._db:
+            self._db.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), job_id))
+        self._running[job_id] = {'client': job['client'], 'cost': job['cost'], 'memory': memory}
+        self._futures.setdefault(job_id, Future())
+        spec = json.loads(job['spec'])
+        result_path = os.path.join(self.results_dir, f"{job_id}.{RESULT_EXTENSIONS[job['kind']]}")
+
+        if job['kind'] == 'still':
+            params = spec['params']
+            future = self.pool.submit(
+                INTERACTIVE, art_gen.gen_art, params['size'], params['amount'], params['line_width'], params['line_width_variation'],
+                params['padding'], params['border_width'], art_state=spec['state'], render_size=spec.get('render_size'), output='png'
+            )
+        elif job['kind'] == 'frames':
+            # The worker writes the segment straight into the results directory
+            future = self.pool.submit(
+                BATCH, video_segments.render_segment, spec['state'], spec['params'], spec['end_params'],
+                spec['start_frame'], spec['end_frame'], spec['total_frames'], result_path,
+                spec.get('fps', 10), spec.get('speed', 20.0), spec.get('zoom', 1.1), spec.get('zoom_speed', 0.0)
+            )
+        elif spec.get('stream'):
+            # One pipeline in order, so the file grows from the start; a rerun after a restart starts it over
+            if os.path.exists(result_path):
+                os.remove(result_path)
+            future = self.pool.submit(BATCH, video_stream.render_stream, spec, result_path)
+        else:
+            future = self._orchestrators.submit(
+                video_segments.generate_video_segmented, spec['state'], spec['params'], spec['end_params'],
+                duration_seconds=spec.get('duration_seconds', 30), fps=spec.get('fps', 10),
+                speed=spec.get('speed', 20.0), zoom=spec.get('zoom', 1.1), zoom_speed=spec.get('zoom_speed', 0.0),
+                segments=job['cost'], executor=self.pool.executor(BATCH), output='mp4', frames_dir=spec.get('frames_dir')
+            )
+        future.add_done_callback(lambda done: self._finish(job_id, result_path, done))
+
+    def _finish(self, job_id, result_path, done):
+        error = done.exception()
+        data = None
+        if error is None:
+            try:
+                result = done.result()
+                if isinstance(result, bytes):
+                    with open(result_path, 'wb') as f:
+                        f.write(result)
+                    data = result
+                else:
+                    data = self._read_result(result_path)
+            except OSError as e:
+                error = e
+        with self._cond:
+            future = self._complete(job_id, result_path, error)
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(data)
+
+    def _complete(self, job_id, result_path, error):
+        """Record a job as done or failed and free its CPU slots and memory. Caller holds the lock; returns the future to resolve."""
+        with self._db:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, result_path = ?, error = ? WHERE id = ?',
+                ('failed' if error else 'done', time.time(), None if error else result_path, str(error) if error else None, job_id)
+            )
+        running = self._running.pop(job_id, None)
+        if running and running['memory']:
+            self.admission.release(running['memory'])
+        # Waiters already hold the future; later lookups recreate it from the database
+        future = self._futures.pop(job_id, None) or Future()
+        self.prune()
+        self._cond.notify_all()
+        return future
@@ -0,0 +1,535 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import argparse
+import json
+import math
+import os
+import signal
+import threading
+import uuid
+from admission import AdmissionController, AdmissionError, CostModel, MAX_REQUEST_SECONDS, MAX_VIDEO_SECONDS as MAX_VIDEO_CPU_SECONDS
+import art_gen
+import video_stream
+from render_pool import RenderPool, INTERACTIVE, BATCH
+from scheduler import JobScheduler, JOB_RETENTION_SECONDS, PER_CLIENT_LIMIT, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, VIDEO_SEGMENTS
+
+# Defaults for request limits
+MAX_BODY_BYTES = 1024 * 1024
+MAX_CANVAS_SIZE = 4096
+MAX_VIDEO_SECONDS = 120
+MAX_FPS = 60
+MAX_BATCH_FRAMES = 256
+MAX_AMOUNT = 10000
+# Line and border widths (a stroke this wide already covers the largest canvas)
+MAX_LINE_WIDTH = MAX_CANVAS_SIZE
+
+# Named job priorities accepted in request bodies
+PRIORITIES = {'high': PRIORITY_HIGH, 'normal': PRIORITY_NORMAL, 'low': PRIORITY_LOW}
+
+class RequestError(Exception):
+    """Raised by handlers to send an HTTP error status with a message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class StateStore:
+    """Thread-safe in-memory store of art states and their generation params, addressed by ID."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def put(self, state, params, state_id=None):
+        state_id = state_id or uuid.uuid4().hex
+        with self._lock:
+            self._states[state_id] = {'state': state, 'params': params}
+        return state_id
+
+    def get(self, state_id):
+        with self._lock:
+            stored = self._states.get(state_id)
+        if stored is None:
+            raise RequestError(404, 'Art state not found')
+        return stored
+
+def parse_number(value, name, kind=float, minimum=None, maximum=None):
+    """
+    A number from a request body, or a 400 for anything that isn't one (including NaN and infinity)
+    or lies outside [minimum, maximum].
+    """
+    if isinstance(value, bool):
+        raise RequestError(400, f'{name} must be a number')
+    try:
+        value = kind(value)
+    except (TypeError, ValueError, OverflowError):
+        raise RequestError(400, f'{name} must be a number')
+    if kind is float and not math.isfinite(value):
+        raise RequestError(400, f'{name} must be a finite number')
+    if minimum is not None and value < minimum:
+        raise RequestError(400, f'{name} must be at least {minimum}')
+    if maximum is not None and value > maximum:
+        raise RequestError(400, f'{name} must be at most {maximum}')
+    return value
+
+def parse_shape(source, defaults, name=''):
+    """amount, line widths and border width of a request body, each checked against its bounds."""
+    def field(key, kind=int, minimum=0, maximum=MAX_LINE_WIDTH):
+        return parse_number(source.get(key, defaults[key]), name + key, kind, minimum, maximum)
+    return {
+        'amount': field('amount', minimum=1, maximum=MAX_AMOUNT),
+        'line_width': field('line_width', minimum=1),
+        'line_width_variation': field('line_width_variation', float),
+        'border_width': field('border_width')
+    }
+
+def parse_params(body, max_canvas_size):
+    """Validate generation params from a request body."""
+    if not isinstance(body, dict):
+        raise RequestError(400, 'params must be an object')
+    size = parse_number(body.get('size', 512), 'size', int, 16, max_canvas_size)
+    padding = parse_number(body.get('padding', 0), 'padding', int, 0)
+    # Points are drawn between padding and size - padding, so that range must not be empty
+    if padding >= size / 2:
+        raise RequestError(400, 'padding must be less than half of size')
+    shape = parse_shape(body, {'amount': 100, 'line_width': 1, 'line_width_variation': 3, 'border_width': 0})
+    return {
+        'size': size,
+        'amount': shape['amount'],
+        'line_width': shape['line_width'],
+        'line_width_variation': shape['line_width_variation'],
+        'padding': padding,
+        'border_width': shape['border_width']
+    }
+
+def parse_end_params(body, start_params):
+    """Build end params for animations; size and padding stay constant like in the UI."""
+    end = body.get('end', {})
+    if not isinstance(end, dict):
+        raise RequestError(400, 'end must be an object')
+    return dict(start_params, **parse_shape(end, start_params, 'end.'))
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def is_point(value, size):
+    return isinstance(value, list) and len(value) == 2 and all(is_number(v) and 0 <= v <= size for v in value)
+
+def parse_state(state, params):
+    """
+    Check a client-supplied art state against its params (the keys gen_art reads, their types and one
+    entry per line), so a malformed state is a 400 when stored instead of a 500 on its first render.
+    """
+    if not isinstance(state, dict):
+        raise RequestError(400, 'state must be an object')
+    for key in ('start_clr', 'end_clr', 'image_bg_clr', 'border_clr'):
+        value = state.get(key)
+        if not (isinstance(value, list) and len(value) == 3 and all(
+                isinstance(v, int) and not isinstance(v, bool) and 0 <= v <= 255 for v in value)):
+            raise RequestError(400, f'state.{key} must be a list of 3 integers from 0 to 255')
+    size = params['size']
+    if not is_point(state.get('initial_point'), size):
+        raise RequestError(400, f'state.initial_point must be a point (2 numbers from 0 to {size})')
+
+    def check_lines(key, valid, description, required=True):
+        if key not in state and not required:
+            return
+        value = state.get(key)
+        if not (isinstance(value, list) and len(value) == params['amount'] and all(valid(v) for v in value)):
+            raise RequestError(400, f"state.{key} must be a list with one {description} per line ({params['amount']} entries)")
+
+    check_lines('line_end_points', lambda v: is_point(v, size), f'point (2 numbers from 0 to {size})')
+    check_lines('line_width_variations', lambda v: isinstance(v, int) and not isinstance(v, bool) and v >= 0,
+                'non-negative integer')
+    # Older states have a single control point per line, newer ones two
+    check_lines('curve_control_points', lambda v: is_point(v, size) or (isinstance(v, list) and len(v) == 2 and all(is_point(p, size) for p in v)),
+                'control point or pair of control points', required=False)
+    check_lines('line_start_points', lambda v: v is None or (isinstance(v, int) and not isinstance(v, bool) and v >= 0),
+                'line index or null', required=False)
+    return state
+
+def parse_motion(body):
+    """Animation settings of frame and video requests."""
+    return {
+        'speed': parse_number(body.get('speed', 20.0), 'speed'),
+        'zoom': parse_number(body.get('zoom', 1.1), 'zoom'),
+        'zoom_speed': parse_number(body.get('zoom_speed', 0.0), 'zoom_speed'),
+        'gyro_x': parse_number(body.get('gyro_x', 0.0), 'gyro_x'),
+        'gyro_y': parse_number(body.get('gyro_y', 0.0), 'gyro_y')
+    }
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ArtGenRender/1.0'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_json(self, status, payload, headers=None):
+        self.send_body(status, json.dumps(payload).encode('utf-8'), 'application/json', headers)
+
+    def read_json(self):
+        length = self.headers.get('Content-Length')
+        if length is None:
+            if self.headers.get('Transfer-Encoding'):
+                # Chunked bodies have no upfront size to check against the limit
+                self.close_connection = True
+                raise RequestError(411, 'Content-Length required')
+            return {}
+        try:
+            length = int(length)
+        except ValueError:
+            self.close_connection = True
+            raise RequestError(400, 'Invalid Content-Length')
+        if length > self.server.max_body_bytes:
+            # The body is not read, so this connection can't be reused
+            self.close_connection = True
+            raise RequestError(413, f'Request body larger than {self.server.max_body_bytes} bytes')
+        if length == 0:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise RequestError(400, 'Body must be JSON')
+        if not isinstance(body, dict):
+            raise RequestError(400, 'Body must be a JSON object')
+        return body
+
+    def dispatch(self, method):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        query = parse_qs(url.query)
+        try:
+            route = self.route(method, parts)
+            if route is None:
+                raise RequestError(404, 'Not found')
+            route(parts, query)
+        except RequestError as e:
+            self.send_json(e.status, {'error': e.message})
+        except AdmissionError as e:
+            # Over the limits is final; a request that timed out waiting for memory can be retried
+            if e.decision.get('timed_out'):
+                self.send_json(503, {'error': str(e), 'cost': e.decision}, {'Retry-After': '5'})
+            else:
+                self.send_json(413, {'error': str(e), 'cost': e.decision})
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+
+    def admit(self, decision):
+        """Pass an admission decision through, or turn a rejection into an error response."""
+        if decision['action'] == 'reject':
+            raise AdmissionError(decision)
+        return decision
+
+    def route(self, method, parts):
+        if parts == ['states'] and method == 'POST':
+            return self.create_state
+        if len(parts) == 2 and parts[0] == 'states':
+            return {'GET': self.get_state, 'PUT': self.put_state}.get(method)
+        if len(parts) == 3 and parts[0] == 'states':
+            return {
+                ('GET', 'still.png'): self.render_still,
+                ('GET', 'still.svg'): self.render_svg,
+                ('POST', 'frame'): self.render_frame,
+                ('POST', 'frames'): self.render_frames,
+                ('POST', 'videos'): self.start_video
+            }.get((method, parts[2]))
+        if parts == ['health'] and method == 'GET':
+            return self.health
+        if parts == ['metrics'] and method == 'GET':
+            return self.metrics
+        if len(parts) == 2 and parts[0] == 'jobs' and method == 'GET':
+            return self.job_status
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'video.mp4' and method == 'GET':
+            return self.job_video
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'stream.mp4' and method == 'GET':
+            return self.job_stream
+        return None
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def health(self, parts, query):
+        self.send_json(200, {'status': 'ok'})
+
+    def metrics(self, parts, query):
+        self.send_json(200, dict(self.server.scheduler.metrics(), admission=self.server.admission.metrics()))
+
+    def client_id(self):
+        # Clients identify themselves for the per-client job limit; fall back to their address
+        return self.headers.get('X-Client-Id') or self.client_address[0]
+
+    def create_state(self, parts, query):
+        body = self.read_json()
+        params = parse_params(body, self.server.max_canvas_size)
+        seed = body.get('seed')
+        if not (seed is None or isinstance(seed, (int, str))) or isinstance(seed, bool):
+            raise RequestError(400, 'seed must be an integer or a string')
+        decision = self.admit(self.server.admission.check_still(params))
+        with self.server.admission.reserve(decision):
+            image, state = self.server.pool.run(
+                INTERACTIVE, art_gen.gen_art,
+                params['size'], params['amount'], params['line_width'], params['line_width_variation'],
+                params['padding'], params['border_width'], seed=seed,
+                render_size=decision['estimate']['render_size'], output='png'
+            )
+        state_id = self.server.states.put(state, params)
+        self.send_body(201, image, 'image/png', {'X-State-Id': state_id, 'Location': f'/states/{state_id}', 'X-Cost-Estimate': json.dumps(decision)})
+
+    def put_state(self, parts, query):
+        body = self.read_json()
+        if 'state' not in body:
+            raise RequestError(400, 'Body must contain "state" and "params"')
+        params = parse_params(body.get('params', {}), self.server.max_canvas_size)
+        state = parse_state(body['state'], params)
+        state_id = self.server.states.put(state, params, state_id=parts[1])
+        self.send_json(200, {'state_id': state_id})
+
+    def get_state(self, parts, query):
+        stored = self.server.states.get(parts[1])
+        self.send_json(200, {'state_id': parts[1], 'state': stored['state'], 'params': stored['params']})
+
+    def render_still(self, parts, query):
+        stored = self.server.states.get(parts[1])
+        params = stored['params']
+        render_size = None
+        if 'render_size' in query:
+            try:
+                render_size = int(query['render_size'][0])
+            except ValueError:
+                raise RequestError(400, 'render_size must be an integer')
+            if not 16 <= render_size <= self.server.max_canvas_size:
+                raise RequestError(400, f'render_size must be between 16 and {self.server.max_canvas_size}')
+        decision = self.admit(self.server.admission.check_still(params, render_size))
+        with self.server.admission.reserve(decision):
+            image = self.server.pool.run(
+                INTERACTIVE, art_gen.gen_art,
+                params['size'], params['amount'], params['line_width'], params['line_width_variation'],
+                params['padding'], params['border_width'], art_state=stored['state'],
+                render_size=decision['estimate']['render_size'], output='png'
+            )
+        self.send_body(200, image, 'image/png', {'X-Cost-Estimate': json.dumps(decision)})
+
+    def render_svg(self, parts, query):
+        stored = self.server.states.get(parts[1])
+        params = stored['params']
+        # Vector output needs no rasterizing, so it is built on the request thread
+        svg = art_gen.gen_art(
+            params['size'], params['amount'], params['line_width'], params['line_width_variation'],
+            params['padding'], params['border_width'], art_state=stored['state'], output='svg'
+        )
+        self.send_body(200, svg.encode('utf-8'), 'image/svg+xml')
+
+    def render_frame(self, parts, query):
+        stored = self.server.states.get(parts[1])
+        body = self.read_json()
+        start_params = stored['params']
+        end_params = parse_end_params(body, start_params)
+        time_factor = parse_number(body.get('time_factor', 0.0), 'time_factor')
+        motion = parse_motion(body)
+        decision = self.admit(self.server.admission.check_still(start_params, end_params=end_params))
+        with self.server.admission.reserve(decision):
+            image = self.server.pool.run(
+                INTERACTIVE, art_gen.generate_frame_at_time,
+                stored['state'], start_params, end_params, time_factor,
+                render_size=decision['estimate']['render_size'], output='png', **motion
+            )
+        self.send_body(200, image, 'image/png', {'X-Cost-Estimate': json.dumps(decision)})
+
+    def render_frames(self, parts, query):
+        stored = self.server.states.get(parts[1])
+        body = self.read_json()
+        start_params = stored['params']
+        end_params = parse_end_params(body, start_params)
+        time_factors = body.get('time_factors')
+        if not isinstance(time_factors, list) or not 1 <= len(time_factors) <= MAX_BATCH_FRAMES:
+            raise RequestError(400, f'time_factors must be a list of 1 to {MAX_BATCH_FRAMES} numbers')
+        time_factors = [parse_number(t, 'time_factors') for t in time_factors]
+        render_size = parse_number(body['render_size'], 'render_size', int) if body.get('render_size') else start_params['size']
+        if not 16 <= render_size <= self.server.max_canvas_size:
+            raise RequestError(400, f'render_size must be between 16 and {self.server.max_canvas_size}')
+        columns = parse_number(body['columns'], 'columns', int) if body.get('columns') is not None else None
+        if columns is not None and columns < 1:
+            raise RequestError(400, 'columns must be at least 1')
+        motion = parse_motion(body)
+        decision = self.admit(self.server.admission.check_still(start_params, render_size, len(time_factors), end_params))
+        # All frames come back in one PNG sheet; X-Frame-Boxes has each frame's [x, y, width, height]
+        with self.server.admission.reserve(decision):
+            sheet, boxes = art_gen.generate_frames(
+                stored['state'], start_params, end_params, time_factors,
+                render_size=decision['estimate']['render_size'], output='png', packed=True, columns=columns,
+                executor=self.server.pool.executor(INTERACTIVE), **motion
+            )
+        self.send_body(200, sheet, 'image/png', {'X-Frame-Boxes': json.dumps(boxes), 'X-Cost-Estimate': json.dumps(decision)})
+
+    def start_video(self, parts, query):
+        stored = self.server.states.get(parts[1])
+        body = self.read_json()
+        start_params = stored['params']
+        end_params = parse_end_params(body, start_params)
+        duration = parse_number(body.get('duration_seconds', 30), 'duration_seconds', int)
+        if not 1 <= duration <= MAX_VIDEO_SECONDS:
+            raise RequestError(400, f'duration_seconds must be between 1 and {MAX_VIDEO_SECONDS}')
+        fps = parse_number(body.get('fps', 10), 'fps', int)
+        if not 1 <= fps <= MAX_FPS:
+            raise RequestError(400, f'fps must be between 1 and {MAX_FPS}')
+        priority = body.get('priority', 'normal')
+        if priority not in PRIORITIES:
+            raise RequestError(400, f"priority must be one of {', '.join(PRIORITIES)}")
+        stream = bool(body.get('stream', False))
+        motion = parse_motion(body)
+        spec = {
+            'state': stored['state'],
+            'params': start_params,
+            'end_params': end_params,
+            'fps': fps,
+            'speed': motion['speed'],
+            'zoom': motion['zoom'],
+            'zoom_speed': motion['zoom_speed']
+        }
+        if 'start_frame' in body or 'end_frame' in body:
+            # A frame range of the full clip, encoded as one mp4 segment
+            total_frames = duration * fps
+            start_frame = parse_number(body.get('start_frame', 0), 'start_frame', int)
+            end_frame = parse_number(body.get('end_frame', total_frames), 'end_frame', int)
+            if not 0 <= start_frame < end_frame <= total_frames:
+                raise RequestError(400, f'frame range must lie within 0..{total_frames}')
+            decision = self.admit(self.server.admission.check_video(start_params, end_params, (end_frame - start_frame) / float(fps), fps))
+            job_id = self.server.scheduler.submit(
+                'frames', dict(spec, start_frame=start_frame, end_frame=end_frame, total_frames=total_frames),
+                client=self.client_id(), priority=PRIORITIES[priority]
+            )
+        else:
+            # A streamed video renders in one process, in order, so it can be played while it renders
+            processes = 1 if stream else min(VIDEO_SEGMENTS, self.server.pool.workers(BATCH))
+            decision = self.admit(self.server.admission.check_video(start_params, end_params, duration, fps, processes))
+            job_id = self.server.scheduler.submit(
+                'video', dict(spec, duration_seconds=duration, stream=stream), client=self.client_id(), priority=PRIORITIES[priority]
+            )
+        # Admitted videos wait in the job queue, which starts them once their CPU slots and memory are free
+        response = {'job_id': job_id, 'cost': decision}
+        if stream and 'start_frame' not in body and 'end_frame' not in body:
+            response['stream_url'] = f'/jobs/{job_id}/stream.mp4'
+        self.send_json(202, response, {'Location': f'/jobs/{job_id}'})
+
+    def job_status(self, parts, query):
+        status = self.server.scheduler.status(parts[1])
+        if status is None:
+            raise RequestError(404, 'Job not found')
+        self.send_json(200, status)
+
+    def job_video(self, parts, query):
+        status = self.server.scheduler.status(parts[1])
+        if status is None:
+            raise RequestError(404, 'Job not found')
+        if status['status'] == 'failed':
+            raise RequestError(500, f"Job failed: {status['error']}")
+        if status['status'] != 'done':
+            raise RequestError(409, 'Video is still rendering')
+        self.send_body(200, self.server.scheduler.result(parts[1]), 'video/mp4')
+
+    def job_stream(self, parts, query):
+        source = self.server.scheduler.stream(parts[1])
+        if source is None:
+            raise RequestError(404, 'No streaming video for this job')
+        path, finished = source
+        # Fragments are sent as they are written, so the length isn't known up front
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        chunks = video_stream.follow(path, finished)
+        try:
+            for chunk in chunks:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            status = self.server.scheduler.status(parts[1])
+            failed = status is not None and status['status'] == 'failed'
+        except Exception:
+            # Client gone or the file vanished
+            failed = True
+        finally:
+            chunks.close()
+        if failed:
+            # The status line is already sent, so no error response can follow: the connection is dropped
+            # without the last chunk and the client sees an incomplete transfer instead of a complete video
+            self.close_connection = True
+            return
+        self.wfile.write(b'0\r\n\r\n')
+
+class RenderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, pool, scheduler, max_body_bytes=MAX_BODY_BYTES, max_canvas_size=MAX_CANVAS_SIZE, quiet=False, admission=None):
+        super().__init__(address, RenderRequestHandler)
+        self.pool = pool
+        self.scheduler = scheduler
+        self.admission = admission or AdmissionController()
+        self.states = StateStore()
+        self.max_body_bytes = max_body_bytes
+        self.max_canvas_size = max_canvas_size
+        self.quiet = quiet
+
+def _handle_sigterm(signum, frame):
+    # Process supervisors stop services with SIGTERM - shut down like on Ctrl+C
+    raise KeyboardInterrupt
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless art_gen render service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--interactive-workers', type=int, default=None, help='processes for stills and frames')
+    parser.add_argument('--batch-workers', type=int, default=None, help='processes for video jobs')
+    parser.add_argument('--max-body-bytes', type=int, default=MAX_BODY_BYTES)
+    parser.add_argument('--max-canvas-size', type=int, default=MAX_CANVAS_SIZE)
+    parser.add_argument('--quiet', action='store_true', help='disable per-request logging')
+    parser.add_argument('--data-dir', default='gallery', help='where the job queue and job results are kept')
+    parser.add_argument('--cpu-budget', type=int, default=None, help='CPU slots shared by running jobs (default: batch workers)')
+    parser.add_argument('--per-client-limit', type=int, default=PER_CLIENT_LIMIT, help='running jobs allowed per client')
+    parser.add_argument('--job-retention-hours', type=float, default=JOB_RETENTION_SECONDS / 3600, help='how long finished jobs and their results are kept')
+    parser.add_argument('--memory-budget-mb', type=int, default=None, help='memory all admitted renders may hold at once (default: half the RAM)')
+    parser.add_argument('--max-request-seconds', type=float, default=MAX_REQUEST_SECONDS, help='estimated CPU seconds allowed for one still or frame batch')
+    parser.add_argument('--max-video-seconds', type=float, default=MAX_VIDEO_CPU_SECONDS, help='estimated CPU seconds allowed for one video')
+    args = parser.parse_args()
+
+    pool = RenderPool(interactive_workers=args.interactive_workers, batch_workers=args.batch_workers)
+    admission = AdmissionController(
+        CostModel.load(os.path.join(args.data_dir, 'cost_model.json')),
+        memory_budget=args.memory_budget_mb * 1024 ** 2 if args.memory_budget_mb else None,
+        max_request_seconds=args.max_request_seconds, max_video_seconds=args.max_video_seconds
+    )
+    scheduler = JobScheduler(pool, args.data_dir, args.cpu_budget or pool.workers(BATCH), args.per_client_limit, args.job_retention_hours * 3600, admission)
+    server = RenderServer((args.host, args.port), pool, scheduler, args.max_body_bytes, args.max_canvas_size, args.quiet, admission)
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    print(f'Render service listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        scheduler.shutdown()
+        pool.shutdown(wait=False)
+
+if __name__ == '__main__':
+    main()
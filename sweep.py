@@ -0,0 +1,131 @@
+from PIL import Image, ImageDraw
+import os
+import art_gen
+
+# Parameters a sweep can vary: generation params of the still, and animation settings of a frame
+STILL_PARAMS = ('amount', 'line_width', 'line_width_variation', 'border_width')
+FRAME_SETTINGS = ('time_factor', 'speed', 'zoom', 'zoom_speed', 'gyro_x', 'gyro_y')
+
+# Contact sheet layout
+CELL_GAP = 4
+LABEL_HEIGHT = 14
+SHEET_BG = (24, 24, 24)
+LABEL_CLR = (220, 220, 220)
+
+def sweep_state(art_state, params, cell_params):
+    """
+    Adapt a state to swept generation params. The state stores per-line width variations drawn for the
+    original line_width_variation, so those are rescaled to the swept range instead of redrawn.
+    """
+    original_variation = float(params['line_width_variation'])
+    variation = float(cell_params['line_width_variation'])
+    if variation == original_variation or original_variation <= 0:
+        return art_state
+    state = dict(art_state)
+    state['line_width_variations'] = [int(round(v * variation / original_variation)) for v in art_state['line_width_variations']]
+    return state
+
+def render_cell(art_state, params, overrides, settings, end_params, animation, cell_size, frame):
+    """Render one sweep cell as a PIL image at cell_size."""
+    cell_params = dict(params)
+    cell_settings = dict(settings)
+    for name, value in overrides.items():
+        if name in FRAME_SETTINGS:
+            cell_settings[name] = float(value)
+        else:
+            cell_params[name] = value
+    # The state only holds so many lines
+    cell_params['amount'] = max(1, min(int(cell_params['amount']), len(art_state['line_end_points'])))
+    state = sweep_state(art_state, params, cell_params)
+
+    if frame:
+        time_factor = cell_settings.pop('time_factor', 0.0)
+        return art_gen.generate_frame_at_time(
+            state, cell_params, end_params or cell_params, time_factor,
+            render_size=cell_size, animation=animation, output='image', **cell_settings
+        )
+    return art_gen.gen_art(
+        cell_params['size'], cell_params['amount'], cell_params['line_width'], cell_params['line_width_variation'],
+        cell_params['padding'], cell_params['border_width'], art_state=state, render_size=cell_size, output='image'
+    )
+
+def render_cells(job):
+    """Render a batch of cells in one worker. Returns [(index, raw RGB bytes)] so results pickle cheaply."""
+    art_state, params, settings, end_params, animation, cell_size, frame, cells = job
+    return [
+        (index, render_cell(art_state, params, overrides, settings, end_params, animation, cell_size, frame).tobytes())
+        for index, overrides in cells
+    ]
+
+def format_value(value):
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+def render_sweep(art_state, params, axes, settings=None, end_params=None, cell_size=256, workers=None, executor=None, output='data_url'):
+    """
+    Render a grid of variations of one state and composite them into a contact sheet.
+
+    Args:
+        art_state: The deterministic art state (colors, points, etc.)
+        params: The parameters the state was generated with
+        axes: One or two (name, values) pairs; the first runs along columns, the second along rows
+        settings: Animation settings shared by every cell (speed, zoom, ...). Cells are animation frames
+            when settings are given or an axis is one of FRAME_SETTINGS, otherwise stills
+        end_params: End params for frame cells (default: each cell's own params, i.e. no interpolation)
+        cell_size: Edge of each cell in pixels
+        workers: Worker processes (None = all cores, 1 = in-process)
+        executor: Existing executor to render cells on instead of starting a new pool
+        output: 'data_url', 'png' or 'image' for the sheet
+
+    Returns:
+        (sheet, cells) where cells lists every cell's row, column, swept values and box in the sheet
+    """
+    if not 1 <= len(axes) <= 2:
+        raise ValueError("A sweep takes one or two axes")
+    for name, values in axes:
+        if name not in STILL_PARAMS and name not in FRAME_SETTINGS:
+            raise ValueError(f"Unknown sweep parameter: {name}")
+        if not values:
+            raise ValueError(f"No values to sweep for {name}")
+
+    settings = dict(settings or {})
+    frame = bool(settings) or any(name in FRAME_SETTINGS for name, _ in axes)
+    cell_size = int(cell_size)
+    column_name, column_values = axes[0]
+    row_name, row_values = axes[1] if len(axes) == 2 else (None, [None])
+
+    cells = []
+    for row, row_value in enumerate(row_values):
+        for column, column_value in enumerate(column_values):
+            overrides = {column_name: column_value}
+            if row_name is not None:
+                overrides[row_name] = row_value
+            cells.append({'row': row, 'column': column, 'params': overrides})
+
+    # State preparation that every cell shares is done once, here
+    animation = art_gen.prepare_animation(art_state, params) if frame else None
+
+    with art_gen.process_pool(executor, workers, len(cells)) as pool:
+        # One batch per worker so the shared data is sent to each process once, not once per cell
+        batch_count = min(len(cells), workers or os.cpu_count() or 1) if pool else 1
+        batches = [[] for _ in range(batch_count)]
+        for index, cell in enumerate(cells):
+            batches[index % batch_count].append((index, cell['params']))
+        jobs = [(art_state, params, settings, end_params, animation, cell_size, frame, batch) for batch in batches]
+        results = list(pool.map(render_cells, jobs)) if pool else [render_cells(job) for job in jobs]
+
+    # Composite: cells in a grid, each with a label strip underneath
+    pitch_x = cell_size + CELL_GAP
+    pitch_y = cell_size + LABEL_HEIGHT + CELL_GAP
+    sheet = Image.new('RGB', (CELL_GAP + pitch_x * len(column_values), CELL_GAP + pitch_y * len(row_values)), SHEET_BG)
+    draw = ImageDraw.Draw(sheet)
+    for batch in results:
+        for index, raw in batch:
+            cell = cells[index]
+            x = CELL_GAP + cell['column'] * pitch_x
+            y = CELL_GAP + cell['row'] * pitch_y
+            sheet.paste(Image.frombytes('RGB', (cell_size, cell_size), raw), (x, y))
+            label = '  '.join(f"{name}={format_value(value)}" for name, value in cell['params'].items())
+            draw.text((x + 2, y + cell_size + 1), label, fill=LABEL_CLR)
+            cell['box'] = [x, y, cell_size, cell_size]
+
+    return art_gen.encode_output(sheet, output), cells
@@ -0,0 +1,72 @@
+import pytest
+import art_gen
+from admission import AdmissionController, CostModel
+from render_pool import RenderPool
+from scheduler import JobScheduler
+
+# Coefficients for the threshold tests: one microsecond of CPU per pixel and nothing else
+PIXELS_ONLY = {'base': 0.0, 'pixels': 1e-6, 'segments': 0.0, 'stroke_pixels': 0.0, 'video_pixels': 0.0}
+
+def params_for(size, amount, line_width):
+    return {'size': size, 'amount': amount, 'line_width': line_width, 'line_width_variation': 3.0, 'padding': 10, 'border_width': 3}
+
+@pytest.mark.parametrize('bigger', [params_for(1024, 100, 3), params_for(512, 400, 3), params_for(512, 100, 12)])
+def test_estimates_grow_with_size_amount_and_line_width(bigger):
+    model = CostModel()
+    base = model.estimate_still(params_for(512, 100, 3))
+    estimate = model.estimate_still(bigger)
+    assert estimate['cpu_seconds'] > base['cpu_seconds']
+    assert estimate['peak_bytes'] >= base['peak_bytes']
+    assert model.estimate_video(bigger)['cpu_seconds'] > model.estimate_video(params_for(512, 100, 3))['cpu_seconds']
+
+def test_still_decisions_at_the_limits():
+    model = CostModel(PIXELS_ONLY)
+    admission = AdmissionController(model, memory_budget=1 << 40, max_request_seconds=1.0)
+    # 1000 x 1000 pixels is exactly the limit; one pixel more per side is halved
+    assert admission.check_still(params_for(1000, 100, 3))['action'] == 'admit'
+    decision = admission.check_still(params_for(1001, 100, 3))
+    assert decision['action'] == 'downscale'
+    assert (decision['requested_size'], decision['estimate']['render_size']) == (1001, 500)
+    # Nothing down to min_render_size fits
+    assert AdmissionController(model, memory_budget=1 << 40, max_request_seconds=0.001).check_still(params_for(1000, 100, 3))['action'] == 'reject'
+
+def test_memory_decisions():
+    model = CostModel(PIXELS_ONLY)
+    peak = model.estimate_still(params_for(256, 100, 3))['peak_bytes']
+    admission = AdmissionController(model, memory_budget=peak, max_request_seconds=1.0)
+    assert admission.check_still(params_for(256, 100, 3))['action'] == 'admit'
+    # Over the budget on its own: downscaled like a request over the CPU limit
+    assert admission.check_still(params_for(257, 100, 3))['action'] == 'downscale'
+    # Fits, but the budget is held by another render
+    assert admission.try_reserve(1)
+    assert admission.check_still(params_for(256, 100, 3))['action'] == 'queue'
+    admission.release(1)
+    assert admission.check_still(params_for(256, 100, 3))['action'] == 'admit'
+
+def test_video_decisions_at_the_limit():
+    model = CostModel(PIXELS_ONLY)
+    params = params_for(512, 100, 3)
+    seconds = model.estimate_video(params, duration_seconds=10, fps=10)['cpu_seconds']
+    admission = AdmissionController(model, memory_budget=1 << 40, max_video_seconds=seconds)
+    assert admission.check_video(params, duration_seconds=10, fps=10)['action'] == 'admit'
+    assert admission.check_video(params, duration_seconds=11, fps=10)['action'] == 'reject'
+
+def test_video_jobs_reserve_memory(tmp_path):
+    params = params_for(128, 20, 1)
+    _, state = art_gen.gen_art(128, 20, 1, 3.0, 10, 3, seed=3)
+    spec = dict(state=state, params=params, end_params=params, duration_seconds=1, fps=5)
+    model = CostModel()
+    # Room for one video at a time, though the CPU budget would run both
+    admission = AdmissionController(model, memory_budget=model.estimate_video(params, params, 1, 5, 1)['peak_bytes'])
+    pool = RenderPool(interactive_workers=1, batch_workers=2)
+    scheduler = JobScheduler(pool, str(tmp_path), cpu_budget=2, admission=admission)
+    try:
+        first = scheduler.submit('video', spec, cost=1)
+        second = scheduler.submit('video', spec, client='other', cost=1)
+        for job_id in (first, second):
+            scheduler.future(job_id).result(timeout=120)
+        assert scheduler.status(second)['started_at'] >= scheduler.status(first)['finished_at']
+        assert admission.reserved == 0
+    finally:
+        scheduler.shutdown()
+        pool.shutdown()
@@ -0,0 +1,76 @@
+import numpy as np
+from PIL import Image
+import art_gen
+import frame_delta
+
+PARAMS = {'size': 256, 'amount': 120, 'line_width': 3, 'line_width_variation': 3.0, 'padding': 10, 'border_width': 3}
+END_PARAMS = dict(PARAMS, amount=100)
+
+# The UI's preview advances time_factor by 0.01 per second at about 15 frames per second
+FRAME_STEP = 0.01 / 15
+
+def preview_frames(speed, count, zoom_speed=1.0):
+    """
+    Consecutive real-time preview frames of one piece, drawn into one canvas as the preview worker does.
+    Each frame is a copy, since the canvas is drawn over for the next one.
+    """
+    _, state = art_gen.gen_art(PARAMS['size'], PARAMS['amount'], PARAMS['line_width'], PARAMS['line_width_variation'],
+                               PARAMS['padding'], PARAMS['border_width'], seed=7)
+    animation = art_gen.prepare_animation(state, PARAMS)
+    canvas = None
+    for i in range(count):
+        canvas = art_gen.generate_frame_at_time(
+            state, PARAMS, END_PARAMS, 0.3 + i * FRAME_STEP, speed=speed, zoom=1.5, zoom_speed=zoom_speed,
+            output='image', animation=animation, canvas=canvas
+        )
+        yield canvas.copy()
+
+def stream(frames):
+    encoder = frame_delta.DeltaEncoder()
+    client = None
+    for image in frames:
+        delta = encoder.encode(image, None if client is None else encoder.seq)
+        client = frame_delta.apply_delta(client, delta)
+        assert np.array_equal(client, np.asarray(image)), 'client frame drifted from the rendered one'
+        yield delta
+
+def test_slow_animation_is_sent_as_deltas():
+    deltas = list(stream(preview_frames(1.0, 30)))
+    keyframes = [delta for delta in deltas if delta['keyframe']]
+    sent = sum(len(png) for delta in deltas for _, _, png in delta['patches'])
+    keyframe_bytes = len(deltas[0]['patches'][0][2])
+    assert len(keyframes) <= 5
+    assert sent < len(deltas) * keyframe_bytes / 2
+
+def test_color_drift_is_absorbed():
+    # Fast animations shift the background and border colors almost every frame, which changes nearly every pixel
+    frames = [np.asarray(image) for image in preview_frames(20.0, 30)]
+    deltas = list(stream(Image.fromarray(frame) for frame in frames))
+    shifted = [i for i, delta in enumerate(deltas) if delta['remap'] and not delta['keyframe']]
+    raw_changed = [(frames[i - 1] != frames[i]).any(axis=-1).mean() for i in shifted]
+    assert max(raw_changed) > 0.5
+    assert all(deltas[i]['changed_fraction'] < changed for i, changed in zip(shifted, raw_changed))
+
+def test_fast_animation_stays_exact():
+    for delta in stream(preview_frames(20.0, 10)):
+        assert delta['keyframe'] or delta['changed_fraction'] <= frame_delta.MAX_DELTA_FRACTION
+
+def test_unchanged_frame_is_empty_while_backing_off():
+    frames = list(preview_frames(1.0, 2))
+    assert not np.array_equal(np.asarray(frames[0]), np.asarray(frames[1]))
+    encoder = frame_delta.DeltaEncoder()
+    encoder.encode(frames[0])
+    encoder.backoff = frame_delta.DELTA_BACKOFF
+    delta = encoder.encode(frames[0].copy(), encoder.seq)
+    assert not delta['keyframe'] and delta['patches'] == []
+    # A frame that did change is sent whole while backing off
+    assert encoder.encode(frames[1], encoder.seq)['keyframe']
+
+def test_seq_from_another_encoder_gets_keyframe():
+    frames = list(preview_frames(1.0, 3))
+    first, second = frame_delta.DeltaEncoder(), frame_delta.DeltaEncoder()
+    first.encode(frames[0], seq=1)
+    second.encode(frames[0], seq=2)
+    assert first.encode(frames[1], base_seq=2, seq=3)['keyframe']
+    delta = first.encode(frames[2], base_seq=3, seq=4)
+    assert not delta['keyframe'] and delta['patches']
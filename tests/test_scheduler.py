@@ -0,0 +1,40 @@
+import pytest
+import art_gen
+from admission import AdmissionController, CostModel
+from render_pool import RenderPool
+from scheduler import JobScheduler
+
+def test_job_that_fails_to_start_does_not_stop_the_queue(tmp_path):
+    params = {'size': 64, 'amount': 5, 'line_width': 1, 'line_width_variation': 1.0, 'padding': 4, 'border_width': 1}
+    _, state = art_gen.gen_art(64, 5, 1, 1.0, 4, 1, seed=3)
+    admission = AdmissionController(CostModel(), memory_budget=1 << 30)
+    pool = RenderPool(interactive_workers=1, batch_workers=1)
+    scheduler = JobScheduler(pool, str(tmp_path), cpu_budget=1, admission=admission)
+    try:
+        # No state in the spec: the job fails while it is being started
+        broken = scheduler.submit('still', {'params': params})
+        working = scheduler.submit('still', {'state': state, 'params': params})
+        # The job may have failed before its future is fetched, which then comes from the database
+        with pytest.raises(Exception, match='state'):
+            scheduler.future(broken).result(timeout=30)
+        assert scheduler.future(working).result(timeout=60).startswith(b'\x89PNG')
+        assert scheduler.status(broken)['status'] == 'failed'
+        assert admission.reserved == 0
+        assert scheduler.metrics()['running'] == 0
+    finally:
+        scheduler.shutdown()
+        pool.shutdown()
+
+def test_finished_job_futures_are_not_kept(tmp_path):
+    params = {'size': 64, 'amount': 5, 'line_width': 1, 'line_width_variation': 1.0, 'padding': 4, 'border_width': 1}
+    _, state = art_gen.gen_art(64, 5, 1, 1.0, 4, 1, seed=3)
+    pool = RenderPool(interactive_workers=1, batch_workers=1)
+    scheduler = JobScheduler(pool, str(tmp_path), cpu_budget=1)
+    try:
+        job_id = scheduler.submit('still', {'state': state, 'params': params})
+        scheduler.future(job_id).result(timeout=60)
+        assert scheduler.future(job_id).result().startswith(b'\x89PNG')
+        assert job_id not in scheduler._futures
+    finally:
+        scheduler.shutdown()
+        pool.shutdown()
@@ -0,0 +1,41 @@
+import multiprocessing
+import os
+import socket
+import video_segments
+
+def dead_pid():
+    process = multiprocessing.Process(target=int)
+    process.start()
+    process.join()
+    return process.pid
+
+def claim(job_dir, start, results):
+    start.wait()
+    results.put(video_segments.claim_segment(job_dir, 0))
+
+def test_stale_lock_taken_over_by_one_process(tmp_path):
+    job_dir = str(tmp_path)
+    context = multiprocessing.get_context('fork')
+    for attempt in range(10):
+        stale = f"{socket.gethostname()}:{dead_pid()}:stale{attempt}"
+        with open(video_segments.lock_path(job_dir, 0), 'w') as f:
+            f.write(stale)
+        start = context.Event()
+        results = context.Queue()
+        claimers = [context.Process(target=claim, args=(job_dir, start, results)) for _ in range(6)]
+        for process in claimers:
+            process.start()
+        start.set()
+        for process in claimers:
+            process.join()
+        assert sorted(results.get() for _ in claimers) == [False] * 5 + [True]
+        # The winner's lock replaced the stale one and no takeover markers are left behind
+        assert video_segments.read_lock(video_segments.lock_path(job_dir, 0)) != stale
+        assert os.listdir(job_dir) == [os.path.basename(video_segments.lock_path(job_dir, 0))]
+
+def test_live_lock_is_kept(tmp_path):
+    job_dir = str(tmp_path)
+    assert video_segments.claim_segment(job_dir, 0)
+    assert not video_segments.claim_segment(job_dir, 0)
+    video_segments.release_segment(job_dir, 0)
+    assert video_segments.claim_segment(job_dir, 0)
@@ -0,0 +1,178 @@
+from PIL import Image, ImageDraw
+import os
+import struct
+import tempfile
+import zlib
+import art_gen
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+class PngStreamWriter:
+    """
+    Minimal streaming PNG encoder (8-bit RGB, no interlacing).
+    Rows are compressed and flushed to disk as they arrive, so the full canvas never has to sit in memory.
+    """
+
+    def __init__(self, path, width, height, compress_level=6, chunk_size=1 << 20):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.chunk_size = chunk_size
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = b''
+        self._file = open(path, 'wb')
+        self._file.write(PNG_SIGNATURE)
+        # IHDR: width, height, bit depth 8, color type 2 (RGB), compression, filter, interlace
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+    def write_rows(self, raw_rgb):
+        """Append one or more full rows of raw RGB bytes."""
+        stride = self.width * 3
+        row_count = len(raw_rgb) // stride
+        for row in range(row_count):
+            # Filter type 0 (None) prefix for every scanline
+            self._pending += self._compressor.compress(b'\x00' + raw_rgb[row * stride:(row + 1) * stride])
+            if len(self._pending) >= self.chunk_size:
+                self._write_chunk(b'IDAT', self._pending)
+                self._pending = b''
+        self.rows_written += row_count
+
+    def close(self):
+        if self.rows_written != self.height:
+            self._file.close()
+            raise ValueError(f"PNG expected {self.height} rows but got {self.rows_written}")
+        self._pending += self._compressor.flush()
+        if self._pending:
+            self._write_chunk(b'IDAT', self._pending)
+        self._write_chunk(b'IEND', b'')
+        self._file.close()
+
+    def abort(self):
+        """Close the file without finishing the PNG (the caller removes it)."""
+        self._file.close()
+
+def build_tile_index(curves, canvas_size, tile_size):
+    """
+    Bucket curve indices into the tiles their bounding boxes overlap (uniform grid spatial index).
+    Indices stay in ascending order inside each bucket so tiles keep the original draw order.
+    """
+    tiles_per_side = (canvas_size + tile_size - 1) // tile_size
+    index = {}
+    for curve_index, (points, _color, width) in enumerate(curves):
+        # Stroke extends half the width around the centerline, plus one pixel for rounding
+        margin = width // 2 + 1
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        first_tx = max(0, (min(xs) - margin) // tile_size)
+        last_tx = min(tiles_per_side - 1, (max(xs) + margin) // tile_size)
+        first_ty = max(0, (min(ys) - margin) // tile_size)
+        last_ty = min(tiles_per_side - 1, (max(ys) + margin) // tile_size)
+        for ty in range(first_ty, last_ty + 1):
+            for tx in range(first_tx, last_tx + 1):
+                index.setdefault((tx, ty), []).append(curve_index)
+    return index
+
+def render_tile(job):
+    """Render one tile and return its raw RGB bytes. Runs inside worker processes."""
+    x0, y0, width, height, canvas_size, bg_clr, border_clr, border_width, curves = job
+    # Drawn with a margin wider than any stroke that is cropped off again: PIL rounds the outline of
+    # wide lines differently where they cross negative coordinates, which showed as seams at tile edges
+    margin = max([line_width for _, _, line_width in curves] + [border_width]) + 2
+    left = x0 - margin
+    top = y0 - margin
+    tile = Image.new('RGB', (width + 2 * margin, height + 2 * margin), bg_clr)
+    draw = ImageDraw.Draw(tile)
+
+    # Border rectangle expressed in tile coordinates (PIL clips whatever falls outside)
+    draw.rectangle((-left, -top, canvas_size - 1 - left, canvas_size - 1 - top), outline=border_clr, width=border_width)
+
+    for points, line_color, line_width in curves:
+        shifted = [(x - left, y - top) for x, y in points]
+        for j in range(len(shifted) - 1):
+            draw.line([shifted[j], shifted[j+1]], line_color, line_width)
+
+    return tile.crop((margin, margin, margin + width, margin + height)).tobytes()
+
+def render_tiled(art_state, params, target_size, output_path, tile_size=1024, workers=None, executor=None):
+    """
+    Render an art state at a very large size without holding the whole canvas in memory.
+
+    Args:
+        art_state: The deterministic art state (colors, points, etc.)
+        params: The parameters the state was generated with (size, amount, line_width, etc.)
+        target_size: Output canvas size in pixels
+        output_path: Where to write the PNG
+        tile_size: Tile edge in pixels; peak memory is about one row of tiles
+        workers: Worker processes for tile rendering (None = all cores, 1 = in-process)
+        executor: Existing executor to render tiles on instead of starting a new pool
+    """
+    target_size = int(target_size)
+    tile_size = int(tile_size)
+    original_size = int(params['size'])
+    original_padding = int(params['padding'])
+    ratio = target_size / original_size
+    target_padding = int(round(original_padding * ratio))
+
+    # Map stored coordinates to the target resolution
+    scaled_state = art_gen.scale_state(art_state, original_size, target_size, original_padding, target_padding)
+    amount = len(scaled_state['line_end_points'])
+    curves = art_gen.layout_curves(
+        scaled_state['initial_point'],
+        scaled_state['line_end_points'],
+        scaled_state['curve_control_points'],
+        scaled_state['line_start_points'],
+        int(params['line_width']),
+        scaled_state['line_width_variations'],
+        tuple(scaled_state['start_clr']),
+        tuple(scaled_state['end_clr']),
+        amount,
+        width_scale=ratio  # Stroke widths are stored in source pixels, so scale them with the canvas
+    )
+    border_width = int(round(int(params['border_width']) * ratio))
+    bg_clr = tuple(scaled_state['image_bg_clr'])
+    border_clr = tuple(scaled_state['border_clr'])
+
+    index = build_tile_index(curves, target_size, tile_size)
+    tiles_per_side = (target_size + tile_size - 1) // tile_size
+
+    # Written next to the destination and moved into place once complete, so a failed tile never leaves a truncated PNG
+    fd, partial_path = tempfile.mkstemp(suffix='.partial', dir=os.path.dirname(os.path.abspath(output_path)))
+    os.close(fd)
+    writer = None
+
+    with art_gen.process_pool(executor, workers, tiles_per_side) as pool:
+        try:
+            writer = PngStreamWriter(partial_path, target_size, target_size)
+            for ty in range(tiles_per_side):
+                y0 = ty * tile_size
+                band_height = min(tile_size, target_size - y0)
+                jobs = []
+                for tx in range(tiles_per_side):
+                    x0 = tx * tile_size
+                    tile_curves = [curves[i] for i in index.get((tx, ty), [])]
+                    jobs.append((x0, y0, min(tile_size, target_size - x0), band_height,
+                                 target_size, bg_clr, border_clr, border_width, tile_curves))
+
+                tiles = list(pool.map(render_tile, jobs)) if pool else [render_tile(job) for job in jobs]
+
+                # Stitch the band row by row and stream it to the encoder
+                for row in range(band_height):
+                    row_bytes = b''.join(
+                        tile[row * job[2] * 3:(row + 1) * job[2] * 3] for tile, job in zip(tiles, jobs)
+                    )
+                    writer.write_rows(row_bytes)
+            writer.close()
+            os.replace(partial_path, output_path)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            os.remove(partial_path)
+            raise
+
+    return output_path
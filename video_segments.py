@@ -0,0 +1,293 @@
+import argparse
+import base64
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import uuid
+import art_gen
+import frame_store
+from pipeline import run_pipeline
+
+JOB_FILE = 'job.json'
+
+def plan_segments(total_frames, segments):
+    """Split the timeline [0, total_frames) into contiguous (start_frame, end_frame) ranges."""
+    segments = max(1, min(int(segments), total_frames))
+    base, extra = divmod(total_frames, segments)
+    ranges = []
+    start = 0
+    for index in range(segments):
+        end = start + base + (1 if index < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+def render_segment(art_state, start_params, end_params, start_frame, end_frame, total_frames, output_path, fps=10, speed=1.0, zoom=1.1, zoom_speed=0.0, frames_dir=None):
+    """
+    Render frames [start_frame, end_frame) of a video and encode them as their own mp4 segment.
+    Each frame depends only on its frame number, so segments can be rendered by any process or machine.
+    With frames_dir the raw frames also go into that (already allocated) frame store, at their frame numbers.
+    """
+    imageio = art_gen.load_imageio()
+
+    animation = art_gen.prepare_animation(art_state, start_params)
+    # Encode to a temporary name and rename, so nobody sees a half-written segment in a shared directory
+    partial_path = output_path + '.partial.mp4'
+    writer = imageio.get_writer(partial_path, fps=fps, codec='libx264', quality=8)
+    # Frames identical to the one before are passed on again instead of drawn (see art_gen.video_frame_stages)
+    stages = art_gen.video_frame_stages(art_state, start_params, end_params, animation, total_frames, speed, zoom, zoom_speed)
+    stages.append(('encode', writer.append_data))
+    frame_writer = None
+    if frames_dir is not None:
+        # Segments write disjoint frame ranges of the same memory-mapped file
+        frame_writer = frame_store.FrameWriter(frames_dir, start_frame)
+        stages.insert(3, ('store', frame_writer.write))
+    try:
+        # Same staged pipeline as art_gen.generate_video, so each segment's encoder overlaps its drawing
+        run_pipeline(range(start_frame, end_frame), stages, queue_size=art_gen.VIDEO_QUEUE_SIZE)
+    finally:
+        writer.close()
+        if frame_writer is not None:
+            frame_writer.close()
+    os.replace(partial_path, output_path)
+    return output_path
+
+def concat_segments(segment_paths, output_path):
+    """Join mp4 segments losslessly (no re-encode) with ffmpeg's concat demuxer."""
+    import imageio_ffmpeg  # type: ignore  # Installed with imageio-ffmpeg
+
+    list_path = output_path + '.segments.txt'
+    with open(list_path, 'w') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error',
+             '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', output_path],
+            check=True, capture_output=True
+        )
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg concat failed: {e.stderr.decode('utf-8', 'replace').strip()}")
+    finally:
+        os.remove(list_path)
+    return output_path
+
+def generate_video_segmented(art_state, start_params, end_params, duration_seconds=30, fps=10, speed=1.0, zoom=1.1, zoom_speed=0.0, segments=None, executor=None, output='data_url', frames_dir=None):
+    """
+    Same video as art_gen.generate_video, rendered as independent time ranges in parallel.
+
+    Args:
+        segments: Number of segments (default: one per core)
+        executor: Process executor to render segments on (default: a new pool for this call)
+        output: 'data_url' (base64 mp4 for the UI) or 'mp4' (raw bytes)
+        frames_dir: Also keep the raw frames in a memory-mapped frame store in this directory (see frame_store)
+    """
+    total_frames = duration_seconds * fps
+    frames_build = None
+    if frames_dir is not None:
+        # Segments write their frames into the store while it is built; it moves to frames_dir once complete
+        frames_build = frame_store.create_store(
+            frames_dir, total_frames, art_gen.video_frame_size(start_params['size']), fps,
+            art_gen.video_store_meta(start_params, end_params, duration_seconds, speed, zoom, zoom_speed)
+        )
+    segment_ranges = plan_segments(total_frames, segments or os.cpu_count() or 1)
+    temp_dir = tempfile.mkdtemp()
+
+    try:
+        segment_jobs = [
+            (art_state, start_params, end_params, start_frame, end_frame, total_frames,
+             os.path.join(temp_dir, f"segment_{index:04d}.mp4"), fps, speed, zoom, zoom_speed, frames_build)
+            for index, (start_frame, end_frame) in enumerate(segment_ranges)
+        ]
+        with art_gen.process_pool(executor, len(segment_ranges)) as pool:
+            if pool:
+                futures = [pool.submit(render_segment, *job) for job in segment_jobs]
+                segment_paths = [future.result() for future in futures]
+            else:
+                segment_paths = [render_segment(*job) for job in segment_jobs]
+        if frames_dir is not None:
+            frame_store.mark_complete(frames_build, frames_dir)
+
+        output_path = concat_segments(segment_paths, os.path.join(temp_dir, "output.mp4"))
+        with open(output_path, 'rb') as f:
+            video_bytes = f.read()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if frames_build is not None:
+            shutil.rmtree(frames_build, ignore_errors=True)
+
+    if output == 'mp4':
+        return video_bytes
+    return 'data:video/mp4;base64, ' + base64.b64encode(video_bytes).decode('utf-8')
+
+# Shared-directory jobs: any number of machines run `render` against the same job directory
+
+def write_job(job_dir, art_state, start_params, end_params, duration_seconds=30, fps=10, speed=1.0, zoom=1.1, zoom_speed=0.0, segments=16):
+    """Describe a segmented render in job_dir/job.json so other processes or machines can pick up segments."""
+    os.makedirs(job_dir, exist_ok=True)
+    total_frames = duration_seconds * fps
+    job = {
+        'art_state': art_state,
+        'start_params': start_params,
+        'end_params': end_params,
+        'total_frames': total_frames,
+        'fps': fps,
+        'speed': speed,
+        'zoom': zoom,
+        'zoom_speed': zoom_speed,
+        'segments': plan_segments(total_frames, segments)
+    }
+    with open(os.path.join(job_dir, JOB_FILE), 'w') as f:
+        json.dump(job, f)
+    return job
+
+def read_job(job_dir):
+    with open(os.path.join(job_dir, JOB_FILE)) as f:
+        return json.load(f)
+
+def segment_path(job_dir, index):
+    return os.path.join(job_dir, f"segment_{index:04d}.mp4")
+
+def lock_path(job_dir, index):
+    return segment_path(job_dir, index) + '.lock'
+
+def read_lock(path):
+    """The owner recorded in a lock file ('host:pid:nonce'), or None if it is gone or unreadable."""
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+def lock_is_stale(owner):
+    """True for a lock left by a process on this machine that no longer runs (claims from other machines are kept)."""
+    try:
+        host, pid, _ = owner.rsplit(':', 2)
+        if host != socket.gethostname():
+            return False
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except (AttributeError, OSError, ValueError):
+        # Missing, half-written or owned by a process we may not signal: treat it as held
+        return False
+    return False
+
+def claim_segment(job_dir, index):
+    """Atomically claim a segment with an exclusive lock file; False if someone else has it."""
+    path = lock_path(job_dir, index)
+    # Record the owner so stale claims from crashed processes can be found and taken over
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        stale = read_lock(path)
+        return lock_is_stale(stale) and take_over_lock(path, stale, owner)
+    os.write(fd, owner.encode('utf-8'))
+    os.close(fd)
+    return True
+
+def take_over_lock(path, stale, owner):
+    """
+    Replace the stale lock (whose content is stale) with one held by owner, as exactly one of the processes that
+    found it stale. They race for an exclusive marker named after the stale owner; the winner checks the lock still
+    holds that owner and swaps in its own with os.replace, so the lock file never goes missing in between (which
+    would let a plain claim in). A loser that gets the marker after the winner released it sees the new owner.
+    """
+    marker = f"{path}.{stale.rsplit(':', 1)[-1]}.takeover"
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    try:
+        if read_lock(path) != stale:
+            return False
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.lock.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(owner)
+        os.replace(temp_path, path)
+        return True
+    finally:
+        os.remove(marker)
+
+def release_segment(job_dir, index):
+    try:
+        os.remove(lock_path(job_dir, index))
+    except FileNotFoundError:
+        pass
+
+def render_job_segments(job_dir, limit=None):
+    """Render unclaimed segments of a shared job until none are left (or limit is reached)."""
+    job = read_job(job_dir)
+    rendered = []
+    for index, (start_frame, end_frame) in enumerate(job['segments']):
+        if limit is not None and len(rendered) >= limit:
+            break
+        if os.path.exists(segment_path(job_dir, index)) or not claim_segment(job_dir, index):
+            continue
+        try:
+            render_segment(
+                job['art_state'], job['start_params'], job['end_params'], start_frame, end_frame, job['total_frames'],
+                segment_path(job_dir, index), job['fps'], job['speed'], job['zoom'], job['zoom_speed']
+            )
+        finally:
+            # Done segments are skipped because their file exists; a failed one can be claimed again by a retry
+            release_segment(job_dir, index)
+        rendered.append(index)
+    return rendered
+
+def finish_job(job_dir, output_path):
+    """Concatenate all segments of a shared job once every one of them exists."""
+    job = read_job(job_dir)
+    paths = [segment_path(job_dir, index) for index in range(len(job['segments']))]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"{len(missing)} segments not rendered yet, first missing: {missing[0]}")
+    return concat_segments(paths, output_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Render a video as independent segments across processes or machines')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    plan = commands.add_parser('plan', help='write a job into a shared directory')
+    plan.add_argument('--job-dir', required=True)
+    plan.add_argument('--input', required=True, help='JSON file with "state", "params" and "end_params"')
+    plan.add_argument('--segments', type=int, default=16)
+    plan.add_argument('--duration', type=int, default=30)
+    plan.add_argument('--fps', type=int, default=10)
+    plan.add_argument('--speed', type=float, default=20.0)
+    plan.add_argument('--zoom', type=float, default=1.1)
+    plan.add_argument('--zoom-speed', type=float, default=0.0)
+
+    render = commands.add_parser('render', help='render unclaimed segments of a job')
+    render.add_argument('--job-dir', required=True)
+    render.add_argument('--limit', type=int, default=None, help='stop after this many segments')
+
+    concat = commands.add_parser('concat', help='join the finished segments into one mp4')
+    concat.add_argument('--job-dir', required=True)
+    concat.add_argument('--output', required=True)
+
+    args = parser.parse_args()
+    if args.command == 'plan':
+        with open(args.input) as f:
+            job_input = json.load(f)
+        job = write_job(
+            args.job_dir, job_input['state'], job_input['params'], job_input.get('end_params', job_input['params']),
+            args.duration, args.fps, args.speed, args.zoom, args.zoom_speed, args.segments
+        )
+        print(f"Planned {len(job['segments'])} segments ({job['total_frames']} frames) in {args.job_dir}")
+    elif args.command == 'render':
+        rendered = render_job_segments(args.job_dir, args.limit)
+        print(f"Rendered segments: {rendered}")
+    else:
+        finish_job(args.job_dir, args.output)
+        print(f"Wrote {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
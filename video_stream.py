@@ -0,0 +1,50 @@
+import os
+import time
+import art_gen
+
+# Bytes read from the growing file at a time
+CHUNK_SIZE = 64 * 1024
+
+# Seconds between checks for new fragments
+POLL_INTERVAL = 0.1
+
+def render_stream(spec, stream_path):
+    """
+    Render a video job (scheduler spec) as a fragmented MP4 at stream_path, which can be served while it grows.
+    Runs in a batch worker; returns the path, so the finished video isn't sent back through the pool.
+    """
+    return art_gen.generate_video(
+        spec['state'], spec['params'], spec['end_params'],
+        duration_seconds=spec.get('duration_seconds', 30), fps=spec.get('fps', 10),
+        speed=spec.get('speed', 20.0), zoom=spec.get('zoom', 1.1), zoom_speed=spec.get('zoom_speed', 0.0),
+        output='path', frames_dir=spec.get('frames_dir'), stream_path=stream_path
+    )
+
+def follow(path, finished, sleep=time.sleep, poll_interval=POLL_INTERVAL, chunk_size=CHUNK_SIZE):
+    """
+    Yield the bytes of a file that is still being written, as they appear, until finished() is true
+    and everything was read. The file may not exist yet when following starts (the encoder opens it
+    with the first frame).
+
+    Args:
+        finished: Returns True once the writer is done (succeeded or failed)
+        sleep: Sleep function used while waiting (pass eel.sleep to yield to the event loop)
+    """
+    f = None
+    try:
+        while True:
+            # Checked before reading, so bytes written just before the writer finished are still read
+            done = finished()
+            if f is None and os.path.exists(path):
+                f = open(path, 'rb')
+            if f is not None:
+                chunk = f.read(chunk_size)
+                while chunk:
+                    yield chunk
+                    chunk = f.read(chunk_size)
+            if done:
+                return
+            sleep(poll_interval)
+    finally:
+        if f is not None:
+            f.close()
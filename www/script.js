@@ -1,6 +1,14 @@
 var selectedStateId = null;
 var selectedImageSrc = null;
 
+// Grid thumbnails are rendered at this size at most; full-size renders load on hover/selection
+var THUMBNAIL_SIZE = 256;
+
+function imageFormat() {
+  // SVG pieces are vector paths: no rasterizing on the server, the browser scales them
+  return $('.image_format').is(':checked') ? 'svg' : 'png';
+}
+
 function gen() {
   $('.imgs_wrap').empty();
   var size = $('.size').val();
@@ -9,33 +17,83 @@ function gen() {
   var line_width_variation = $('.line_width_variation').val();
   var padding = $('.padding').val();
   var border_width = $('.border_width').val();
+  var preview_size = Math.min(parseInt(size), THUMBNAIL_SIZE);
   for(let i = 0; i < 9; i++) {
-    eel.generate_art(size, line_amount, line_width, line_width_variation, padding, border_width)(function (ret) {
-      var img = $('<img>').attr('src', ret.image);
-      if (ret.state_id) {
-        img.attr('data-state-id', ret.state_id);
-        img.attr('data-image-src', ret.image);
-        img.on('click', function() {
-          // Remove previous selection
-          $('.imgs_wrap img').removeClass('selected');
-          // Select this image
-          $(this).addClass('selected');
-          selectedStateId = $(this).attr('data-state-id');
-          selectedImageSrc = $(this).attr('data-image-src');
-          // Show selected image in preview
-          $('#selected-image-container').html('<img src="' + selectedImageSrc + '">');
-          $('#video-section').slideDown(300);
-          // Scroll to video section
-          $('html, body').animate({
-            scrollTop: $('#video-section').offset().top - 20
-          }, 500);
-        });
+    eel.generate_art(size, line_amount, line_width, line_width_variation, padding, border_width, preview_size, imageFormat())(function (ret) {
+      if (ret.error) {
+        // Turned down by admission control; ret.cost has the estimate it was judged on
+        console.warn(ret.error, ret.cost);
+        return;
       }
-      $('.imgs_wrap').prepend(img);
+      $('.imgs_wrap').prepend(gridImage(ret.image, ret.state_id));
     })
   }
 }
 
+function loadGallery() {
+  // Pieces saved in earlier sessions, newest first
+  $('.imgs_wrap').empty();
+  eel.list_gallery(30, 0, false, THUMBNAIL_SIZE)(function (pieces) {
+    for (var i = 0; i < pieces.length; i++) {
+      $('.imgs_wrap').append(gridImage(pieces[i].image, pieces[i].state_id));
+    }
+  });
+}
+
+function gridImage(src, stateId) {
+  var img = $('<img>').attr('src', src);
+  if (stateId) {
+    img.attr('data-state-id', stateId);
+    img.attr('data-image-src', src);
+    img.on('mouseenter', function() {
+      loadFullResolution($(this));
+    });
+    img.on('click', function() {
+      // Remove previous selection
+      $('.imgs_wrap img').removeClass('selected');
+      // Select this image
+      $(this).addClass('selected');
+      selectedStateId = $(this).attr('data-state-id');
+      selectedImageSrc = $(this).attr('data-image-src');
+      // Show selected image in preview
+      $('#selected-image-container').html('<img src="' + selectedImageSrc + '">');
+      loadFullResolution($(this));
+      $('#video-section').slideDown(300);
+      // Scroll to video section
+      $('html, body').animate({
+        scrollTop: $('#video-section').offset().top - 20
+      }, 500);
+    });
+  }
+  return img;
+}
+
+function loadFullResolution(img) {
+  // Only request the full-size render once per thumbnail
+  if (img.attr('data-full-requested')) {
+    return;
+  }
+  // Vector thumbnails are already sharp at any size
+  if (img.attr('src').indexOf('data:image/svg+xml') === 0) {
+    return;
+  }
+  img.attr('data-full-requested', 'true');
+  var stateId = img.attr('data-state-id');
+  eel.render_full(stateId)(function (ret) {
+    if (ret.error) {
+      img.removeAttr('data-full-requested');
+      return;
+    }
+    // Swap the sharp version in place of the thumbnail
+    img.attr('src', ret.image);
+    img.attr('data-image-src', ret.image);
+    if (selectedStateId === stateId) {
+      selectedImageSrc = ret.image;
+      $('#selected-image-container').html('<img src="' + selectedImageSrc + '">');
+    }
+  });
+}
+
 function generateVideo() {
   if (!selectedStateId) {
     alert('Please select an art piece first by clicking on it.');
@@ -55,11 +113,24 @@ function generateVideo() {
   $('#video-status').html('<p>🎬 Generating video (300 frames at 10fps, speed: ' + displaySpeed + 'x, zoom: ' + video_zoom + 'x)... This should take 30-60 seconds. Please wait...</p>');
   $('#video-container').html('<div style="color: white; text-align: center; padding: 50px;">Generating...</div>');
   
+  var keep_frames = $('.keep_frames').is(':checked');
+  var stream = $('.stream_video').is(':checked');
+  $('#frames-controls').hide();
+  
   eel.generate_video(selectedStateId, video_speed, video_zoom, video_zoom_speed, end_line_amount, end_line_width, 
-                     end_line_width_variation, end_padding, end_border_width)(function (ret) {
+                     end_line_width_variation, end_padding, end_border_width, false, keep_frames, stream)(function (ret) {
     if (ret.error) {
       $('#video-status').html('<p style="color: #e74c3c;">❌ Error: ' + ret.error + '</p>');
       $('#video-container').html('<div style="color: white; text-align: center; padding: 50px;">Error generating video</div>');
+    } else if (ret.stream_url) {
+      // Plays from the first fragment on and buffers ahead while the rest is rendered
+      $('#video-status').html('<p>🎬 Streaming while rendering...</p>');
+      var streamed = $('<video>').attr('src', ret.stream_url)
+                                 .attr('controls', true)
+                                 .attr('autoplay', true)
+                                 .prop('muted', true);
+      $('#video-container').html(streamed);
+      waitForVideoJob(ret);
     } else if (ret.video) {
       $('#video-status').html('<p style="color: #27ae60;">✅ Video generated successfully!</p>');
       var video = $('<video>').attr('src', ret.video)
@@ -67,7 +138,98 @@ function generateVideo() {
                               .attr('autoplay', true)
                               .attr('loop', true);
       $('#video-container').html(video);
+      if (ret.frames_key) {
+        showStoredFrames(ret.frames_key, ret.frame_count);
+      }
+    }
+  });
+}
+
+function waitForVideoJob(ret) {
+  eel.get_video_job(ret.job_id)(function (job) {
+    if (job.error || job.status === 'failed') {
+      $('#video-status').html('<p style="color: #e74c3c;">❌ Error: ' + (job.error || 'Video job failed') + '</p>');
+    } else if (job.status === 'done') {
+      // The finished file stays at the stream URL
+      $('#video-status').html('<p style="color: #27ae60;">✅ Video generated successfully! <a href="' + ret.stream_url + '" download="art.mp4">Download</a></p>');
+      if (ret.frames_key) {
+        showStoredFrames(ret.frames_key, ret.frame_count);
+      }
+    } else {
+      setTimeout(function () { waitForVideoJob(ret); }, 1000);
+    }
+  });
+}
+
+// Frames of the last video rendered with "Keep Frames", read back from the server's frame store
+var storedFramesKey = null;
+
+function showStoredFrames(framesKey, frameCount) {
+  storedFramesKey = framesKey;
+  $('.frame_scrub').attr('max', frameCount - 1).val(0);
+  $('#frames-status').empty();
+  $('#frames-controls').show();
+  showStoredFrame(0);
+}
+
+function showStoredFrame(frameNum) {
+  eel.get_video_frame(storedFramesKey, frameNum, THUMBNAIL_SIZE)(function (ret) {
+    if (ret.error) {
+      $('#frames-status').html('<p style="color: #e74c3c;">❌ Error: ' + ret.error + '</p>');
+      return;
     }
+    $('#frame-container').html($('<img>').attr('src', ret.image).attr('title', 'Frame ' + ret.frame));
+  });
+}
+
+function exportFrames(format) {
+  $('#frames-status').html('<p>Exporting ' + format.toUpperCase() + '...</p>');
+  eel.export_frames(storedFramesKey, format)(function (ret) {
+    if (ret.error) {
+      $('#frames-status').html('<p style="color: #e74c3c;">❌ Error: ' + ret.error + '</p>');
+    } else {
+      $('#frames-status').html('<p style="color: #27ae60;">✅ Saved to ' + ret.path + '</p>');
+    }
+  });
+}
+
+// Sweep axes that are animation settings rather than generation params
+var SWEEP_FRAME_SETTINGS = ['time_factor', 'speed', 'zoom', 'zoom_speed', 'gyro_x', 'gyro_y'];
+
+function parseSweepValues(text) {
+  return text.split(',').map(function (value) { return parseFloat(value); }).filter(function (value) { return !isNaN(value); });
+}
+
+function generateSweep() {
+  if (!selectedStateId) {
+    alert('Please select an art piece first by clicking on it.');
+    return;
+  }
+  
+  var axes = [[$('.sweep_x').val(), parseSweepValues($('.sweep_x_values').val())]];
+  if ($('.sweep_y').val()) {
+    axes.push([$('.sweep_y').val(), parseSweepValues($('.sweep_y_values').val())]);
+  }
+  // Frame sweeps animate with the current video settings
+  var settings = null;
+  for (var i = 0; i < axes.length; i++) {
+    if (SWEEP_FRAME_SETTINGS.indexOf(axes[i][0]) !== -1) {
+      settings = {
+        speed: parseFloat($('.video_speed').val()),
+        zoom: parseFloat($('.video_zoom').val()),
+        zoom_speed: parseFloat($('.video_zoom_speed').val())
+      };
+    }
+  }
+  
+  $('#sweep-status').html('<p>Rendering sweep...</p>');
+  eel.generate_sweep(selectedStateId, axes, settings)(function (ret) {
+    if (ret.error) {
+      $('#sweep-status').html('<p style="color: #e74c3c;">❌ Error: ' + ret.error + '</p>');
+      return;
+    }
+    $('#sweep-status').html('<p>' + ret.cells.length + ' cells</p>');
+    $('#sweep-container').html($('<img>').attr('src', ret.sheet).css('max-width', '100%'));
   });
 }
 
@@ -77,6 +239,12 @@ var previewTimeFactor = 0.0;
 var previewStartTime = null;
 var gyroX = 0.0;
 var gyroY = 0.0;
+
+// Delta-encoded preview: the server sends the background/border color shifts and the pixels that still changed
+// since frame previewSeq, which are applied to previewFrame (full frame resolution) before it is scaled onto the canvas
+var previewStreamId = 'preview-' + Math.random().toString(36).slice(2);
+var previewSeq = null;
+var previewFrame = document.createElement('canvas');
 var isJoystickDragging = false;
 
 function toggleRealtimePreview() {
@@ -95,6 +263,7 @@ function toggleRealtimePreview() {
 function startRealtimePreview() {
   isPreviewRunning = true;
   previewStartTime = Date.now();
+  previewSeq = null; // First frame is a keyframe
   $('#preview-toggle-btn').text('Stop Preview').removeClass('btn-primary').addClass('btn-danger');
   $('#realtime-preview-container').show();
   $('#preview-status').text('Preview running... Adjust parameters to see changes in real-time!');
@@ -150,33 +319,98 @@ function generatePreviewFrame() {
   var end_padding = $('.end_padding').val();
   var end_border_width = $('.end_border_width').val();
   
-  // Request frame
+  // Request frame (SVG frames are sent whole, PNG frames as patches against the last one)
+  var format = imageFormat();
+  var streamId = format == 'png' ? previewStreamId : null;
   eel.generate_realtime_frame(selectedStateId, previewTimeFactor, video_speed, video_zoom, video_zoom_speed,
-                              gyro_x, gyro_y, end_line_amount, end_line_width, end_line_width_variation, end_padding, end_border_width)(
+                              gyro_x, gyro_y, end_line_amount, end_line_width, end_line_width_variation, end_padding, end_border_width, format,
+                              false, streamId, streamId ? previewSeq : null)(
     function (ret) {
       if (ret.error) {
         $('#preview-status').html('<span style="color: red;">Error: ' + ret.error + '</span>');
         stopRealtimePreview();
+      } else if (ret.patches) {
+        applyPreviewPatches(ret).then(function () {
+          previewSeq = ret.seq;
+          drawPreviewFrame(previewFrame);
+        }, function () {
+          // A patch that didn't decode leaves previewFrame unknown, so the next frame is requested as a keyframe
+          previewSeq = null;
+          scheduleNextPreviewFrame();
+        });
       } else if (ret.frame) {
         // Display frame on canvas
-        var canvas = document.getElementById('realtime-canvas');
-        var ctx = canvas.getContext('2d');
         var img = new Image();
         img.onload = function() {
-          ctx.clearRect(0, 0, canvas.width, canvas.height);
-          ctx.drawImage(img, 0, 0, canvas.width, canvas.height);
-          
-          // Schedule next frame (target ~15 fps for smooth preview)
-          if (isPreviewRunning) {
-            setTimeout(generatePreviewFrame, 1000 / 15); // ~15 fps
-          }
+          previewSeq = null; // The next PNG frame needs a keyframe again
+          drawPreviewFrame(img);
         };
+        img.onerror = scheduleNextPreviewFrame;
         img.src = ret.frame;
       }
     }
   );
 }
 
+function applyPreviewPatches(ret) {
+  // Decode every patch first so the frame is updated all at once (rejects, leaving the frame as it was, if one fails)
+  var loads = ret.patches.map(function (patch) {
+    return new Promise(function (resolve, reject) {
+      var img = new Image();
+      img.onload = function () { resolve({patch: patch, img: img}); };
+      img.onerror = function () { reject(new Error('Preview patch failed to decode')); };
+      img.src = patch.image;
+    });
+  });
+  return Promise.all(loads).then(function (loaded) {
+    if (ret.keyframe) {
+      previewFrame.width = ret.width;
+      previewFrame.height = ret.height;
+    }
+    var ctx = previewFrame.getContext('2d');
+    if (!ret.keyframe && ret.remap.length) {
+      remapPreviewColors(ctx, ret.remap);
+    }
+    // Unchanged pixels of a delta patch are transparent, so drawing it only replaces what changed
+    loaded.forEach(function (item) {
+      ctx.drawImage(item.img, item.patch.x, item.patch.y);
+    });
+  });
+}
+
+function remapPreviewColors(ctx, remap) {
+  // Replace [old, new] colors (0xRRGGBB, the first matching pair wins), the same way frame_delta.remap_colors does
+  var image = ctx.getImageData(0, 0, previewFrame.width, previewFrame.height);
+  var data = image.data;
+  for (var i = 0; i < data.length; i += 4) {
+    var color = (data[i] << 16) | (data[i + 1] << 8) | data[i + 2];
+    for (var j = 0; j < remap.length; j++) {
+      if (color == remap[j][0]) {
+        data[i] = remap[j][1] >> 16;
+        data[i + 1] = (remap[j][1] >> 8) & 255;
+        data[i + 2] = remap[j][1] & 255;
+        break;
+      }
+    }
+  }
+  ctx.putImageData(image, 0, 0);
+}
+
+function drawPreviewFrame(source) {
+  var canvas = document.getElementById('realtime-canvas');
+  var ctx = canvas.getContext('2d');
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  ctx.drawImage(source, 0, 0, canvas.width, canvas.height);
+  scheduleNextPreviewFrame();
+}
+
+function scheduleNextPreviewFrame() {
+  // Schedule next frame (target ~15 fps for smooth preview)
+  if (isPreviewRunning) {
+    setTimeout(generatePreviewFrame, 1000 / 15); // ~15 fps
+  }
+}
+
 $( document ).ready(function() {
   $('.size').on('input', function () {
     $('.size_label').text($(this).val());
@@ -198,6 +432,9 @@ $( document ).ready(function() {
     var zoomSpeed = parseFloat($(this).val());
     $('.video_zoom_speed_label').text(zoomSpeed.toFixed(1) + 'x');
   });
+  $('.frame_scrub').on('input', function () {
+    showStoredFrame(parseInt($(this).val()));
+  });
   // Joystick setup
   setupJoystick();
   